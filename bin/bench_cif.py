@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+#----------------------------------------------------------------------
+# Description: Compares the fast CIF reader with PyCifRW
+#----------------------------------------------------------------------
+import time
+import argparse
+from fdmnes import cifreader
+
+parser = argparse.ArgumentParser(description=
+   "Benchmark of the fast CIF reader against CifFile.ReadCif")
+parser.add_argument("file", nargs="+", help="list of CIF files")
+parser.add_argument("-n", "--repeat", type=int, default=10,
+                    help="number of repetitions per file")
+args = parser.parse_args()
+
+total = dict(fast=0., full=0.)
+for path in args.file:
+    results = {}
+    for name, reader in [("fast", cifreader.read_cif_fast),
+                         ("full", cifreader.read_cif_full)]:
+        try:
+            t0 = time.time()
+            for i in range(args.repeat):
+                results[name] = reader(path)
+            dt = (time.time() - t0) / args.repeat
+        except Exception as e:
+            print("%s: %s reader failed (%s)"%(path, name, e))
+            results[name] = None
+            continue
+        total[name] += dt
+        print("%s: %s reader %.3f ms"%(path, name, dt*1e3))
+    if None not in results.values() and results["fast"] != results["full"]:
+        print("%s: results differ!"%path)
+
+if total["fast"]:
+    print("total: fast %.3f ms, full %.3f ms, speedup %.1f"
+          %(total["fast"]*1e3, total["full"]*1e3, total["full"]/total["fast"]))
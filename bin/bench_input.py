@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+#----------------------------------------------------------------------
+# Description: Benchmark of reading FDMNES input files
+#----------------------------------------------------------------------
+import os
+import time
+import tempfile
+import argparse
+import numpy as np
+import fdmnes
+import fdmnes.template
+
+parser = argparse.ArgumentParser(description=
+   "Benchmark of reading an FDMNES input file with a large Crystal block")
+parser.add_argument("-n", "--atoms", type=int, default=10000,
+                    help="number of atoms in the generated input file")
+parser.add_argument("-r", "--repeat", type=int, default=5,
+                    help="number of repetitions")
+parser.add_argument("--fdmnes", type=str, default=None,
+                    help="path of the fdmnes executable")
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp()
+path = os.path.join(workdir, "supercell_inp.txt")
+
+sim = fdmnes.fdmnes("1", fdmnes_path=args.fdmnes)
+sim.a = sim.b = sim.c = 100.
+for i, position in enumerate(np.random.rand(args.atoms, 3)):
+    sim.add_atom("O" if i%3 else "Ti", position, resonant=(i<2))
+sim.P.Range = (-10., 0.5, 50.)
+sim.P.Radius = 4.
+sim.WriteInputFile(path, overwrite=True)
+
+t0 = time.time()
+for i in range(args.repeat):
+    sim._parse_input_file(path)
+dt = (time.time() - t0) / args.repeat
+print("_parse_input_file (%i atoms): %.1f ms"%(args.atoms, dt*1e3))
+
+t0 = time.time()
+sim.LoadInputFile(path)
+print("LoadInputFile (%i atoms): %.1f ms"%(args.atoms,
+                                           (time.time() - t0)*1e3))
+
+t0 = time.time()
+for i in range(args.repeat):
+    sim.WriteInputFile(path, overwrite=True)
+dt = (time.time() - t0) / args.repeat
+print("WriteInputFile (%i atoms): %.1f ms"%(args.atoms, dt*1e3))
+
+variants = [dict(Radius=r) for r in np.linspace(3., 6., 100)]
+paths = [os.path.join(workdir, "variant_%i_inp.txt"%i)
+         for i in range(len(variants))]
+t0 = time.time()
+sim.WriteInputFiles(paths, variants)
+dt = (time.time() - t0) / len(variants)
+print("WriteInputFiles (%i atoms): %.1f ms per file"%(args.atoms, dt*1e3))
+
+template = fdmnes.template.InputTemplate(sim, ["Radius"])
+t0 = time.time()
+template.write_many(paths, variants, overwrite=True, atomic=True)
+dt = (time.time() - t0) / len(variants)
+print("InputTemplate (%i atoms): %.1f ms per file"%(args.atoms, dt*1e3))
+
+for fpath in paths + [path]:
+    os.remove(fpath)
+os.rmdir(workdir)
@@ -1,2 +1,6 @@
 from .pyFDMNES import *
-
+from .scheduler import Job, JobScheduler, JobError, wait_any, wait_all, \
+                       Launcher, MPILauncher, WrapperLauncher
+from .bulk import import_cifs, ImportResult
+from .sweep import Sweep, SweepResult
+from .registry import JobRegistry
@@ -0,0 +1,111 @@
+"""
+    Import of large collections of CIF files using a pool of processes.
+
+    Every worker parses and validates the files with the fast CIF reader
+    and a space group table that is loaded once per worker process. Only
+    the small structure records are sent back to the parent which creates
+    the ``fdmnes'' instances. Files are submitted in windows of limited
+    size so that memory usage does not grow with the number of files.
+"""
+import os
+import itertools
+import collections
+import multiprocessing
+from . import cifreader
+from .pyFDMNES import fdmnes
+
+
+ImportResult = collections.namedtuple("ImportResult",
+                                      ["path", "sim", "record", "error"])
+
+
+def find_cif_files(paths):
+    """
+        Generator of all CIF files in ``paths'' which may be a file, a
+        directory (searched recursively) or a list of both.
+    """
+    if isinstance(paths, basestring):
+        paths = [paths]
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for fname in sorted(files):
+                if os.path.splitext(fname)[1].lower() == ".cif":
+                    yield os.path.join(root, fname)
+
+
+def read_record(path, resonant="", fdmnes_path=None):
+    """
+        Reads the CIF file ``path'' and checks that it can be loaded by
+        ``fdmnes''.
+
+        Returns:
+            (path, record, error): ``record'' is the dictionary returned by
+            ``cifreader.read_cif'' with the additional entry ``path'' or
+            None in case of failure. ``error'' is the error message.
+    """
+    try:
+        record = cifreader.read_cif(path)
+        record["path"] = path
+        fdmnes(record, resonant, fdmnes_path=fdmnes_path)
+    except Exception as e:
+        return path, None, "%s: %s"%(e.__class__.__name__, e)
+    return path, record, None
+
+
+def _read_record(args):
+    return read_record(*args)
+
+
+def import_cifs(paths, resonant="", fdmnes_path=None, processes=None,
+                records=False, report=None, chunksize=8):
+    """
+        Imports all CIF files found in ``paths'' (see ``find_cif_files'')
+        using a pool of ``processes'' processes (default: number of CPUs).
+        Results are yielded as soon as they are available and not in the
+        order of the files.
+
+        Input:
+        ------
+            resonant : string
+                Symbol of the resonant atom.
+            fdmnes_path : string
+                Path of the fdmnes executable (default: from config file).
+            records : bool
+                Yield only the structure records instead of ``fdmnes''
+                instances. Records can be passed as ``structure'' to
+                ``fdmnes''.
+            report : file object
+                If given, a line ``<path>\\t<error>'' is written for each
+                file that could not be imported.
+
+        Returns:
+            generator of ImportResult(path, sim, record, error) named tuples
+            with ``sim'' and ``record'' being None for failed files.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    window = processes * chunksize * 4
+    tasks = ((path, resonant, fdmnes_path) for path in find_cif_files(paths))
+    pool = multiprocessing.Pool(processes)
+    try:
+        while True:
+            batch = list(itertools.islice(tasks, window))
+            if not batch:
+                break
+            results = pool.imap_unordered(_read_record, batch, chunksize)
+            for path, record, error in results:
+                sim = None
+                if error is not None:
+                    if report is not None:
+                        report.write("%s\t%s\n"%(path, error))
+                elif not records:
+                    sim = fdmnes(record, resonant, fdmnes_path=fdmnes_path)
+                yield ImportResult(path, sim, record, error)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+from . import settings
+from .pyFDMNES import conf
+
+
+# suffixes of the output files belonging to an output base ``path_out''
+OUTPUT_SUFFIX = re.compile(r"^(_tddft)?(_\d+|_bav|_conv)?\.txt$")
+
+# parameters referring to external files cannot be content-addressed
+UNCACHEABLE = ["Extract", "Calculation", "Scan", "Scan_conv"]
+
+METAFILE = "meta.json"
+
+
+def default_cache_dir():
+    if conf.has_option("global", "cache_dir"):
+        return os.path.expanduser(conf.get("global", "cache_dir"))
+    return os.path.join(os.path.expanduser("~"), ".fdmnes_cache")
+
+
+def binary_identity(fdmnes_exe):
+    """
+        Identifies the FDMNES executable by its path, size and
+        modification time.
+    """
+    fdmnes_exe = os.path.realpath(fdmnes_exe)
+    stat = os.stat(fdmnes_exe)
+    return "%s %i %i"%(fdmnes_exe, stat.st_size, int(stat.st_mtime))
+
+
+def simulation_key(sim, exclude=(), extra=()):
+    """
+        Returns a hash of the normalized structure of the ``fdmnes''
+        instance ``sim'', all parameters that differ from their defaults
+        and the strings in ``extra''. Returns None if one of the parameters
+        in ``exclude'' is set.
+    """
+    content = []
+    for line in sim.write_structure():
+        line = " ".join(line.split("!")[0].split())
+        if line:
+            content.append(line)
+    for Group in settings.Defaults:
+        for keyw in sorted(Group):
+            if keyw in sim.P and sim.P[keyw]!=Group[keyw]:
+                if keyw in exclude:
+                    return None
+                content.append("%s=%r"%(keyw, sim.P[keyw]))
+    content.extend(extra)
+    return hashlib.sha1(os.linesep.join(content)).hexdigest()
+
+
+def output_files(path_out):
+    """
+        Returns a dictionary {suffix:path} of all existing output files
+        of the output base ``path_out''.
+    """
+    dirname, basename = os.path.split(path_out)
+    if not dirname:
+        dirname = os.curdir
+    files = {}
+    if not os.path.isdir(dirname):
+        return files
+    for fname in os.listdir(dirname):
+        if not fname.startswith(basename):
+            continue
+        suffix = fname[len(basename):]
+        if OUTPUT_SUFFIX.match(suffix):
+            files[suffix] = os.path.join(dirname, fname)
+    return files
+
+
+
+class ResultCache(object):
+    """
+        Persistent on-disk cache of FDMNES results.
+
+        Results are stored under a hash of the normalized structure as
+        returned by ``fdmnes.write_structure()'', all parameters that differ
+        from their defaults and the identity of the FDMNES executable.
+        The least recently used entries are evicted as soon as the cache
+        exceeds ``max_size'' bytes or ``max_entries'' entries.
+    """
+    def __init__(self, directory=None, max_size=None, max_entries=None):
+        """
+            Input:
+            ------
+                directory : string
+                    Location of the cache. Defaults to the ``cache_dir''
+                    entry of the config file or ``~/.fdmnes_cache''.
+                max_size : int
+                    Maximum total size in bytes.
+                max_entries : int
+                    Maximum number of stored results.
+        """
+        if directory is None:
+            directory = default_cache_dir()
+        self.directory = os.path.abspath(directory)
+        self.max_size = max_size
+        self.max_entries = max_entries
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def key(self, sim):
+        """
+            Returns the cache key for the current state of the ``fdmnes''
+            instance ``sim'' or None if the result cannot be cached.
+        """
+        return simulation_key(sim, UNCACHEABLE,
+                              [binary_identity(sim.fdmnes_exe)])
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def __contains__(self, key):
+        return key is not None and \
+               os.path.isfile(os.path.join(self._entry(key), METAFILE))
+
+    def lookup(self, key, path_out):
+        """
+            Copies the cached output files for ``key'' to the output base
+            ``path_out''. Returns the list of written files or None if the
+            key is not in the cache.
+        """
+        if key not in self:
+            return None
+        entry = self._entry(key)
+        with open(os.path.join(entry, METAFILE), "r") as fh:
+            meta = json.load(fh)
+        written = []
+        for suffix in meta["files"]:
+            dest = path_out + suffix
+            shutil.copyfile(os.path.join(entry, "result" + suffix), dest)
+            written.append(dest)
+        os.utime(entry, None) # mark as recently used
+        return written
+
+    def store(self, key, path_out):
+        """
+            Stores the output files of the output base ``path_out'' under
+            ``key''. Only successfully finished runs should be stored.
+        """
+        if key is None or key in self:
+            return False
+        files = output_files(path_out)
+        if not files:
+            return False
+        tmpdir = tempfile.mkdtemp(prefix=".tmp_", dir=self.directory)
+        try:
+            for suffix, fpath in files.iteritems():
+                dest = os.path.join(tmpdir, "result" + suffix)
+                shutil.copyfile(fpath, dest)
+            meta = dict(files=sorted(files), created=time.time(),
+                        source=os.path.abspath(path_out))
+            with open(os.path.join(tmpdir, METAFILE), "w") as fh:
+                json.dump(meta, fh)
+            os.rename(tmpdir, self._entry(key))
+        except OSError: # stored concurrently by another process
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            return False
+        self.evict()
+        return True
+
+    def entries(self):
+        """
+            Returns a list of (last_used, size, key) for all entries.
+        """
+        result = []
+        for key in os.listdir(self.directory):
+            entry = self._entry(key)
+            if key.startswith(".") or key not in self:
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, fname))
+                       for fname in os.listdir(entry))
+            result.append((os.path.getmtime(entry), size, key))
+        return sorted(result)
+
+    def evict(self):
+        """
+            Removes least recently used entries until the limits
+            ``max_size'' and ``max_entries'' are met.
+        """
+        entries = self.entries()
+        total = sum(size for (used, size, key) in entries)
+        max_entries = len(entries) if self.max_entries is None \
+                                   else self.max_entries
+        max_size = total if self.max_size is None else self.max_size
+        while entries and (len(entries) > max_entries or total > max_size):
+            used, size, key = entries.pop(0)
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for used, size, key in self.entries():
+            shutil.rmtree(self._entry(key), ignore_errors=True)
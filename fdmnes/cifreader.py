@@ -0,0 +1,184 @@
+"""
+    Fast reader for the parts of a CIF file that are needed by
+    ``fdmnes.load_cif'': space group, cell parameters and the
+    ``_atom_site_'' loop.
+
+    The file is tokenized line by line and only the required tags are kept.
+    Anything unusual (several data blocks, save frames, CIF2 syntax, broken
+    loops, missing entries) raises a ``CifFormatError'', upon which the
+    caller should fall back to the complete parser ``CifFile.ReadCif''
+    (see ``read_cif'').
+"""
+import re
+
+
+SCALAR_TAGS = ["_symmetry_int_tables_number",
+               "_symmetry_space_group_name_h-m",
+               "_cell_length_a", "_cell_length_b", "_cell_length_c",
+               "_cell_angle_alpha", "_cell_angle_beta", "_cell_angle_gamma"]
+
+ATOM_TAGS = ["_atom_site_label", "_atom_site_type_symbol",
+             "_atom_site_fract_x", "_atom_site_fract_y", "_atom_site_fract_z",
+             "_atom_site_occupancy"]
+
+REQUIRED_TAGS = SCALAR_TAGS[2:]
+
+TOKEN = re.compile(r"""(?P<comment>\#.*)
+                      |'(?P<single>.*?)'(?=\s|$)
+                      |"(?P<double>.*?)"(?=\s|$)
+                      |(?P<bare>\S+)""", re.VERBOSE)
+
+
+class CifFormatError(ValueError):
+    pass
+
+
+def tokenize(fh):
+    """
+        Generator of (kind, value) tuples of a CIF file with kind being one
+        of "data", "loop", "tag" and "value". Tags are converted to lower
+        case.
+    """
+    text = None
+    for line in fh:
+        if text is not None: # inside a multi-line text field
+            if line.startswith(";"):
+                yield "value", "".join(text)
+                text = None
+            else:
+                text.append(line)
+            continue
+        if line.startswith(";"):
+            text = [line[1:]]
+            continue
+        for match in TOKEN.finditer(line):
+            if match.group("comment") is not None:
+                break
+            bare = match.group("bare")
+            if bare is None:
+                value = match.group("single")
+                if value is None:
+                    value = match.group("double")
+                yield "value", value
+                continue
+            lbare = bare.lower()
+            if bare.startswith("_"):
+                yield "tag", lbare
+            elif lbare == "loop_":
+                yield "loop", None
+            elif lbare.startswith("data_"):
+                yield "data", bare[5:]
+            elif lbare.startswith("save_") or lbare == "global_" \
+                 or lbare == "stop_" or bare[0] in "[]{}" \
+                 or bare.startswith("'''") or bare.startswith('"""'):
+                raise CifFormatError("Unsupported CIF syntax: %s"%bare)
+            else:
+                yield "value", bare
+    if text is not None:
+        raise CifFormatError("Unterminated text field.")
+
+
+def read_cif_fast(path):
+    """
+        Reads space group, cell and atom sites of the CIF file ``path''.
+
+        Returns:
+            dict(tags=dict, atoms=list): ``tags'' contains the values of
+            SCALAR_TAGS that are present, ``atoms'' one dictionary of the
+            present ATOM_TAGS per atom site. All values are strings.
+    """
+    tags = {}
+    atoms = None
+    blocks = 0
+    tag = None         # tag waiting for its value
+    loop = None        # tags of the current loop
+    values = []        # values of the current loop
+    header = False     # reading the tags of a loop
+
+    def close_loop(loop, values):
+        if not loop:
+            return None
+        if len(values) % len(loop):
+            raise CifFormatError("Number of values in loop of %s does not "
+                                 "match the number of tags."%loop[0])
+        if "_atom_site_label" not in loop:
+            return None
+        columns = [(i, t) for (i, t) in enumerate(loop) if t in ATOM_TAGS]
+        num = len(loop)
+        return [dict((t, values[j + i]) for (i, t) in columns)
+                for j in range(0, len(values), num)]
+
+    with open(path, "r") as fh:
+        for kind, value in tokenize(fh):
+            if kind == "value":
+                if header:
+                    header = False
+                if loop is not None:
+                    values.append(value)
+                elif tag is not None:
+                    if tag in SCALAR_TAGS:
+                        tags[tag] = value
+                    tag = None
+                else:
+                    raise CifFormatError("Value without tag: %s"%value)
+                continue
+            if tag is not None:
+                raise CifFormatError("Tag without value: %s"%tag)
+            if kind == "tag" and header:
+                loop.append(value)
+                continue
+            found = close_loop(loop, values)
+            if found is not None:
+                if atoms is not None:
+                    raise CifFormatError("Several atom site loops.")
+                atoms = found
+            loop, values, header = None, [], False
+            if kind == "tag":
+                tag = value
+            elif kind == "loop":
+                loop, header = [], True
+            elif kind == "data":
+                blocks += 1
+                if blocks > 1:
+                    raise CifFormatError("Several data blocks.")
+    if tag is not None:
+        raise CifFormatError("Tag without value: %s"%tag)
+    found = close_loop(loop, values)
+    if found is not None:
+        if atoms is not None:
+            raise CifFormatError("Several atom site loops.")
+        atoms = found
+    if not blocks:
+        raise CifFormatError("No data block found.")
+    if atoms is None:
+        raise CifFormatError("No atom site loop found.")
+    missing = [t for t in REQUIRED_TAGS if t not in tags]
+    if missing:
+        raise CifFormatError("Missing entries: %s"%", ".join(missing))
+    return dict(tags=tags, atoms=atoms)
+
+
+def read_cif_full(path):
+    """
+        Same as ``read_cif_fast'' but using the complete parser of PyCifRW.
+    """
+    import CifFile
+    cb = CifFile.ReadCif(path).first_block()
+    tags = dict((t, cb[t]) for t in SCALAR_TAGS if cb.has_key(t))
+    atoms = []
+    for line in cb.GetLoop("_atom_site_label"):
+        atoms.append(dict((t, getattr(line, t)) for t in ATOM_TAGS
+                          if hasattr(line, t)))
+    return dict(tags=tags, atoms=atoms)
+
+
+def read_cif(path):
+    """
+        Reads space group, cell and atom sites of the CIF file ``path''
+        with ``read_cif_fast'' and falls back to ``read_cif_full'' for
+        files it does not support.
+    """
+    try:
+        return read_cif_fast(path)
+    except CifFormatError:
+        return read_cif_full(path)
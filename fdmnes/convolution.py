@@ -0,0 +1,311 @@
+"""
+    Numerical implementation of the FDMNES convolution of absorption
+    spectra. It operates directly on the unconvoluted spectra, e.g. as
+    returned by ``fdmnes.get_XANES(conv=False)'', without running FDMNES.
+
+    The broadening consists of
+        - a cut of the spectrum below the Fermi level ``Efermi''
+          (unless ``Nocut'' is given)
+        - a Lorentzian of energy dependent full width
+              Gamma(E) = Gamma_hole + Gamma_f(E)
+          with the final state width Gamma_f given either by the arctangent
+          model
+              Gamma_f = Gamma_max * (1/2 + 1/pi * arctan(x))
+              x = pi/3 * Gamma_max/Elarg * (e - 1/e**2)
+              e = (E - Efermi)/Ecent
+          or, if ``Seah'' = (A, Gamma_m) is given with A>0, by the
+          Seah-Dench formula
+              Gamma_f = A*Ep*Gamma_m / (A*Ep + Gamma_m),   Ep = E - Efermi
+          Gamma_f vanishes below the Fermi level.
+        - a Gaussian of full width at half maximum ``Gaussian''
+        - a multiplication with the amplitude reduction factor ``S0_2''
+
+    The width is evaluated at the output energy. The kernels are integrated
+    analytically over the energy intervals around each point of the
+    (possibly non-equidistant) energy grid and the spectrum is continued
+    with constant values beyond the grid.
+"""
+import numpy as np
+from . import settings
+
+
+# upper limit for the memory of intermediate arrays in convolve_batch
+MAX_CHUNK_BYTES = 2**26
+
+
+# parameters of the Convolution group that are used here
+PARAMETERS = ["Gamma_hole", "Gamma_max", "Ecent", "Elarg", "Efermi",
+              "Gaussian", "Seah", "Nocut", "S0_2"]
+
+
+# parameters of the Convolution group that do not change the broadening
+IGNORED = ["Convolution", "Calculation", "Check_conv"]
+
+
+def default_parameters():
+    return dict((keyw, settings.Defaults.Convolution[keyw])
+                for keyw in PARAMETERS)
+
+
+def unsupported(params):
+    """
+        Returns the names of the convolution parameters in ``params''
+        (dictionary or ``fdmnes.P'' object, missing values are taken from
+        ``settings.Defaults'') for which the convolution of FDMNES cannot
+        be reproduced by this module: tabulated core hole widths (negative
+        ``Gamma_hole'') and all options not listed in ``PARAMETERS''.
+    """
+    names = []
+    for keyw, default in sorted(settings.Defaults.Convolution.iteritems()):
+        value = params[keyw] if keyw in params else default
+        if keyw == "Gamma_hole":
+            if value < 0:
+                names.append(keyw)
+        elif keyw not in PARAMETERS and keyw not in IGNORED:
+            if not np.array_equal(value, default) and \
+               not (np.isscalar(value) and np.isnan(value)
+                    and np.isnan(default)):
+                names.append(keyw)
+    return names
+
+
+def erf(x):
+    """
+        Vectorized error function (Abramowitz & Stegun 7.1.26,
+        absolute error < 1.5e-7).
+    """
+    x = np.asarray(x, dtype=float)
+    t = 1. / (1. + 0.3275911 * abs(x))
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741
+             + t * (-1.453152027 + t * 1.061405429))))
+    return np.sign(x) * (1. - poly * np.exp(-x*x))
+
+
+def final_state_width(energy, Gamma_max=15., Ecent=30., Elarg=30.,
+                      Efermi=-5., Seah=(0., 0.)):
+    """
+        Energy dependent final state width Gamma_f(E) in eV.
+    """
+    energy = np.asarray(energy, dtype=float)
+    width = np.zeros(energy.shape)
+    Ep = energy - Efermi
+    above = Ep > 0
+    Asea, Gamma_m = Seah
+    if Asea > 0:
+        AE = Asea * Ep[above]
+        width[above] = AE * Gamma_m / (AE + Gamma_m)
+    elif Gamma_max > 0:
+        e = Ep[above] / Ecent
+        arg = np.pi/3. * Gamma_max / Elarg * (e - 1./e**2)
+        width[above] = Gamma_max * (0.5 + np.arctan(arg)/np.pi)
+    return width
+
+
+
+class ConvolutionGrid(object):
+    """
+        Precomputed quantities of an energy grid that are shared by all
+        convolutions on this grid.
+    """
+    def __init__(self, energy):
+        energy = np.asarray(energy, dtype=float)
+        if energy.ndim != 1 or len(energy) < 2:
+            raise ValueError("Energy grid has to be a 1d array of "
+                             "at least 2 points.")
+        if np.any(np.diff(energy) <= 0):
+            raise ValueError("Energy grid has to be strictly increasing.")
+        self.energy = energy
+        # interval boundaries around each point, open at both ends:
+        self.edges = np.hstack((-np.inf, (energy[1:] + energy[:-1])/2.,
+                                np.inf))
+        # distance of the boundaries to each output point
+        self.distance = self.edges[np.newaxis,:] - energy[:,np.newaxis]
+
+    def __len__(self):
+        return len(self.energy)
+
+    def lorentzian(self, width):
+        """
+            Returns the matrix K of the Lorentzian broadening with full
+            width ``width'' (scalar or one value per output energy point),
+            such that K.dot(spectrum) is the broadened spectrum.
+
+            For an array of widths of shape (P, N) a stack of P matrices
+            of shape (N, N) is returned.
+        """
+        width = np.asarray(width, dtype=float)
+        half = np.empty(width.shape[:-1] + (len(self), 1))
+        half[...,0] = width / 2.
+        half = np.maximum(half, np.finfo(float).tiny)
+        with np.errstate(divide="ignore", over="ignore"):
+            cumulative = np.arctan(self.distance / half)
+        return np.diff(cumulative, axis=-1) / np.pi
+
+    def gaussian(self, fwhm):
+        """
+            Returns the matrix of the Gaussian broadening with full width at
+            half maximum ``fwhm''.
+        """
+        if fwhm <= 0:
+            return np.eye(len(self))
+        scale = fwhm / (2. * np.sqrt(2. * np.log(2.))) * np.sqrt(2.)
+        cumulative = erf(self.distance / scale)
+        return np.diff(cumulative, axis=1) / 2.
+
+    def width(self, Gamma_hole=0., Gamma_max=15., Ecent=30., Elarg=30.,
+              Efermi=-5., Seah=(0., 0.), **kwargs):
+        """
+            Total Lorentzian width Gamma_hole + Gamma_f(E) on the grid.
+        """
+        if Gamma_hole < 0:
+            raise ValueError("Tabulated core hole widths are not available."
+                             " Please specify Gamma_hole.")
+        return Gamma_hole + final_state_width(self.energy, Gamma_max, Ecent,
+                                              Elarg, Efermi, Seah)
+
+    def kernel(self, Gamma_hole=0., Gamma_max=15., Ecent=30., Elarg=30.,
+               Efermi=-5., Gaussian=0., Seah=(0., 0.), Nocut=False,
+               S0_2=1.):
+        """
+            Returns the matrix of the full FDMNES convolution for the
+            given parameters (see module documentation).
+        """
+        width = self.width(Gamma_hole, Gamma_max, Ecent, Elarg, Efermi, Seah)
+        K = self.lorentzian(width)
+        if Gaussian > 0:
+            K = self.gaussian(Gaussian).dot(K)
+        if not Nocut:
+            K = K * (self.energy >= Efermi)
+        return S0_2 * K
+
+
+
+def convolve(energy, spectra, **kwargs):
+    """
+        Applies the FDMNES convolution to one or several spectra.
+
+        Input:
+        ------
+            energy : array of length N
+                Energy grid in eV (absolute or relative to the edge,
+                consistent with ``Efermi'').
+            spectra : array of shape (N,) or (N, M)
+                Unconvoluted spectra, one per column.
+            **kwargs :
+                Convolution parameters Gamma_hole, Gamma_max, Ecent, Elarg,
+                Efermi, Gaussian, Seah, Nocut and S0_2 as defined for
+                FDMNES. Missing values are taken from ``settings.Defaults''.
+
+        Returns:
+            array of the same shape as ``spectra''
+    """
+    return convolve_batch(energy, spectra, [kwargs])[0]
+
+
+def parameter_sets(params, defaults=None):
+    """
+        Returns a list of complete parameter dictionaries for ``params''
+        given as
+            - a list of dictionaries
+            - a dictionary of equally long sequences (zipped)
+            - a numpy structured array with parameter names as fields
+        Missing parameters are taken from ``defaults'' or
+        ``settings.Defaults''.
+    """
+    if isinstance(params, np.ndarray) and params.dtype.names:
+        params = dict((name, params[name]) for name in params.dtype.names)
+    if isinstance(params, dict):
+        lengths = set(map(len, params.values()))
+        if len(lengths) > 1:
+            raise ValueError("Parameter sequences differ in length.")
+        num = lengths.pop() if lengths else 0
+        params = [dict((keyw, params[keyw][i]) for keyw in params)
+                  for i in range(num)]
+    result = []
+    for kwargs in params:
+        pset = default_parameters()
+        if defaults is not None:
+            pset.update(defaults)
+        for keyw in kwargs:
+            if keyw not in pset:
+                raise ValueError("Unknown convolution parameter: %s"%keyw)
+        pset.update(kwargs)
+        pset["Seah"] = tuple(pset["Seah"])
+        result.append(pset)
+    return result
+
+
+def convolve_batch(energy, spectra, params):
+    """
+        Applies the FDMNES convolution for many sets of parameters to the
+        same spectra in one pass. The energy grid is prepared only once and
+        the Gaussian kernels are shared between parameter sets of equal
+        ``Gaussian'' width.
+
+        Input:
+        ------
+            energy : array of length N
+                Energy grid in eV.
+            spectra : array of shape (N,) or (N, M)
+                Unconvoluted spectra, one per column.
+            params : list of dicts, dict of sequences or structured array
+                P sets of convolution parameters (see ``parameter_sets'').
+
+        Returns:
+            array of shape (P,) + spectra.shape
+    """
+    params = parameter_sets(params)
+    grid = ConvolutionGrid(energy)
+    spectra = np.asarray(spectra, dtype=float)
+    if spectra.shape[0] != len(grid):
+        raise ValueError("Length of spectra does not match energy grid.")
+    num = len(params)
+    result = np.empty((num,) + spectra.shape)
+
+    # Lorentzian broadening of the Fermi-cut spectra:
+    chunk = max(1, MAX_CHUNK_BYTES // (32 * len(grid)**2))
+    for start in range(0, num, chunk):
+        pchunk = params[start:start+chunk]
+        width = np.array([grid.width(**pset) for pset in pchunk])
+        cut = np.array([(grid.energy >= pset["Efermi"]) | pset["Nocut"]
+                        for pset in pchunk], dtype=float)
+        cut = cut.reshape(cut.shape + (1,)*(spectra.ndim - 1))
+        K = grid.lorentzian(width)
+        result[start:start+chunk] = \
+            np.einsum("pij,pj...->pi...", K, cut * spectra)
+
+    # Gaussian broadening, one kernel per distinct width:
+    fwhm = np.array([pset["Gaussian"] for pset in params])
+    for value in np.unique(fwhm[fwhm > 0]):
+        ind = np.where(fwhm == value)[0]
+        G = grid.gaussian(value)
+        result[ind] = np.einsum("ij,pj...->pi...", G, result[ind])
+
+    result *= np.array([pset["S0_2"] for pset in params]) \
+                .reshape((num,) + (1,)*spectra.ndim)
+    return result
+
+
+def convolve_xanes(data, **kwargs):
+    """
+        Convolution of the output of ``fdmnes.get_XANES(conv=False)'' with
+        the energy in the first column and one spectrum per further column.
+    """
+    data = np.asarray(data, dtype=float)
+    result = data.copy()
+    result[:,1:] = convolve(data[:,0], data[:,1:], **kwargs)
+    return result
+
+
+def convolve_xanes_batch(data, params):
+    """
+        Batched convolution of the output of
+        ``fdmnes.get_XANES(conv=False)'' for many parameter sets.
+
+        Returns:
+            array of shape (P, N) for a single spectrum and (P, N, M) for
+            M absorbers. The energy is the first column of ``data''.
+    """
+    data = np.asarray(data, dtype=float)
+    spectra = data[:,1] if data.shape[1] == 2 else data[:,1:]
+    return convolve_batch(data[:,0], spectra, params)
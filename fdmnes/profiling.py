@@ -0,0 +1,76 @@
+"""
+    Profiling of FDMNES runs based on the tables ``Subroutine times for
+    absorbing atom'' written to the bav files.
+
+    Example:
+        print(profiling.report(glob.glob("sweep/*_bav.txt")))
+"""
+import collections
+from . import readers
+
+
+TOTAL = "Total"
+
+
+def timings(source):
+    """
+        Returns the timing tables of ``source'' which is either the path
+        of a bav file or a finished ``scheduler.Job''. See
+        ``readers.BavReader'' for the format. The tables are copies and
+        may be modified.
+    """
+    if hasattr(source, "path_out"):
+        source = source.path_out + "_bav.txt"
+    return readers.read_bav_timings(source)
+
+
+def aggregate(sources, column="wall"):
+    """
+        Sums the times of each subroutine over all absorbers of all
+        ``sources'' (bav file paths or jobs).
+
+        Input:
+        ------
+            column : string
+                "wall" or "cpu"
+
+        Returns:
+            OrderedDict subroutine -> dict(time, count, fraction) sorted
+            by decreasing time. ``count'' is the number of absorbers in
+            which the subroutine appeared and ``fraction'' is the share of
+            the summed total time.
+    """
+    if isinstance(sources, basestring) or hasattr(sources, "path_out"):
+        sources = [sources]
+    times = collections.defaultdict(float)
+    count = collections.defaultdict(int)
+    for source in sources:
+        for table in timings(source):
+            for name, values in table.iteritems():
+                if column in values:
+                    times[name] += values[column]
+                    count[name] += 1
+    if TOTAL in times:
+        total = times[TOTAL]
+    else:
+        total = sum(times.values())
+    result = collections.OrderedDict()
+    for name in sorted(times, key=lambda name: -times[name]):
+        fraction = times[name] / total if total else 0.
+        result[name] = dict(time=times[name], count=count[name],
+                            fraction=fraction)
+    return result
+
+
+def report(sources, column="wall"):
+    """
+        Returns a text table of the aggregated subroutine times of
+        ``sources'' (see ``aggregate'').
+    """
+    result = aggregate(sources, column)
+    lines = ["%-20s %12s %8s %7s"%("Subroutine", "%s / s"%column,
+                                    "share", "count")]
+    for name, entry in result.iteritems():
+        lines.append("%-20s %12.2f %7.1f%% %7i"%(name, entry["time"],
+                     100*entry["fraction"], entry["count"]))
+    return "\n".join(lines)
@@ -19,8 +19,13 @@ import subprocess
 import string
 import collections
 import settings
+import convolution
+import cifreader
+import readers
+import spacegroups
 import itertools
 import time
+import threading
 from .resources import resource_filename
 
 try:
@@ -59,20 +64,51 @@ def mkfloat(string):
 
 
 
-def keyword_exists(key):
-    key = key.lower()
-    keyset = None
-    if settings.synonyms.has_key(key):
-        return settings.synonyms[key]
+def keyword_index():
+    """
+        Returns a dictionary mapping the lower case names of all FDMNES
+        parameters and their synonyms to the names used in
+        ``settings.Defaults''. Same result as ``keyword_exists''.
+    """
+    index = {}
     for Group in settings.Defaults:
-        keys = Group.keys()
-        keysl = map(str.lower, keys)
-        keysmask = map(lambda s: s==key, keysl)
-        if any(keysmask):
-            i = keysmask.index(True)
-            keyset = keys[i]
-            break
-    return keyset
+        for keyw in Group:
+            index.setdefault(keyw.lower(), keyw)
+    index.update(settings.synonyms)
+    return index
+
+KEYWORDS = keyword_index()
+
+
+def parameter_info():
+    """
+        Returns a dictionary mapping the names of all FDMNES parameters to
+        tuples of default value, type and expected length (0 for any
+        length).
+    """
+    info = {}
+    for keyw, GroupName in settings.GroupMembers.iteritems():
+        DefVal = getattr(settings.Defaults, GroupName)[keyw]
+        DefLen = len(DefVal) if isinstance(DefVal, tuple) else 0
+        info[keyw] = (DefVal, type(DefVal), DefLen)
+    return info
+
+PARAMETERS = parameter_info()
+
+# attributes defining the structure that may be varied like parameters
+STRUCTURE_ATTRIBUTES = ["a", "b", "c", "alpha", "beta", "gamma", "sg"]
+
+# parameters that change the set of written sections
+VARIANT_SWITCHES = set(["SCF", "Convolution", "Calculation", "Extract",
+                        "RXS"])
+
+
+def keyword_exists(key):
+    """
+        Returns the name of the FDMNES parameter ``key'' (case insensitive,
+        synonyms allowed) as used in ``settings.Defaults'' or None.
+    """
+    return KEYWORDS.get(key.lower())
 
 
 class ConsistencyError(Exception):
@@ -97,6 +133,38 @@ def get_polarization(pol):
     return pol
 
 
+def rxs_entry(miller, pol_in, pol_out, azimuth):
+    """
+        Returns the entry of the RXS parameter list for the reflection
+        ``miller'' with incident and scattered polarizations ``pol_in'' and
+        ``pol_out'' at the azimuthal angle ``azimuth'' (see get_DAFS).
+    """
+    assert all(map(lambda x: isinstance(x, (int, long)), miller)) \
+        and len(miller)==3,\
+        "Wrong input for ``miller''- (reflection-) indices. "\
+        "A 3-tuple of type int is required."
+    miller = tuple(miller)
+
+    pol_in = get_polarization(pol_in)
+    if pol_in == None:
+        raise ValueError("Invalid input for pol_in")
+    pol_out = get_polarization(pol_out)
+    if pol_out == None:
+        raise ValueError("Invalid input for pol_out")
+
+    angles = [0,90] # what to do with left and right?
+    if isinstance(pol_in, tuple) and not isinstance(pol_out, tuple):
+        pol_out = (pol_out, angles[pol_out-1])
+    if not isinstance(pol_in, tuple) and isinstance(pol_out, tuple):
+        pol_in = (pol_in, angles[pol_in-1])
+
+    return miller + (pol_in, pol_out, float(azimuth))
+
+
+DAFSBatch = collections.namedtuple("DAFSBatch",
+                    ["energy", "xanes", "reflections", "data", "columns"])
+
+
 def get_energy(Range):
     if len(Range)%2 != 1:
         raise ConsistencyError("Invalid input for Range."
@@ -122,44 +190,28 @@ class Parameters(dict):
             raise TypeError, 'expected dict'
 
     def __setitem__(self, key, value):
-        keyset = keyword_exists(key)
+        keyset = KEYWORDS.get(key.lower())
         if keyset == None:
             raise ValueError(
                 "'%s' not found in list of valid FDMNES parameters."%key
             )
-        else:
-            GroupName = settings.GroupMembers[keyset]
-            DefVal = getattr(settings.Defaults, GroupName)[keyset]
-            Type = type(DefVal)
+        DefVal, Type, DefLen = PARAMETERS[keyset]
+        if type(value) is not Type:
             try:
-                if Type is tuple:
-                    value = tuple((value),)
-                else:
-                    value = Type(value)
+                value = Type(value)
             except TypeError:
                 raise TypeError(
                     'Expected %s for parameter %s'%(Type.__name__, keyset))
-            # deep check:
-            if Type is tuple:
-                DefLen = len(DefVal)
-                if DefLen > 0 and len(value)!=DefLen:
-                    raise ValueError(
-                        "Length of %s is expected to be %i"%(keyset, DefLen))
-                for i in range(DefLen):
-                    try:
-                        value = type(DefVal)(value)
-                    except:
-                        raise TypeError(
-                            "Element %i of %s has to be of type %s"\
-                            %(i, keyset, type(DefVal)))
-            dict.__setitem__(self, keyset, value)
+        if DefLen > 0 and len(value)!=DefLen:
+            raise ValueError(
+                "Length of %s is expected to be %i"%(keyset, DefLen))
+        dict.__setitem__(self, keyset, value)
 
     def __getitem__(self, key):
         if dict.has_key(self, key):
             return dict.__getitem__(self, key)
-        elif settings.GroupMembers.has_key(key):
-            Group = getattr(settings.Defaults, settings.GroupMembers[key])
-            return Group[key]
+        elif key in PARAMETERS:
+            return PARAMETERS[key][0]
         else:
             raise ValueError(
                 "'%s' not found in list of valid FDMNES parameters."%key)
@@ -171,16 +223,34 @@ class Parameters(dict):
 
 
 def parse_bavfile(bavfile):
-    bavinfo = {}
-    with open(bavfile, "r") as bf:
-        bavcont = bf.read()
-        bf.seek(-60, 2)
-        tail = map(str.strip, bf.readlines())
-    bavinfo["success"] = (tail[-1]=='Have a beautiful day !')
-    bavinfo["num_absorber"] = \
-                         bavcont.count("Subroutine times for absorbing atom")
-    
-    return bavinfo
+    """
+        Returns a dictionary with the progress of the FDMNES run writing
+        ``bavfile'' (see ``readers.BavReader''). Only data appended since
+        the previous call for the same file are read.
+    """
+    if not os.path.isfile(bavfile):
+        raise IOError("File not found: %s"%bavfile)
+    return readers.read_bav(bavfile)
+
+
+def next_logpath(job):
+    """
+        Returns the next free log file path ``<job>.<num>.log'' next to
+        the input file ``job''.
+    """
+    basename = os.path.basename(job)
+    basename, ext = os.path.splitext(basename)
+    outdir = os.path.dirname(job)
+    if not outdir:
+        outdir = os.curdir
+    flist = os.listdir(outdir)
+    flist = filter(lambda s: s.startswith(basename), flist)
+    flist = filter(lambda s: s.endswith(".log"), flist)
+    flist = [os.path.splitext(F)[0] for F in flist]
+    lognum = [os.path.splitext(F)[1].strip(os.extsep) for F in flist]
+    lognum = sorted(map(int, filter(str.isdigit, lognum)))
+    lognum = (lognum[-1]+1) if len(lognum) else 0
+    return os.path.join(outdir, basename + ".%i.log"%lognum)
 
 
 
@@ -207,6 +277,9 @@ class fdmnes(object):
                             or
                                 - detailed name of space group 
                                   (including setting)
+                            or
+                                - contents of a .cif-file as returned by
+                                  ``cifreader.read_cif''
         """
         self.positions = collections.OrderedDict() # symmetric unit
         self.Defaults = settings.Defaults
@@ -220,6 +293,14 @@ class fdmnes(object):
         self.jobs = []
         self.proc = []
         self.NumCPU = 1
+        self.timeout = None # wall-clock seconds per FDMNES run
+        self.limits = None # resource limits, see ``scheduler.LIMITS''
+        self._outcomes = {} # process -> "cancelled" or "timeout"
+        self.registry = None # optional registry.JobRegistry
+        self._records = {} # process started by ``Run'' -> registry entry
+        self.launcher = None # see ``scheduler.make_launcher''
+        self.cache = None # optional cache.ResultCache instance
+        self._cache_keys = {}
         
         ### FIND FDMNES ####################################################
         if fdmnes_path==None:
@@ -250,21 +331,20 @@ class fdmnes(object):
         if not os.path.isfile(fpath):
             fpath = resource_filename("spacegroup.txt")
 
-        with open(fpath, "r") as fh:
-            sgcont = filter(lambda s: s.startswith("*"), fh.readlines())
-        sgcont = map(str.strip, sgcont)
-        sgcont = map(lambda s: s.strip("*").replace("=",""), sgcont)
-        sgcont = map(lambda s: s.split(), sgcont)
-        self.spacegroups = sgcont
-        self._spacegroups_flat = list(itertools.chain.from_iterable(sgcont))
-        
+        self._sgtable = spacegroups.load(fpath)
+        self.spacegroups = self._sgtable.rows
+        self._spacegroups_flat = self._sgtable.flat
+
         ### LOAD STRUCTURE #################################################
         try:
-            if structure in self._spacegroups_flat:
+            if structure in self._sgtable:
                 self.sg = structure
                 self.a, self.b, self.c, \
                 self.alpha, self.beta, self.gamma = 1, 1, 1, 90, 90, 90
                 self.cif = False
+            elif isinstance(structure, dict):
+                self.load_cif_record(structure, resonant)
+                self.cif = True
             elif hasattr(structure, "__iter__") and len(structure)==6:
                 structure = map(float, structure)
                 self.a, self.b, self.c, \
@@ -286,6 +366,17 @@ class fdmnes(object):
         
     
     
+    def _element_counts(self):
+        """
+            Returns a Counter of the elements in ``self.elements''. It is
+            recomputed only if ``self.elements'' was changed by other means
+            than ``add_atom''.
+        """
+        if getattr(self, "_counts_size", -1) != len(self.elements):
+            self._counts = collections.Counter(self.elements.itervalues())
+            self._counts_size = len(self.elements)
+        return self._counts
+
     def add_atom(self, label, position, resonant=False, occupancy=1.):
         """
             Method to give parameters for the FDMNES calculation.
@@ -318,13 +409,15 @@ class fdmnes(object):
         if len(label) > 1:
             labeltest += label[1].lower()
 
+        counts = self._element_counts()
+        size = len(self.elements)
         if labeltest in SymList:
-            num = self.elements.values().count(labeltest) + 1
+            num = counts[labeltest] + 1
             label += str(num)
 
             self.elements[label] = labeltest
         elif labeltest[:1] in SymList:
-            num = self.elements.values().count(labeltest[:1]) + 1
+            num = counts[labeltest[:1]] + 1
             label += str(num)
 
             self.elements[label] = labeltest[:1]
@@ -332,6 +425,11 @@ class fdmnes(object):
             raise ValueError("Atom label shall start with the symbol of the"
                              " chemical element. "
                              "Chemical element not found in %s"%label)
+        if len(self.elements) == size + 1:
+            counts[self.elements[label]] += 1
+            self._counts_size += 1
+        else: # label replaced
+            self._counts_size = -1
 
         self.Z[label] = elements.Z[self.elements[label]]
         self.positions[label] = position
@@ -364,14 +462,30 @@ class fdmnes(object):
         """
         if not os.path.isfile(path):
             raise IOError("File not found!")
-        import CifFile
         try:
-            cf = CifFile.ReadCif(path)
-            cb = cf.first_block()
+            cif = cifreader.read_cif(path)
         except Exception as e:
             print("File doesn't seem to be a valid .cif file: %s"%path)
             print e
             return
+        self.load_cif_record(cif, resonant, path)
+
+    def load_cif_record(self, cif, resonant="", path=None):
+        """ Method to load a structure from the contents of a CIF file
+            as returned by ``cifreader.read_cif''.
+
+            Input:
+            ------
+            cif : dict
+                The parsed CIF file with the entries ``tags'' and ``atoms''.
+            resonant: string
+                Symbol of the resonant atom.
+            path : string
+                The path of the CIF file (only used for error messages).
+        """
+        if path is None:
+            path = cif.get("path", "<record>")
+        tags = cif["tags"]
         
         self.Crystal = True
         # Reset Structure:
@@ -381,12 +495,12 @@ class fdmnes(object):
         self.P.Absorber = ()
         self.P.Z_absorber = 0
         
-        if cb.has_key("_symmetry_int_tables_number"):
-            sg_num = int(cb["_symmetry_int_tables_number"])
+        if tags.has_key("_symmetry_int_tables_number"):
+            sg_num = int(tags["_symmetry_int_tables_number"])
             self.sg_num = str(sg_num)
         
-        if cb.has_key("_symmetry_space_group_name_h-m"):
-            self.sg_name = cb["_symmetry_space_group_name_h-m"]
+        if tags.has_key("_symmetry_space_group_name_h-m"):
+            self.sg_name = tags["_symmetry_space_group_name_h-m"]
             self.sg_name = "".join(self.sg_name.split())
             i = self.sg_name.find(":")
             if i>=0 and hasattr(self, "sg_num"):
@@ -404,30 +518,30 @@ class fdmnes(object):
         else:
             raise ValueError("No valid space group given in .cif file.")
         
-        self.a = mkfloat(cb["_cell_length_a"])
-        self.b = mkfloat(cb["_cell_length_b"])
-        self.c = mkfloat(cb["_cell_length_c"])
-        self.alpha = mkfloat(cb["_cell_angle_alpha"])
-        self.beta  = mkfloat(cb["_cell_angle_beta"])
-        self.gamma = mkfloat(cb["_cell_angle_gamma"])
+        self.a = mkfloat(tags["_cell_length_a"])
+        self.b = mkfloat(tags["_cell_length_b"])
+        self.c = mkfloat(tags["_cell_length_c"])
+        self.alpha = mkfloat(tags["_cell_angle_alpha"])
+        self.beta  = mkfloat(tags["_cell_angle_beta"])
+        self.gamma = mkfloat(tags["_cell_angle_gamma"])
         
         if isinstance(resonant, str):
             resonant = [resonant]
         elif hasattr(resonant, "__iter__"):
             pass
         
-        for line in cb.GetLoop("_atom_site_label"):
-            label = str(line._atom_site_label)
-	    if hasattr(line, "_atom_site_type_symbol"):
-                symbol = line._atom_site_type_symbol
+        for site in cif["atoms"]:
+            label = str(site["_atom_site_label"])
+            if site.has_key("_atom_site_type_symbol"):
+                symbol = str(site["_atom_site_type_symbol"])
                 symbol = filter(str.isalpha, symbol)
             else:
                 symbol = filter(str.isalpha, label)
-            px = mkfloat(line._atom_site_fract_x)
-            py = mkfloat(line._atom_site_fract_y)
-            pz = mkfloat(line._atom_site_fract_z)
-            if hasattr(line, "_atom_site_occupancy"):
-                occ = mkfloat(line._atom_site_occupancy)
+            px = mkfloat(site["_atom_site_fract_x"])
+            py = mkfloat(site["_atom_site_fract_y"])
+            pz = mkfloat(site["_atom_site_fract_z"])
+            if site.has_key("_atom_site_occupancy"):
+                occ = mkfloat(site["_atom_site_occupancy"])
             else:
                 occ = 1.
             position = (px, py, pz)
@@ -457,11 +571,10 @@ class fdmnes(object):
     
     def _check_sg(self, sg, raiseError=True):
         sg = str(sg)
-        if sg in self._spacegroups_flat:
+        if sg in self._sgtable:
             return True
         else:
-            sgstr = map(lambda s: ", ".join(s), self.spacegroups)
-            foundgroup = filter(lambda s: sg in s, sgstr)
+            foundgroup = map(", ".join, self._sgtable.suggestions(sg))
             message = os.linesep.join(foundgroup)
             if len(foundgroup):
                 message = "Did you mean one of the following groups?:%s%s"\
@@ -482,35 +595,39 @@ class fdmnes(object):
                 return False
     
     def _parse_input_file(self, fpath):
-        with open(fpath, "r") as fh:
-            content = fh.readlines()
-        
-        content = map(str.strip, content)
-        content = filter(lambda s: not s.startswith("!"), content)
-        content = map(lambda s: s.split("!")[0], content)
-        content = map(str.strip, content)
-        content = filter(lambda s: bool(s), content)
-        
+        """
+            Reads the FDMNES input file ``fpath'' in a single pass. Lines
+            are assigned to the last keyword found in ``KEYWORDS''.
+        """
         Param = dict()
         keyw = None
         sg = None
-        while content:
-            line = content.pop(0)
-            lline = line.lower()
-            if lline == "filout" or lline=="conv_out":
-                path_out = content.pop(0)
-                #bavfile = path_out + "_bav.txt"
-            elif lline == "spgroup":
-                sg = content.pop(0)
-            elif lline.startswith("crystal") or lline.startswith("molecule"):
-                keyw = lline.capitalize()
-                Param[keyw] = []
-            elif lline=="end":
-                break
-            else:
-                nextkeyw = keyword_exists(line)
-                if nextkeyw:
-                    keyw = nextkeyw
+        path_out = None
+        nextline = None # keyword that takes the next line as value
+        with open(fpath, "r") as fh:
+            for line in fh:
+                line = line.split("!")[0].strip()
+                if not line:
+                    continue
+                if nextline is not None:
+                    if nextline == "spgroup":
+                        sg = line
+                    else:
+                        path_out = line
+                    nextline = None
+                    continue
+                lline = line.lower()
+                if lline == "filout" or lline=="conv_out" \
+                                     or lline == "spgroup":
+                    nextline = lline
+                elif lline.startswith("crystal") or \
+                     lline.startswith("molecule"):
+                    keyw = lline.capitalize()
+                    Param[keyw] = []
+                elif lline=="end":
+                    break
+                elif lline in KEYWORDS:
+                    keyw = KEYWORDS[lline]
                     Param[keyw] = []
                 elif keyw!=None:
                     Param[keyw].append(line)
@@ -571,9 +688,13 @@ class fdmnes(object):
         output.append("  %g %g %g %g %g %g" %cell)
         
         self.check_parameters("Atom", settings.Defaults.Basic)
+        atomnums = {}
+        if hasattr(self.P, "Atom") and len(self.P.Atom):
+            for i, at in enumerate(self.P.Atom):
+                atomnums.setdefault(at[0], i+1)
         for label in self.positions.iterkeys():
-            if hasattr(self.P, "Atom") and len(self.P.Atom):
-                atomnum = [at[0] for at in self.P.Atom].index(self.Z[label])+1
+            if atomnums:
+                atomnum = atomnums[self.Z[label]]
             else:
                 atomnum = self.Z[label]
             pos = tuple(self.positions[label])
@@ -588,28 +709,18 @@ class fdmnes(object):
         
         return output
     
-    def WriteInputFile(self, path, overwrite=False, update=True):
-        """ 
-            Method writes an input file for the FDMNES calculation.
-            The calculation parameters, for example Range and Radius etc., 
-            are taken from the ``P'' object. 
-         
-            Input:
-            ------
-            path : string
-                Path to of the input file.
-            overwrite : bool
-                Has to be True to overwrite existing input file.
+    def _output_base(self, path, convonly=None):
+        """
+            Returns the output base (``Filout'') for the input file
+            ``path'' and whether only the convolution is performed
+            (derived from the parameters if ``convonly'' is None).
         """
-        if os.path.isfile(path) and not overwrite:
-            raise IOError("File %s already exists. "
-                          "Use overwrite=True to replace it."%path)
-        
         basepath, ext = os.path.splitext(path)
         dirname, basename = os.path.split(basepath)
         
-        conv = self.P.has_key("Convolution") and self.P.Convolution
-        convonly = bool(conv and len(self.P.Calculation))
+        if convonly is None:
+            conv = self.P.has_key("Convolution") and self.P.Convolution
+            convonly = bool(conv and len(self.P.Calculation))
         
         basename = basename.replace("_conv", "")
         suffix = "_out_conv" if convonly else "_out"
@@ -617,20 +728,67 @@ class fdmnes(object):
             base_out = basename.replace("_inp", suffix)
         else:
             base_out = basename + suffix
+        return os.path.join(dirname, base_out), convonly
+    
+    def _input_sections(self, path_out, convonly=False, cache=None,
+                              placeholders=()):
+        """
+            Generator of the sections of the input file as pairs of name
+            (``Filout'', ``Folder_dat'', ``structure'' or a parameter
+            keyword) and text. Sections found in the dictionary ``cache''
+            are not rendered again, newly rendered ones are added to it.
+            Sections named in ``placeholders'' are yielded with text None
+            at their position, whatever their value.
+        """
+        if cache is None:
+            cache = {}
+        if convonly:
+            yield "Filout", "Conv_out" + os.linesep + path_out + ".txt"
+        else:
+            yield "Filout", "Filout" + os.linesep + path_out
+        yield "Folder_dat", "Folder_dat" + os.linesep + self.fdmnes_dir
         
-        path_out = os.path.join(dirname, base_out)
-        if update:
-            self.path_out = path_out
-        
-        
-        output = ["Filout"] if not convonly else ["Conv_out"]
-        output.append(path_out + ".txt"*convonly)
-        output.append("")
-        
-        output.append("Folder_dat")
-        output.append(self.fdmnes_dir)
-        output.append("")
+        if not convonly and "structure" in placeholders:
+            yield "structure", None
+        elif not convonly:
+            if "structure" not in cache:
+                cache["structure"] = os.linesep.join(self.write_structure())
+            yield "structure", cache["structure"]
         
+        for Group in settings.Defaults:
+            if self._skip_group(Group):
+                continue
+            for keyw in Group.iterkeys():
+                if keyw in placeholders:
+                    yield keyw, None
+                elif keyw in self.P and self.P[keyw]!=Group[keyw]:
+                    if keyw not in cache:
+                        self.check_parameters(keyw, Group)
+                        value = param2str(self.P[keyw])
+                        cache[keyw] = keyw + os.linesep + value if value \
+                                      else keyw
+                    yield keyw, cache[keyw]
+    
+    def _render_input(self, fh, path_out, convonly=False, cache=None,
+                            verbose=False):
+        """
+            Writes the input file for output base ``path_out'' to the file
+            handle ``fh'' section by section. Sections are separated by an
+            empty line.
+        """
+        sections = self._input_sections(path_out, convonly, cache)
+        for i, (name, text) in enumerate(sections):
+            if i:
+                fh.write(os.linesep*2)
+            fh.write(text)
+            if verbose and name in self.P:
+                print("-> %s"%name)
+        fh.write(os.linesep*2)
+        fh.write("! Wrote file at %s"%time.ctime())
+        fh.write(os.linesep + "End")
+    
+    def _write_input(self, path, path_out, convonly, cache=None,
+                           verbose=False):
         if self.P.Extract:
             self.bavfile = self.P.Extract
         else:
@@ -638,50 +796,175 @@ class fdmnes(object):
         
         if not convonly:
             self.P.Calculation = []
-            output.extend(self.write_structure())
+            if self.cache is not None:
+                self._cache_keys[os.path.abspath(path)] = \
+                    (self.cache.key(self), os.path.abspath(path_out))
         
-        for Group in settings.Defaults:
-            if self._skip_group(Group):
-                continue
-            for keyw in Group.iterkeys():
-                if keyw in self.P and self.P[keyw]!=Group[keyw]:
-                    self.check_parameters(keyw, Group)
-                    print("-> %s"%keyw)
-                    value = param2str(self.P[keyw])
-                    output.append(keyw)
-                    if value:
-                        output.append(value)
+        try:
+            with open(path, "w") as fh:
+                self._render_input(fh, path_out, convonly, cache, verbose)
+        except Exception:
+            if os.path.isfile(path):
+                os.remove(path)
+            raise
+    
+    def WriteInputFile(self, path, overwrite=False, update=True):
+        """ 
+            Method writes an input file for the FDMNES calculation.
+            The calculation parameters, for example Range and Radius etc., 
+            are taken from the ``P'' object. 
+         
+            Input:
+            ------
+            path : string
+                Path to of the input file.
+            overwrite : bool
+                Has to be True to overwrite existing input file.
+        """
+        if os.path.isfile(path) and not overwrite:
+            raise IOError("File %s already exists. "
+                          "Use overwrite=True to replace it."%path)
         
-        # print empty line before each keyword
-        for keyw in self.P.keys():
-            if keyw in output:
-                ind = output.index(keyw)
-                output.insert(ind, "")
-        output.append("")
-        output.append("! Wrote file at %s"%time.ctime())
-        output.append("End")
+        path_out, convonly = self._output_base(path)
+        if update:
+            self.path_out = path_out
+        
+        self._write_input(path, path_out, convonly, verbose=True)
         if convonly:
             self.path_conv = path
         elif update:
             self.path = path
-        with open(path, "w") as f:
-            f.writelines(os.linesep.join(output))
+    
+    def WriteInputFiles(self, paths, variants, overwrite=False):
+        """
+            Writes one input file for each variant of the current
+            simulation. A variant is a dictionary of FDMNES parameters or
+            structure attributes (see ``STRUCTURE_ATTRIBUTES'') and their
+            values. Only the sections of the input file that are changed by
+            a variant are rendered again. The state of the instance is
+            restored afterwards.
+         
+            Input:
+            ------
+            paths : list of strings
+                Paths of the input files.
+            variants : list of dicts
+                Values to be changed for the respective input file.
+            overwrite : bool
+                Has to be True to overwrite existing input files.
+
+            Returns:
+                list of output bases
+        """
+        paths = list(paths)
+        variants = list(variants)
+        if len(paths) != len(variants):
+            raise ValueError("Number of paths (%i) and variants (%i) differ."
+                             %(len(paths), len(variants)))
+        if not overwrite:
+            for path in paths:
+                if os.path.isfile(path):
+                    raise IOError("File %s already exists. "
+                                  "Use overwrite=True to replace it."%path)
+        base = {} # sections of the unchanged simulation
+        if paths:
+            path_out, convonly = self._output_base(paths[0])
+            if not convonly:
+                self.P.Calculation = []
+            for section in self._input_sections(path_out, convonly, base):
+                pass
+        outputs = []
+        for path, variant in zip(paths, variants):
+            restore, changed = self._apply(variant)
+            try:
+                if changed.intersection(VARIANT_SWITCHES):
+                    cache = {}
+                else:
+                    cache = dict((name, text) for (name, text)
+                                 in base.iteritems() if name not in changed)
+                path_out, convonly = self._output_base(path)
+                self._write_input(path, path_out, convonly, cache)
+                outputs.append(path_out)
+            finally:
+                restore()
+        return outputs
+    
+    def _apply(self, values):
+        """
+            Sets the FDMNES parameters and structure attributes given by
+            the dictionary ``values''.
+
+            Returns:
+                function that restores the previous state
+                set of the changed sections (keywords and ``structure'')
+        """
+        undo = []
+        changed = set()
+        for keyw, value in values.iteritems():
+            if keyw in STRUCTURE_ATTRIBUTES:
+                undo.append((keyw, getattr(self, keyw, None),
+                             hasattr(self, keyw)))
+                setattr(self, keyw, value)
+                changed.add("structure")
+                continue
+            keyset = keyword_exists(keyw)
+            if keyset is None:
+                raise ValueError("'%s' is neither a valid FDMNES parameter "
+                                 "nor a structure attribute."%keyw)
+            undo.append((keyset, dict.get(self.P, keyset), keyset in self.P))
+            self.P[keyset] = value
+            changed.add(keyset)
+            if keyset == "Atom":
+                changed.add("structure")
+        def restore():
+            for keyw, value, existed in reversed(undo):
+                if keyw in STRUCTURE_ATTRIBUTES:
+                    if existed:
+                        setattr(self, keyw, value)
+                    else:
+                        delattr(self, keyw)
+                elif existed:
+                    dict.__setitem__(self.P, keyw, value)
+                else:
+                    dict.__delitem__(self.P, keyw)
+        return restore, changed
     
     
     def Run(self, job=None, wait=True, logpath=None, verbose=False, 
-                  writeonly = False, command = None):
+                  writeonly = False, command = None, launcher = None):
         """
             Method to write the ``fdmfile.txt'' and, subsequently, to start
             the FDMNES simulation. The simulation will be perfomed for the
             specified job.  If it is None, the last job (input file) will be
             run.
             
+            The FDMNES process is started by ``launcher'' (default:
+            ``self.launcher'', see ``scheduler.make_launcher''), e.g.
+            "mpi" for ``mpirun -np <NumCPU>''. ``command'' replaces the
+            whole command line. Errors starting the process are printed
+            and raised.
+            
+            FDMNES runs in its own session (POSIX) and does not receive a
+            Ctrl-C in the terminal: an interrupted ``wait'' terminates it,
+            a process started with ``wait=False'' is interrupted only if
+            the interpreter exits because of Ctrl-C.
+        
+            Returns:
+                the number of the started process (``jobID''), the input
+                file with ``writeonly'' or, if the results were taken from
+                ``self.cache'', a finished ``scheduler.Job''. ``Status'',
+                ``cancel'' and ``RemoveJob'' accept both.
         """
         if job==None:
             job = self.path
         if not os.path.isfile(job):
             raise ValueError("File not found:"%job)
         
+        if not writeonly:
+            written = self._cache_lookup(job)
+            if written is not None:
+                from .scheduler import Job
+                return Job.finished(job, written, self.fdmnes_exe)
         
         fdmfile = "fdmfile.txt"
         
@@ -698,19 +981,10 @@ class fdmnes(object):
             return job
         
         if logpath==None and not verbose:
-            basename = os.path.basename(job)
-            basename, ext = os.path.splitext(basename)
-            outdir = os.path.dirname(job)
-            if not outdir:
-                outdir = os.curdir
-            flist = os.listdir(outdir)
-            flist = filter(lambda s: s.startswith(basename), flist)
-            flist = filter(lambda s: s.endswith(".log"), flist)
-            flist = [os.path.splitext(F)[0] for F in flist]
-            lognum = [os.path.splitext(F)[1].strip(os.extsep) for F in flist]
-            lognum = sorted(map(int, lognum))
-            lognum = (lognum[-1]+1) if len(lognum) else 0
-            logpath = os.path.join(outdir, basename + ".%i.log"%lognum)
+            logpath = next_logpath(job)
+        
+        from .scheduler import check_limits
+        check_limits(self.limits)
         
         #errfile = open(os.path.join(self.workdir, "fdmnes_error.txt", "w"))
         if verbose:
@@ -719,37 +993,384 @@ class fdmnes(object):
             logfile = open(logpath, "w")
             stdout = logfile
             print("Writing output to: %s"%logpath)
+        from .scheduler import child_setup, make_launcher, forward_interrupt
         try:
             if command==None:
-                command = self.fdmnes_exe
-            self.proc.append(subprocess.Popen(command, stdout=stdout))
+                launcher = make_launcher(launcher or self.launcher)
+                command = launcher.command(self.fdmnes_exe,
+                                           launcher.ranks or self.NumCPU)
+            proc = subprocess.Popen(command, stdout=stdout,
+                                    preexec_fn=child_setup(self.limits))
                                                       #stderr = errfile)
-            self.jobs.append(job)
-            jobID = len(self.proc)
-            if wait:
-                self.proc[-1].wait()
-                self.RemoveJob(-1)
-                print("FDMNES simulation finished.")
-            else:
-                print("FDMNES process #%i started in background."%jobID)
-                print("See the ``Status'' method for details.")
         except Exception as e:
             print("An error occured when running FDMNES command:")
             print(command)
             print("Message: %s"%e)
+            raise
         finally:
-            if not verbose:
+            if not verbose: # the child process holds its own copy
                 logfile.close()
+        forward_interrupt(proc)
+        self.proc.append(proc)
+        self.jobs.append(job)
+        jobID = len(self.proc)
+        if self.timeout is not None:
+            timer = threading.Timer(self.timeout, self._expire, [proc])
+            timer.daemon = True
+            timer.start()
+        self._record_run(job, proc, logpath)
+        if wait:
+            try:
+                proc.wait()
+            except KeyboardInterrupt: # not sent to the new session
+                self._terminate(proc)
+                raise
+            if self.timeout is not None:
+                timer.cancel()
+            self.RemoveJob(-1)
+            outcome = self._outcomes.pop(proc, None)
+            if outcome is not None:
+                print("FDMNES simulation stopped (%s)."%outcome)
+            else:
+                self._cache_store(job)
+                print("FDMNES simulation finished.")
+        else:
+            print("FDMNES process #%i started in background."%jobID)
+            print("See the ``Status'' method for details.")
         return jobID
     
+    def _terminate(self, proc):
+        """
+            Terminates the process tree of the FDMNES process ``proc''
+            started by ``Run''. SIGKILL follows after
+            ``scheduler.KILL_GRACE'' seconds.
+        """
+        from .scheduler import terminate_tree
+        terminate_tree(proc.pid, lambda: proc.returncode is not None, proc)
+    
+    def _expire(self, proc):
+        if proc.returncode is None:
+            self._outcomes[proc] = "timeout"
+            self._terminate(proc)
+    
+    def cancel(self, jobID=None):
+        """
+            Terminates a running simulation together with all its child
+            processes.
+            
+            Input:
+            ------
+                jobID: int or scheduler.Job
+                    Index of the process started by ``Run'' as used by
+                    ``Status'' (default: the last one) or a job returned
+                    by ``RunParallel'' or ``run_async''.
+            
+            Returns:
+                False, if the simulation is not running anymore
+        """
+        if hasattr(jobID, "cancel"):
+            return jobID.cancel()
+        if not len(self.proc):
+            return False
+        if jobID==None:
+            jobID = -1
+        proc = self.proc[jobID]
+        if proc.poll() is not None:
+            return False
+        self._outcomes[proc] = "cancelled"
+        self._terminate(proc)
+        return True
+    
+    def RunParallel(self, jobs=None, wait=True, scratch_dir=None,
+                          keep_scratch=False, callback=None, launcher=None):
+        """
+            Method to run several simulations concurrently. Up to
+            ``self.NumCPU'' FDMNES processes are started at the same time,
+            each of them in its own scratch directory with its own
+            ``fdmfile.txt''. The output files are moved to the output
+            directory of the respective input file after the run.
+
+            Input:
+            ------
+                jobs: list of strings
+                    Paths of the input files. By default, the last written
+                    input file is run.
+                wait: bool
+                    Block until all jobs are finished.
+                scratch_dir: string
+                    Directory for the scratch directories.
+                keep_scratch: bool
+                    Keep the scratch directories for debugging.
+                callback: callable
+                    Function called with each ``scheduler.Job'' as soon
+                    as it is finished.
+                launcher: scheduler.Launcher or string
+                    Starts the FDMNES processes (default: ``self.launcher'',
+                    see ``scheduler.make_launcher''). With MPI launchers,
+                    ``NumCPU'' is the number of cores shared by the jobs.
+
+            Returns:
+                list of ``scheduler.Job'' instances. Use
+                ``scheduler.wait_any'' and ``scheduler.wait_all'' to wait
+                for jobs started with ``wait=False''.
+        """
+        from .scheduler import wait_all
+        if jobs==None:
+            jobs = [self.path]
+        if isinstance(jobs, str):
+            jobs = [jobs]
+        self._scheduler(scratch_dir, keep_scratch)
+        joblist = self._submit_many(jobs, callback, launcher)
+        if wait:
+            wait_all(joblist)
+        return joblist
+
+    def _scheduler(self, scratch_dir=None, keep_scratch=False):
+        """
+            Returns the ``scheduler.JobScheduler'' of this instance,
+            configured with the current ``NumCPU''.
+        """
+        from .scheduler import JobScheduler
+        if not hasattr(self, "scheduler"):
+            self.scheduler = JobScheduler(self.fdmnes_exe, self.NumCPU,
+                                          verbose=self.verbose)
+        self.scheduler.NumCPU = self.NumCPU
+        self.scheduler.timeout = self.timeout
+        self.scheduler.limits = self.limits
+        self.scheduler.registry = self.registry
+        self.scheduler.launcher = self.launcher
+        self.scheduler.scratch_dir = scratch_dir
+        self.scheduler.keep_scratch = keep_scratch
+        return self.scheduler
+
+    def _submit(self, job, logpath=None, on_output=None, callback=None,
+                      launcher=None):
+        """
+            Submits the input file ``job'' to the scheduler configured by
+            ``_scheduler'' or, if its results are cached, returns a
+            finished ``scheduler.Job''.
+        """
+        return self._submit_many([job], callback, launcher, logpath,
+                                 on_output)[0]
+
+    def _submit_many(self, paths, callback=None, launcher=None,
+                           logpath=None, on_output=None):
+        """
+            Submits the input files ``paths'' to the scheduler as one
+            batch (see ``scheduler.JobScheduler.submit_many''). Cached
+            results are returned as finished jobs.
+        """
+        from .scheduler import Job
+        joblist = [None]*len(paths)
+        todo = []
+        for i, path in enumerate(paths):
+            written = self._cache_lookup(path)
+            if written is None:
+                todo.append(i)
+            else:
+                joblist[i] = Job.finished(path, written)
+        submitted = self.scheduler.submit_many([paths[i] for i in todo],
+                                               on_output, launcher, logpath)
+        for i, job in zip(todo, submitted):
+            joblist[i] = job
+        for job in joblist:
+            job.add_done_callback(self._job_done)
+            if callback is not None:
+                job.add_done_callback(callback)
+        return joblist
+
+    def reattach(self, resubmit=False, callback=None):
+        """
+            Returns the jobs recorded in ``self.registry'' (see
+            ``registry.JobRegistry.reattach''), e.g. after a restart of
+            the interpreter. Jobs that are still running are followed in
+            the background.
+            
+            Input:
+            ------
+                resubmit: bool
+                    Submit the jobs that were queued but never started
+                    (status "lost") again.
+                callback: callable
+                    Function called with each job as soon as it is
+                    finished.
+        """
+        if self.registry is None:
+            raise ValueError("No job registry assigned (``registry'').")
+        jobs = self.registry.reattach(self.fdmnes_exe)
+        if resubmit:
+            self._scheduler()
+        for i, job in enumerate(jobs):
+            if resubmit and job.status == "lost" and os.path.isfile(job.path):
+                jobs[i] = self._submit(job.path, callback=callback)
+                continue
+            job.add_done_callback(self._job_done)
+            if callback is not None:
+                job.add_done_callback(callback)
+        return jobs
+    
+    def run_async(self, job=None, logpath=None, on_output=None,
+                        callback=None, launcher=None):
+        """
+            Starts the simulation of the input file ``job'' (default: the
+            last written one) in the background and returns at once. At
+            most ``NumCPU'' simulations run at the same time, further ones
+            are queued.
+
+            Input:
+            ------
+                job: string
+                    Path of the input file.
+                logpath: string
+                    Log file (default: ``next_logpath(job)'').
+                on_output: callable
+                    Function called with each line of FDMNES output as
+                    soon as it is written.
+                callback: callable
+                    Function called with the ``scheduler.Job'' as soon as
+                    it is finished.
+                launcher: scheduler.Launcher or string
+                    Starts the FDMNES process (default: ``self.launcher'').
+
+            Returns:
+                ``scheduler.Job'' instance: ``result()'' blocks until it is
+                finished and returns the list of output files,
+                ``cancel()'' kills the FDMNES process.
+        """
+        if job==None:
+            job = self.path
+        self._scheduler()
+        return self._submit(job, logpath, on_output, callback, launcher)
+
+    def convolve_async(self, path=None, overwrite=False, on_output=None,
+                             callback=None):
+        """
+            Background version of ``DoConvolution''. The convolution input
+            file is written at once, the ``result()'' of the returned
+            ``scheduler.Job'' is the convoluted spectrum. See ``run_async''.
+        """
+        path = self.DoConvolution(path, overwrite, writeonly=True)
+        fpath = self._output_base(path, True)[0] + ".txt"
+        self._scheduler()
+        job = self._submit(path, on_output=on_output, callback=callback)
+        job.reader = lambda job: readers.SpectrumFiles([fpath]).select()
+        return job
+
+    def get_DAFS_async(self, miller, pol_in, pol_out, azimuth, conv=True,
+                             on_output=None, callback=None):
+        """
+            Background version of ``get_DAFS''. The Extract input file is
+            written at once, the ``result()'' of the returned
+            ``scheduler.Job'' are the DAFS data. See ``run_async''.
+        """
+        conv = bool(conv)
+        rxs = [rxs_entry(miller, pol_in, pol_out, azimuth)]
+        path = self._write_extract(rxs, conv)
+        self._scheduler()
+        job = self._submit(path, on_output=on_output, callback=callback)
+        job.reader = lambda job: self._read_DAFS(conv)
+        return job
+
+    def _job_done(self, job):
+        if job.status == "finished":
+            self._cache_store(job.path)
+
+    def _cache_lookup(self, job):
+        """
+            Copies cached results for the input file ``job'' to its output
+            base. Returns the list of written files or None if there are
+            none.
+        """
+        if self.cache is None:
+            return None
+        key, path_out = self._cache_keys.get(os.path.abspath(job),
+                                             (None, None))
+        written = self.cache.lookup(key, path_out)
+        if written is not None:
+            print("Results for %s taken from cache."%job)
+            if os.path.isfile(path_out + "_bav.txt"):
+                self.bavinfo = parse_bavfile(path_out + "_bav.txt")
+        return written
+
+    def _cache_store(self, job):
+        """
+            Stores the results of the successfully finished input file
+            ``job'' in the cache.
+        """
+        if self.cache is None:
+            return False
+        key, path_out = self._cache_keys.get(os.path.abspath(job),
+                                             (None, None))
+        if key is None or not os.path.isfile(path_out + "_bav.txt"):
+            return False
+        if not parse_bavfile(path_out + "_bav.txt")["success"]:
+            return False
+        return self.cache.store(key, path_out)
+
+    def _record_run(self, job, proc, logpath):
+        """
+            Records the FDMNES process ``proc'' started by ``Run'' for the
+            input file ``job'' in ``self.registry''. FDMNES writes its
+            output in place, so there is no scratch directory.
+        """
+        if self.registry is None:
+            return
+        from .scheduler import Job
+        entry = Job(job, self.fdmnes_exe, logpath)
+        path_out = self._parse_input_file(job)["path_out"]
+        if path_out is None: # FDMNES default, written to the cwd
+            path_out = "fdmnes_out"
+        entry.path_out = os.path.abspath(path_out)
+        entry.pid = proc.pid
+        entry.started = time.time()
+        entry.status = "running"
+        entry.registry = self.registry
+        entry._record()
+        self._records[proc] = entry
+
+    def _finish_record(self, proc):
+        """
+            Records the outcome of the finished process ``proc'' started
+            by ``Run''.
+        """
+        entry = self._records.get(proc)
+        if entry is None or proc.poll() is None:
+            return
+        del self._records[proc]
+        entry.returncode = proc.returncode
+        if proc in self._outcomes:
+            entry.status = self._outcomes[proc]
+        else:
+            entry._evaluate()
+        entry._record()
+
     def RemoveJob(self,jobID):
+        if hasattr(jobID, "done"): # scheduler.Job, not in the process list
+            return
         NumProc = len(self.proc)
+        self._finish_record(self.proc[jobID])
         if jobID==-1 or jobID == NumProc-1:
             self.jobs.pop()
             self.proc.pop()
         else:
-            del jobs[jobID]
-            del proc[jobID]
+            del self.jobs[jobID]
+            del self.proc[jobID]
+
+    def _bav_path(self, job):
+        """
+            Returns the path of the bav file written for the input file
+            ``job''. The input file is parsed only once.
+        """
+        if not hasattr(self, "_bavfiles"):
+            self._bavfiles = {}
+        if job not in self._bavfiles:
+            ParamIn = self._parse_input_file(job)
+            P = ParamIn["Param"]
+            if P.has_key("Extract") and P["Extract"][0]:
+                self._bavfiles[job] = P["Extract"][0]
+            else:
+                self._bavfiles[job] = ParamIn["path_out"] + "_bav.txt"
+        return self._bavfiles[job]
 
     def Status(self, jobID=None, full_output=False, verbose=True):
         """ 
@@ -759,19 +1380,44 @@ class fdmnes(object):
                 False, if a process is running
                 True, if no process is running  
                 2, if the specified job is finished (last by default)
+            
+            ``jobID'' may also be a ``scheduler.Job'', e.g. returned by
+            ``Run'' for cached results.
         """
         NumProc = len(self.proc)
         if jobID==None:
             jobID = -1
-        jobID = jobID%NumProc if NumProc else None
+        if not hasattr(jobID, "done"):
+            jobID = jobID%NumProc if NumProc else None
         message = []
-        if not NumProc:
+        if hasattr(jobID, "done"): # scheduler.Job
+            if not jobID.done():
+                result = False
+                message.append("Simulation is running: %s"%jobID.path)
+            else:
+                result = 2 if jobID.status == "finished" else True
+                message.append("Job %s: %s"%(jobID.status, jobID.path))
+        elif not NumProc:
             result = True
             message.append("No process was started.")
         elif self.proc[jobID].poll()==None:
             result = False
             message.append("Simulation is running for job #%i: %s"\
                                         %(jobID+1, self.jobs[jobID]))
+            bavfile = self._bav_path(self.jobs[jobID])
+            if os.path.isfile(bavfile):
+                progress = parse_bavfile(bavfile)
+                message.append("Absorbers finished: %i, energy points: %i, "
+                               "SCF iteration: %s"%(progress["num_absorber"],
+                               progress["num_energy"],
+                               progress["scf_iteration"]))
+        elif self.proc[jobID] in self._outcomes:
+            result = True
+            proc = self.proc[jobID]
+            message.append("Job #%i stopped (%s): %s"%(jobID+1,
+                           self._outcomes[proc], self.jobs[jobID]))
+            self.RemoveJob(jobID)
+            del self._outcomes[proc]
         else:
             result = True
             path = self.jobs[jobID]
@@ -791,6 +1437,7 @@ class fdmnes(object):
                 if bavinfo["success"]:
                     message.append("Job finished.")
                     self.RemoveJob(jobID)
+                    self._cache_store(path)
                     result = 2
                 else:
                     message.append("Job aborted.")
@@ -916,13 +1563,13 @@ class fdmnes(object):
         if not self.P.has_key("Calculation"):
             self.P.Calculation = []
         if not len(self.P.Calculation) and self.Status(verbose=False)==2:
-            num_absorb = self.bavinfo["num_absorber"]
-            if num_absorb > 1:
-                calclist = ["_%.i"%(i+1) for i in range(num_absorb)]
-            else:
-                calclist = [""]
-            calclist = map(lambda s: self.path_out + s + ".txt", calclist)
-            self.P.Calculation.extend(calclist)
+            self.P.Calculation.extend(self._calculation_files())
+        bavfile = self.path_out + "_bav.txt"
+        if not len(self.P.Calculation) and os.path.isfile(bavfile):
+            # e.g. after Run(wait=True), which leaves no job for Status
+            self.bavinfo = parse_bavfile(bavfile)
+            if self.bavinfo["success"]:
+                self.P.Calculation.extend(self._calculation_files())
             
         foundCalc = map(os.path.isfile, self.P.Calculation)
         if not len(foundCalc) or not foundCalc[0] or not any(foundCalc):      
@@ -948,7 +1595,86 @@ class fdmnes(object):
         return path
     
     
-    def get_XANES(self, conv=False, fpath=None):
+    def _calculation_files(self):
+        """
+            Returns the output files of the last simulation according to
+            the number of absorbers in ``bavinfo''.
+        """
+        num_absorb = self.bavinfo["num_absorber"]
+        if num_absorb > 1:
+            calclist = ["_%.i"%(i+1) for i in range(num_absorb)]
+        else:
+            calclist = [""]
+        return map(lambda s: self.path_out + s + ".txt", calclist)
+    
+    
+    def Convolve(self, data=None, **kwargs):
+        """
+            Method to convolute XANES spectra numerically without running
+            FDMNES. The convolution parameters (Gamma_hole, Gamma_max,
+            Ecent, Elarg, Efermi, Gaussian, Seah, Nocut, S0_2) are taken
+            from the ``P'' object and can be overridden by keyword
+            arguments. See the ``convolution'' module for details.
+            
+            Input:
+            ------
+                data: array (optional)
+                    Unconvoluted spectra with the energy in the first
+                    column as returned by get_XANES(conv=False). By
+                    default, the output of the last simulation is used.
+            
+            Returns:
+                array of the same shape as ``data''
+        """
+        if data is None:
+            data = self.get_XANES(conv=False)
+        params = dict((keyw, self.P[keyw]) for keyw in convolution.PARAMETERS)
+        params.update(kwargs)
+        return convolution.convolve_xanes(data, **params)
+
+
+    def ConvolveBatch(self, params, data=None):
+        """
+            Method to convolute XANES spectra for many sets of convolution
+            parameters at once, e.g. for a scan of Gamma_max, Ecent, Elarg
+            and Gaussian. Parameters not given in ``params'' are taken
+            from the ``P'' object.
+
+            Input:
+            ------
+                params: list of dicts, dict of sequences or structured array
+                    P sets of convolution parameters.
+                data: array (optional)
+                    Unconvoluted spectra as returned by
+                    get_XANES(conv=False).
+
+            Returns:
+                array of shape (P, N) for one spectrum of N energies or
+                (P, N, M) for M absorbers.
+        """
+        if data is None:
+            data = self.get_XANES(conv=False)
+        defaults = dict((keyw, self.P[keyw])
+                        for keyw in convolution.PARAMETERS)
+        params = convolution.parameter_sets(params, defaults)
+        return convolution.convolve_xanes_batch(data, params)
+
+    
+    def get_timings(self, fpath=None):
+        """
+            Method to read-out the subroutine times of each absorbing atom
+            from the bav file of the last simulation (or from ``fpath'').
+            See ``profiling'' for aggregation over many simulations.
+
+            Returns:
+                list of OrderedDicts mapping the subroutine names to the
+                CPU and wall times in seconds
+        """
+        if fpath==None:
+            fpath = self.path_out + "_bav.txt"
+        return readers.read_bav_timings(fpath)
+
+    def get_XANES(self, conv=False, fpath=None, native=True, lazy=False):
         """
             Method to read-out the calculated XANES datas of the output file 
             created by FDMNES.
@@ -962,6 +1688,18 @@ class fdmnes(object):
                     A specific FDMNES output can be given. By default, if
                     choosing unconvoluted data, all absorbing atoms will be
                     returned.
+                
+                native: bool (default: True)
+                    If no convoluted FDMNES output exists, compute the
+                    convolution with the ``Convolve'' method instead of
+                    running FDMNES via ``DoConvolution''. FDMNES is still
+                    run if the parameters require it (see
+                    ``convolution.unsupported''), e.g. for tabulated core
+                    hole widths.
+
+                lazy: bool (default: False)
+                    Return a ``readers.SpectrumFiles'' object that parses
+                    the files on access instead of the data array.
             
         """
         conv = bool(conv)
@@ -975,10 +1713,12 @@ class fdmnes(object):
         if conv and not fpath.endswith("_conv.txt"):
             if os.path.isfile(path_out + "_conv.txt"):
                 fpath = path_out + "_conv.txt"
+            elif native and not convolution.unsupported(self.P):
+                return self.Convolve(self.get_XANES(False, fpath))
             else:
                 print("Doing Convolution...")
-                self.DoConvolution(overwrite=True)
-                fpath = path_out + ".txt"
+                path = self.DoConvolution(overwrite=True)
+                fpath = self._output_base(path, True)[0] + ".txt"
         # Can be the case when writeonly == True:
         elif not conv and fpath.endswith("_conv.txt"):
             if len(self.P.Calculation):
@@ -989,24 +1729,37 @@ class fdmnes(object):
         if not isinstance(fpath, list):
             fpath = [fpath]
         
-        output = []
         for fp in fpath:
             if os.path.isfile(fp):
                 print("Using data from %s"%fp)
-                with open(fp, "r") as fh:
-                    content = fh.readlines()
-                content = map(str.strip, content)
-                findEne = map(lambda s: s.startswith("Energy"), content)
-                ind = (findEne.index(True)+1) if any(findEne) else 0
-                data = np.loadtxt(fp, skiprows = ind)
             else:
                 raise IOError(
                     "FDMNES output file not found:%s%s"%(os.linesep, fp))
-            if not len(output):
-                output.append(data[:,0])
-            output.append(data[:,1])
         
-        return np.vstack((output)).T
+        spectra = readers.SpectrumFiles(fpath)
+        if lazy:
+            return spectra
+        return spectra.select()
+    
+    def get_absorbers(self, fpath=None):
+        """
+            Method to access the spectra of the single absorbing atoms
+            (``<Filout>_<N>.txt'') of the last simulation. The files are
+            parsed on access.
+
+            Returns:
+                ``readers.SpectrumFiles'' instance, e.g.
+                ``get_absorbers().select([0, 2], emin=-5, emax=20)''
+        """
+        if fpath==None:
+            fpath = self.path_out
+        files = []
+        while os.path.isfile(fpath + "_%i.txt"%(len(files) + 1)):
+            files.append(fpath + "_%i.txt"%(len(files) + 1))
+        if not files:
+            raise IOError("No FDMNES output files found for single "
+                          "absorbers: %s_<N>.txt"%fpath)
+        return readers.SpectrumFiles(files)
         
         
     def get_DAFS(self, miller, pol_in, pol_out, azimuth, conv=True,
@@ -1039,45 +1792,17 @@ class fdmnes(object):
                 conv: bool
                     pick convoluted data?
         """
-        
-        assert all(map(lambda x: isinstance(x, (int, long)), miller)) \
-            and len(miller)==3,\
-            "Wrong input for ``miller''- (reflection-) indices. "\
-            "A 3-tuple of type int is required."
-        miller = tuple(miller)
-        
+
         conv = bool(conv)
-        
-        self.P.Extract = self.bavfile
-        wasconv = self.P.Convolution
-        self.P.Convolution = conv
-        
-        pol_in = get_polarization(pol_in)
-        if pol_in == None:
-            raise ValueError("Invalid input for pol_in")
-        pol_out = get_polarization(pol_out)
-        if pol_out == None:
-            raise ValueError("Invalid input for pol_out")
-        
-        angles = [0,90] # what to do with left and right?
-        if isinstance(pol_in, tuple) and not isinstance(pol_out, tuple):
-            pol_out = (pol_out, angles[pol_out-1])
-        if not isinstance(pol_in, tuple) and isinstance(pol_out, tuple):
-            pol_in = (pol_in, angles[pol_in-1])
-        
-        
-        azimuth = float(azimuth)
-        
-        self.P.RXS = [miller + (pol_in, pol_out, azimuth)]
-        path = "_rxs".join(os.path.splitext(self.path))
-        self.WriteInputFile(path, overwrite=True, update=False)
-        
-        self.Run(path, wait=True, verbose=verbose)
-        self.Extract = ""
-        self.P.Convolution = wasconv
-        
-        
-        
+
+        self._run_extract([rxs_entry(miller, pol_in, pol_out, azimuth)],
+                          conv, verbose)
+        return self._read_DAFS(conv)
+
+    def _read_DAFS(self, conv):
+        """
+            Reads the DAFS data written by the last Extract run.
+        """
         if conv:
             fpath = self.path_out + "_rxs_conv.txt"
         else:
@@ -1091,21 +1816,90 @@ class fdmnes(object):
         
         self.path_rxs = fpath
         
-        with open(fpath, "r") as fh:
-            content = fh.readlines()
-        content = map(str.strip, content)
-        findEne = map(lambda s: s.startswith("Energy"), content)
-        ind = (findEne.index(True)+1) if any(findEne) else 0
-        header = content[ind-1] if ind>0 else ""
-        header = header.replace("(","").replace(")", "")
-        header = header.split()
+        data, header = readers.read_spectrum(fpath)
         #header = map(lambda s: "F"+s if s[0].isdigit() else s, header)
         header.pop(1) # XANES
         #DAFSdata = collections.namedtuple("DAFSdata", header)
-        data = np.loadtxt(fpath, skiprows = ind)
         data = list(data.T)
         data.pop(1) # XANES
         DAFS = collections.OrderedDict(zip(header, data))
         #DAFS = DAFSdata(*data)
-        
+
         return data
+
+
+    def get_DAFS_batch(self, reflections, conv=True, verbose=False):
+        """
+            Method to calculate the DAFS spectra of many reflections,
+            polarizations and azimuths with a single Extract run of FDMNES.
+
+            Input:
+            ------
+                reflections: list
+                    Each entry is a tuple (miller, pol_in, pol_out, azimuth)
+                    with the meaning of the arguments of ``get_DAFS''.
+                    ``azimuth'' may also be a sequence of angles, which
+                    is expanded into one reflection per angle (azimuthal
+                    scan).
+                conv: bool
+                    pick convoluted data?
+
+            Returns:
+                DAFSBatch(energy, xanes, reflections, data, columns):
+                    named tuple with the energy array of length N, the XANES
+                    spectrum, the list of expanded reflections (as written
+                    to the RXS block), the data array of shape
+                    (number of reflections, N, columns per reflection) and
+                    the column names of the first reflection.
+        """
+        entries = []
+        for miller, pol_in, pol_out, azimuth in reflections:
+            if not np.iterable(azimuth):
+                azimuth = [azimuth]
+            for angle in azimuth:
+                entries.append(rxs_entry(miller, pol_in, pol_out, angle))
+        if not entries:
+            raise ValueError("No reflections given.")
+
+        self._run_extract(entries, bool(conv), verbose)
+        if conv:
+            fpath = self.path_out + "_rxs_conv.txt"
+        else:
+            fpath = self.path_out + "_rxs.txt"
+        self.path_rxs = fpath
+
+        data, header = readers.read_spectrum(fpath)
+        ncols = data.shape[1] - 2 # Energy, XANES
+        if ncols % len(entries):
+            raise ValueError("Number of columns in %s (%i) does not match "
+                             "the number of reflections (%i)."\
+                             %(fpath, ncols, len(entries)))
+        per = ncols // len(entries)
+        dafs = data[:,2:].reshape(len(data), len(entries), per)
+        dafs = dafs.transpose(1, 0, 2)
+        return DAFSBatch(data[:,0], data[:,1], entries, dafs, header[2:2+per])
+
+
+    def _run_extract(self, rxs, conv, verbose=False):
+        """
+            Writes and runs an Extract input file (suffix ``_rxs'') for the
+            list of RXS entries ``rxs'' using the bav file of the last
+            simulation.
+        """
+        path = self._write_extract(rxs, conv)
+        self.Run(path, wait=True, verbose=verbose)
+        return path
+
+    def _write_extract(self, rxs, conv):
+        """
+            Writes the Extract input file (suffix ``_rxs'') for the list of
+            RXS entries ``rxs'' and returns its path.
+        """
+        restore, changed = self._apply(dict(Extract=self.bavfile,
+                                            Convolution=conv, RXS=rxs))
+        try:
+            path = "_rxs".join(os.path.splitext(self.path))
+            self.WriteInputFile(path, overwrite=True, update=False)
+        finally:
+            restore()
+        return path
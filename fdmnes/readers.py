@@ -0,0 +1,469 @@
+"""
+    Readers for the output files written by FDMNES.
+"""
+import os
+import re
+import collections
+import threading
+import StringIO
+import numpy as np
+
+
+Spectrum = collections.namedtuple("Spectrum", ["data", "columns"])
+
+# binary sidecar files of parsed spectra, see ``read_spectrum''
+sidecar_enabled = True
+sidecar_min_size = 2**16 # bytes, smaller files are always parsed
+SIDECAR_SUFFIX = ".sidecar.npz"
+SIDECAR_VERSION = 3 # incremented when parsing changes, e.g. column names
+
+# column name, parenthesized groups (e.g. reflections) may contain blanks
+COLUMN_NAME = re.compile(r"(?:[^\s(]|\([^)]*\))+")
+
+
+def column_names(header, ncols):
+    """
+        Splits the column header of an FDMNES output file into ``ncols''
+        names. Parenthesized groups, e.g. ``I(1 0 0)ss_0'', belong to one
+        name, their parentheses and blanks are removed (``I100ss_0'').
+        Missing names are numbered.
+    """
+    names = ["".join(name.replace("(", "").replace(")", "").split())
+             for name in COLUMN_NAME.findall(header)]
+    names = names[:ncols]
+    names += ["col%i"%i for i in range(len(names), ncols)]
+    return names
+
+
+def parse_spectrum(path):
+    """
+        Parses an FDMNES spectrum output file (``_out.txt'', ``_conv.txt'',
+        ``_N.txt'', ...) in a single pass.
+
+        The file is read line by line up to the column header starting
+        with ``Energy''. The remaining numeric block is parsed at once.
+        Files without such a header are assumed to contain only numbers.
+        Blocks that cannot be parsed completely this way (e.g. Fortran
+        overflows ``*****'') are passed to ``numpy.loadtxt'' which raises
+        a ValueError for invalid entries.
+
+        Returns:
+            Spectrum(data, columns): named tuple of the data array of shape
+            (N, ncols) and the list of column names.
+    """
+    header = ""
+    with open(path, "r") as fh:
+        line = fh.readline()
+        while line:
+            if line.lstrip().startswith("Energy"):
+                header = line
+                break
+            line = fh.readline()
+        else: # no header found
+            fh.seek(0)
+        block = fh.read()
+
+    ncols = len(block.lstrip().partition("\n")[0].split())
+    data = np.fromstring(block, sep=" ") if ncols else np.empty(0)
+    # ``fromstring'' stops silently at the first token it cannot parse
+    if not ncols or data.size % ncols or data.size != len(block.split()):
+        # non standard number format, let numpy report the problem:
+        data = np.loadtxt(StringIO.StringIO(block), ndmin=2)
+        ncols = data.shape[1]
+    data = data.reshape(-1, ncols)
+    return Spectrum(data, column_names(header, ncols))
+
+
+def _source_id(stat):
+    return np.array([stat.st_mtime, stat.st_size, SIDECAR_VERSION],
+                    dtype=float)
+
+
+def read_sidecar(path, stat=None):
+    """
+        Returns the ``Spectrum'' stored in the sidecar file of ``path'' or
+        None if there is none or if ``path'' was modified since it was
+        written (different modification time or size).
+    """
+    sidecar = path + SIDECAR_SUFFIX
+    if not os.path.isfile(sidecar):
+        return None
+    if stat is None:
+        stat = os.stat(path)
+    try:
+        with np.load(sidecar) as npz:
+            if not np.array_equal(npz["source"], _source_id(stat)):
+                return None
+            return Spectrum(npz["data"], map(str, npz["columns"]))
+    except Exception: # corrupt file
+        return None
+
+
+def write_sidecar(path, spectrum, stat=None):
+    """
+        Writes the ``Spectrum'' parsed from ``path'' to the sidecar file
+        ``<path>.sidecar.npz''. Returns False if the file cannot be written.
+    """
+    if stat is None:
+        stat = os.stat(path)
+    sidecar = path + SIDECAR_SUFFIX
+    tmppath = "%s.%i.tmp"%(sidecar, os.getpid())
+    try:
+        with open(tmppath, "wb") as fh:
+            np.savez(fh, data=spectrum.data, columns=np.array(spectrum.columns),
+                     source=_source_id(stat))
+        os.rename(tmppath, sidecar)
+    except (IOError, OSError):
+        if os.path.isfile(tmppath):
+            os.remove(tmppath)
+        return False
+    return True
+
+
+def read_spectrum(path, sidecar=None):
+    """
+        Reads an FDMNES spectrum output file (see ``parse_spectrum'').
+
+        If ``sidecar'' is True (default: ``sidecar_enabled''), the parsed
+        data of files larger than ``sidecar_min_size'' are written to a
+        binary sidecar file ``<path>.sidecar.npz'' which is used instead of
+        the text file as long as the modification time and size of the
+        text file do not change.
+
+        Returns:
+            Spectrum(data, columns): named tuple of the data array of shape
+            (N, ncols) and the list of column names.
+    """
+    if sidecar is None:
+        sidecar = sidecar_enabled
+    if not sidecar:
+        return parse_spectrum(path)
+    stat = os.stat(path)
+    if stat.st_size < sidecar_min_size:
+        return parse_spectrum(path)
+    spectrum = read_sidecar(path, stat)
+    if spectrum is None:
+        spectrum = parse_spectrum(path)
+        write_sidecar(path, spectrum, stat)
+    return spectrum
+
+
+def remove_sidecars(directory, stale_only=False):
+    """
+        Removes the sidecar files in ``directory'' and its subdirectories.
+        With ``stale_only'', only sidecars whose text file was modified or
+        removed are deleted. Returns the list of removed files.
+    """
+    removed = []
+    for root, dirs, files in os.walk(directory):
+        for fname in files:
+            if not fname.endswith(SIDECAR_SUFFIX):
+                continue
+            sidecar = os.path.join(root, fname)
+            path = sidecar[:-len(SIDECAR_SUFFIX)]
+            if stale_only and os.path.isfile(path) \
+                          and read_sidecar(path) is not None:
+                continue
+            os.remove(sidecar)
+            removed.append(sidecar)
+    return removed
+
+
+
+class SpectrumFiles(object):
+    """
+        Lazy access to a list of FDMNES spectrum files, e.g. the outputs
+        ``<path_out>_<N>.txt'' of the single absorbing atoms.
+
+        Files are parsed on first access only. ``select'' builds the
+        requested slice of all files without keeping the complete data of
+        each file in memory.
+    """
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self._data = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _load(self, i, keep=True):
+        if i in self._data:
+            return self._data[i]
+        data = read_spectrum(self.paths[i])
+        if keep:
+            self._data[i] = data
+        return data
+
+    def __getitem__(self, i):
+        """
+            Returns the ``Spectrum'' of file ``i''.
+        """
+        return self._load(i)
+
+    def release(self):
+        """
+            Drops all parsed data.
+        """
+        self._data.clear()
+
+    @property
+    def energy(self):
+        return self._load(0).data[:,0]
+
+    def select(self, absorbers=None, emin=None, emax=None, column=1):
+        """
+            Returns the energy and the column ``column'' of the files with
+            indices ``absorbers'' (default: all) in the energy window
+            [emin, emax] as one array of shape (N, 1+len(absorbers)).
+        """
+        if absorbers is None:
+            absorbers = range(len(self))
+        output = None
+        for j, i in enumerate(absorbers):
+            data = self._load(i, keep=False).data
+            energy = data[:,0]
+            mask = np.ones(len(energy), dtype=bool)
+            if emin is not None:
+                mask &= (energy >= emin)
+            if emax is not None:
+                mask &= (energy <= emax)
+            if output is None:
+                output = np.empty((mask.sum(), 1 + len(absorbers)))
+                output[:,0] = energy[mask]
+            elif mask.sum() != len(output):
+                raise ValueError("Energy grid of %s differs."%self.paths[i])
+            output[:,j+1] = data[mask, column]
+        return output
+
+
+# line patterns of the ``_bav.txt'' file
+BAV_ABSORBER = "Subroutine times for absorbing atom"
+BAV_SUCCESS = "Have a beautiful day !"
+BAV_ENERGY = re.compile(r"^\s*Energy\s*=\s*([-+]?\d*\.?\d+(?:[Ee][-+]?\d+)?)")
+BAV_TIMING = re.compile(r"^\s*([A-Za-z]\w*)\s*=\s*([-+]?\d*\.?\d+)"
+                        r"(?:\s+([-+]?\d*\.?\d+))?\s*$")
+# order of the columns of the subroutine timing tables
+BAV_TIMING_COLUMNS = ("cpu", "wall")
+BAV_SCF = re.compile(r"^\s*(?:Cycle|Iteration)\s*(?:number)?\s*=?\s*(\d+)\b",
+                     re.IGNORECASE)
+
+# readers of ``bav_reader'', least recently used first
+_bav_readers = collections.OrderedDict()
+_bav_readers_lock = threading.Lock()
+bav_readers_max = 256 # readers kept, e.g. of the points of a sweep
+
+
+class BavReader(object):
+    """
+        Incremental reader of the ``_bav.txt'' file of an FDMNES run.
+
+        The reader remembers the byte offset up to which the file was
+        read. Each call of ``update'' only scans the bytes appended since
+        the last call, so that following a growing file costs O(new bytes).
+        If the file was truncated, replaced or rewritten in place (its
+        first bytes or the bytes before the offset changed), it is read
+        again from the start.
+        A reader may be shared by several threads, ``update'' and
+        ``info'' are serialized by a lock.
+
+        Attributes:
+            num_absorber : number of absorbing atoms finished
+            num_energy : number of energy points of the current absorber
+            energy : last energy point (eV) or None
+            scf_iteration : last SCF iteration or None
+            success : whether the run finished successfully
+            timings : list of one OrderedDict per finished absorber
+                      mapping the subroutine names to dictionaries of the
+                      CPU and wall times in seconds
+    """
+    chunksize = 2**20
+    checksize = 256 # bytes compared to detect rewritten files
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self._inode = None
+        self._head = "" # first bytes read
+        self._tail = "" # last bytes read before ``offset''
+        self._partial = ""
+        self._last = ""
+        self.num_absorber = 0
+        self.num_energy = 0
+        self.energy = None
+        self.scf_iteration = None
+        self.success = False
+        self.timings = []
+        self._timing = None # table currently read
+
+    def info(self):
+        """
+            Returns the progress as a dictionary.
+        """
+        with self._lock:
+            return dict(success=self.success,
+                        num_absorber=self.num_absorber,
+                        num_energy=self.num_energy,
+                        energy=self.energy,
+                        scf_iteration=self.scf_iteration)
+
+    def parse_line(self, line):
+        if self._timing is not None:
+            match = BAV_TIMING.match(line)
+            if match:
+                name, values = match.group(1), match.groups()[1:]
+                self._timing[name] = dict((col, float(val)) for (col, val)
+                                          in zip(BAV_TIMING_COLUMNS, values)
+                                          if val is not None)
+                return
+            if self._timing: # end of table, column headers are skipped
+                self._timing = None
+        if BAV_ABSORBER in line:
+            self.num_absorber += 1
+            self.num_energy = 0
+            self.scf_iteration = None
+            self._timing = collections.OrderedDict()
+            self.timings.append(self._timing)
+            return
+        match = BAV_ENERGY.match(line)
+        if match:
+            self.num_energy += 1
+            self.energy = float(match.group(1))
+            return
+        match = BAV_SCF.match(line)
+        if match:
+            self.scf_iteration = int(match.group(1))
+
+    def _unchanged(self, fh):
+        """
+            Returns True if the bytes read before are still in the file.
+        """
+        head = fh.read(len(self._head))
+        fh.seek(self.offset - len(self._tail))
+        return head == self._head and fh.read(len(self._tail)) == self._tail
+
+    def update(self):
+        """
+            Reads the data appended to the file since the last call and
+            returns ``info()''.
+        """
+        with self._lock:
+            return self._update()
+
+    def _update(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self.reset()
+            return self.info()
+        if stat.st_ino != self._inode or stat.st_size < self.offset:
+            self.reset()
+            self._inode = stat.st_ino
+        with open(self.path, "r") as fh:
+            if self.offset and not self._unchanged(fh):
+                self.reset()
+                self._inode = stat.st_ino
+            if stat.st_size == self.offset:
+                return self.info()
+            fh.seek(self.offset)
+            while True:
+                chunk = fh.read(self.chunksize)
+                if not chunk:
+                    break
+                if len(self._head) < self.checksize:
+                    self._head += chunk[:self.checksize - len(self._head)]
+                self._tail = (self._tail + chunk)[-self.checksize:]
+                self.offset += len(chunk)
+                lines = (self._partial + chunk).split("\n")
+                self._partial = lines.pop()
+                for line in lines:
+                    self.parse_line(line)
+                    if line.strip():
+                        self._last = line.strip()
+        last = self._partial.strip() or self._last
+        self.success = (last == BAV_SUCCESS)
+        return self.info()
+
+
+def read_tail(path, size=4096):
+    """
+        Returns the last ``size'' bytes of the file ``path''.
+    """
+    with open(path, "rb") as fh:
+        fh.seek(0, os.SEEK_END)
+        fh.seek(max(fh.tell() - size, 0))
+        return fh.read()
+
+
+def bav_complete(path):
+    """
+        Returns True if the bav file ``path'' ends with the message of a
+        successful run. Only the end of the file is read.
+    """
+    if not os.path.isfile(path):
+        return False
+    lines = read_tail(path).strip().splitlines()
+    return bool(lines) and lines[-1].strip() == BAV_SUCCESS
+
+
+def spectrum_complete(path):
+    """
+        Returns True if the last line of the spectrum file ``path'' is
+        terminated and contains numbers only, i.e. the file was not
+        truncated while it was written or copied.
+    """
+    if not os.path.isfile(path):
+        return False
+    tail = read_tail(path)
+    if not tail.endswith("\n"):
+        return False
+    lines = tail.strip().splitlines()
+    if not lines:
+        return False
+    try:
+        values = map(float, lines[-1].split())
+    except ValueError:
+        return False
+    return len(values) > 1
+
+
+def bav_reader(path):
+    """
+        Returns the up to date ``BavReader'' of the file ``path''. Readers
+        are kept per file, so repeated calls only read newly appended data.
+        Only the ``bav_readers_max'' most recently used readers are kept.
+    """
+    path = os.path.abspath(path)
+    with _bav_readers_lock:
+        reader = _bav_readers.pop(path, None)
+        if reader is None:
+            reader = BavReader(path)
+        _bav_readers[path] = reader
+        while len(_bav_readers) > bav_readers_max:
+            _bav_readers.popitem(last=False)
+    reader.update()
+    return reader
+
+
+def read_bav(path):
+    """
+        Returns the progress information of the bav file ``path'' (see
+        ``BavReader'').
+    """
+    return bav_reader(path).info()
+
+
+def read_bav_timings(path):
+    """
+        Returns the subroutine timings of the bav file ``path'' as list of
+        one OrderedDict per absorbing atom (see ``BavReader''). The list
+        is a copy, the shared reader is not affected by changes to it.
+    """
+    reader = bav_reader(path)
+    with reader._lock:
+        return [collections.OrderedDict((name, dict(values))
+                                        for (name, values) in table.items())
+                for table in reader.timings]
@@ -0,0 +1,123 @@
+"""
+    Persistent record of the FDMNES jobs run by the scheduler or by
+    ``fdmnes.Run''.
+
+    Each state change of a job (queued, running, done) is appended as one
+    JSON line to the registry file, so that the jobs of an interpreter
+    that crashed or was closed can be found again: ``reattach'' returns
+    the finished jobs with their recorded outcome and keeps track of the
+    FDMNES processes that are still running.
+
+    Example:
+        sim.registry = JobRegistry("jobs.jsonl")
+        sim.RunParallel(paths, wait=False)
+        ... (new interpreter)
+        sim.registry = JobRegistry("jobs.jsonl")
+        jobs = sim.reattach()
+"""
+import os
+import json
+import time
+import threading
+import collections
+from .scheduler import Job, process_alive
+
+
+# job attributes stored in the registry
+FIELDS = ["path", "path_out", "scratch", "logpath", "pid", "started",
+          "status", "returncode", "outputs", "ranks"]
+
+
+
+class JobRegistry(object):
+    """
+        JSON-lines file with the latest state of every job, keyed by the
+        absolute path of its input file.
+    """
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._lock = threading.Lock()
+
+    def record(self, job):
+        """
+            Appends the current state of the ``scheduler.Job'' ``job''.
+        """
+        entry = dict((field, getattr(job, field)) for field in FIELDS)
+        entry["error"] = None if job.error is None else str(job.error)
+        entry["time"] = time.time()
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            with open(self.path, "a") as fh:
+                fh.write(line)
+
+    def entries(self):
+        """
+            Returns an OrderedDict input path -> latest record. Lines
+            truncated by a crash are skipped.
+        """
+        entries = collections.OrderedDict()
+        if not os.path.isfile(self.path):
+            return entries
+        with open(self.path, "r") as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entries[entry["path"]] = entry
+        return entries
+
+    def status(self, path):
+        """
+            Returns the recorded status of the input file ``path'' or None.
+        """
+        entry = self.entries().get(os.path.abspath(path))
+        return None if entry is None else entry["status"]
+
+    def compact(self):
+        """
+            Rewrites the registry with only the latest record of every job.
+        """
+        entries = self.entries()
+        tmppath = "%s.%i.tmp"%(self.path, os.getpid())
+        with self._lock:
+            with open(tmppath, "w") as fh:
+                for entry in entries.itervalues():
+                    fh.write(json.dumps(entry) + "\n")
+            os.rename(tmppath, self.path)
+
+    def reattach(self, fdmnes_exe=None, interval=1.):
+        """
+            Returns a ``scheduler.Job'' for every registered job,
+            reconciled with the processes and files on disk:
+                - finished, failed, ... : done, with the recorded outcome
+                - running and the process is alive: monitored by a
+                  background thread (checking every ``interval''
+                  seconds) that collects the output when it ends
+                - running but the process is gone: the output left in the
+                  scratch directory is collected and evaluated at once
+                - queued: never started, status "lost"
+            Timeouts are not enforced for reattached jobs.
+        """
+        jobs = []
+        for entry in self.entries().itervalues():
+            job = Job(entry["path"], fdmnes_exe, entry["logpath"])
+            for field in FIELDS:
+                if field in entry: # fields added later may be missing
+                    setattr(job, field, entry[field])
+            job.error = entry["error"]
+            job.registry = self
+            if entry["status"] == "queued":
+                job.status = "lost"
+                job._done.set()
+            elif entry["status"] != "running":
+                job._done.set()
+            elif job.pid is not None and process_alive(job.pid, job.scratch):
+                monitor = threading.Thread(target=job.monitor,
+                                           args=(interval,))
+                monitor.daemon = True
+                monitor.start()
+            else:
+                job.monitor(interval)
+            jobs.append(job)
+        return jobs
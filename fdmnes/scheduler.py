@@ -0,0 +1,944 @@
+import os
+import atexit
+import errno
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+import time
+import weakref
+import Queue
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+from .pyFDMNES import keyword_exists, parse_bavfile, next_logpath
+from .readers import BavReader
+
+
+# keywords of the input file whose values are file system paths
+PATH_KEYWORDS = ["filout", "conv_out", "extract", "calculation",
+                 "scan", "scan_conv", "folder_dat"]
+# keywords that take exactly one line of input
+SINGLE_LINE_KEYWORDS = ["filout", "conv_out", "extract", "scan_conv",
+                        "folder_dat"]
+# keywords naming the output base of a job
+OUTPUT_KEYWORDS = ["filout", "conv_out"]
+
+FDMFILE = "fdmfile.txt"
+
+# notified whenever a job is finished
+_finished = threading.Condition()
+
+# schedulers whose workers are stopped at interpreter exit
+_schedulers = weakref.WeakSet()
+
+# processes started by ``fdmnes.Run'' that are interrupted if the
+# interpreter exits because of Ctrl-C, see ``forward_interrupt''
+_background = weakref.WeakSet()
+
+# seconds between SIGTERM and SIGKILL when a job is terminated
+KILL_GRACE = 5.
+
+# blocking waits poll at this interval (seconds), since waits without a
+# timeout cannot be interrupted by Ctrl-C in Python 2
+POLL_INTERVAL = 0.5
+
+# process groups, signals and resource limits are only used on POSIX; on
+# Windows, terminating a job only terminates the FDMNES process itself
+POSIX = os.name == "posix"
+
+# names of the resource limits accepted for the FDMNES process
+LIMITS = dict(memory="RLIMIT_AS", # bytes of address space
+              cpu="RLIMIT_CPU",   # seconds of CPU time
+              files="RLIMIT_FSIZE") # bytes per written file
+
+
+class JobError(Exception):
+    pass
+
+
+
+class Launcher(object):
+    """
+        Starts the FDMNES executable directly (serial build). Launchers
+        build the command line of an FDMNES process for a number of MPI
+        ranks.
+    """
+    ranks = 1 # None: chosen by the scheduler
+
+    def command(self, fdmnes_exe, ranks=1):
+        return [fdmnes_exe]
+
+    def __repr__(self):
+        return "<%s ranks=%s>"%(self.__class__.__name__, self.ranks)
+
+
+
+class MPILauncher(Launcher):
+    """
+        Starts the MPI build of FDMNES with ``mpirun -np <ranks>''.
+    """
+    def __init__(self, ranks=None, mpirun="mpirun", args=()):
+        """
+            Input:
+            ------
+                ranks : int
+                    Number of MPI processes. By default, the scheduler
+                    shares its cores among the waiting jobs. The
+                    scheduler refuses jobs with more ranks than its
+                    ``NumCPU''.
+                mpirun : string
+                    MPI launcher executable.
+                args : list of strings
+                    Further arguments of ``mpirun''.
+        """
+        self.ranks = ranks
+        self.mpirun = mpirun
+        self.args = list(args)
+
+    def command(self, fdmnes_exe, ranks=1):
+        return [self.mpirun, "-np", str(ranks)] + self.args + [fdmnes_exe]
+
+
+
+class WrapperLauncher(Launcher):
+    """
+        Starts FDMNES with a custom command line, e.g.
+        ``WrapperLauncher("srun -n %(ranks)i %(exe)s")''. The template is
+        split like a shell command before ``%(exe)s'' and ``%(ranks)i''
+        are substituted.
+    """
+    def __init__(self, template, ranks=None):
+        if "%(exe)s" not in template:
+            raise ValueError("Launcher template must contain %(exe)s.")
+        self.template = template
+        self.ranks = ranks
+
+    def command(self, fdmnes_exe, ranks=1):
+        values = dict(exe=fdmnes_exe, ranks=ranks)
+        return [arg%values for arg in shlex.split(self.template)]
+
+
+def make_launcher(launcher=None):
+    """
+        Returns a ``Launcher'' for ``launcher'': None (plain), "mpi"
+        (``MPILauncher''), a template string (``WrapperLauncher'') or a
+        ``Launcher'' instance.
+    """
+    if launcher is None:
+        return Launcher()
+    if isinstance(launcher, Launcher):
+        return launcher
+    if launcher == "mpi":
+        return MPILauncher()
+    if isinstance(launcher, str):
+        return WrapperLauncher(launcher)
+    raise TypeError("Invalid launcher: %r"%(launcher,))
+
+
+def check_limits(limits):
+    """
+        Raises a ValueError for unknown or unsupported resource
+        ``limits''.
+    """
+    if not limits:
+        return
+    if resource is None:
+        raise ValueError("Resource limits are not supported on this "
+                         "platform.")
+    for name in limits:
+        if name not in LIMITS:
+            raise ValueError("Unknown resource limit: %s (valid: %s)"
+                             %(name, ", ".join(sorted(LIMITS))))
+
+
+def child_setup(limits=None):
+    """
+        Returns a ``preexec_fn'' for ``subprocess.Popen'' that starts the
+        child in a new session (so that the whole process tree can be
+        signalled, see ``kill_tree'') and applies the resource ``limits''
+        (dictionary name -> value, see ``LIMITS''). Returns None where
+        this is not supported (Windows).
+
+        In its own session, the child does not receive the SIGINT of a
+        Ctrl-C in the terminal. Interrupted waits cancel their jobs and
+        ``forward_interrupt'' passes the interrupt on at exit instead.
+
+        ``preexec_fn'' runs in the forked child before ``exec'' and is not
+        safe in general while other threads run, as in the
+        ``JobScheduler'': it must not take locks or allocate. It is kept
+        to ``os.setsid'' and ``resource.setrlimit'' with the values
+        converted beforehand.
+    """
+    if not POSIX:
+        return None
+    rlimits = [(getattr(resource, LIMITS[name]), int(value))
+               for (name, value) in (limits or {}).iteritems()]
+    def setup():
+        os.setsid()
+        for rlimit, value in rlimits:
+            resource.setrlimit(rlimit, (value, value))
+    return setup
+
+
+def forward_interrupt(proc):
+    """
+        Sends SIGINT to the process group of the ``subprocess.Popen''
+        instance ``proc'' (started with ``child_setup'') if it is still
+        running when the interpreter exits because of Ctrl-C, as the
+        terminal would have done without the new session.
+    """
+    if POSIX:
+        _background.add(proc)
+
+
+@atexit.register
+def _forward_interrupts():
+    if getattr(sys, "last_type", None) is not KeyboardInterrupt:
+        return # normal exit, background processes keep running
+    for proc in list(_background):
+        if proc.poll() is None:
+            kill_tree(proc.pid, signal.SIGINT)
+
+
+def kill_tree(pid, sig=signal.SIGTERM):
+    """
+        Sends ``sig'' to the process group of ``pid'' (a process started
+        with ``child_setup''). Returns False if the group does not exist
+        anymore. POSIX only.
+    """
+    try:
+        os.killpg(pid, sig)
+    except OSError:
+        return False
+    return True
+
+
+def process_alive(pid, cwd=None):
+    """
+        Returns True if the process ``pid'' exists and has not exited
+        (zombies count as exited where ``/proc'' is available). Where
+        ``/proc'' is available and ``cwd'' is given, the working directory
+        of the process has to be ``cwd'' as well, which protects against
+        reused process IDs.
+    """
+    if not POSIX:
+        return _windows_alive(pid)
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        if e.errno != errno.EPERM:
+            return False
+    procdir = "/proc/%i"%pid
+    try:
+        with open(procdir + "/stat") as fh:
+            if fh.read().rsplit(")", 1)[1].split()[0] == "Z":
+                return False
+    except (IOError, IndexError):
+        pass
+    if cwd is not None and os.path.isdir(procdir):
+        try:
+            return os.path.realpath(os.readlink(procdir + "/cwd")) == \
+                   os.path.realpath(cwd)
+        except OSError:
+            return True # no permission
+    return True
+
+
+def _windows_alive(pid):
+    # os.kill(pid, 0) would terminate the process on Windows
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(0x1000, False, pid) # query information
+    if not handle:
+        return False
+    code = ctypes.c_ulong()
+    try:
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+            return False
+    finally:
+        kernel32.CloseHandle(handle)
+    return code.value == 259 # STILL_ACTIVE
+
+
+def terminate_tree(pid, exited, proc=None):
+    """
+        Sends SIGTERM to the process group of ``pid'' and SIGKILL after
+        ``KILL_GRACE'' seconds unless ``exited()'' returns True before.
+        Returns False if the group does not exist anymore.
+
+        On Windows only the process itself is terminated, with
+        ``proc.terminate()'' if the ``subprocess.Popen'' instance ``proc''
+        is given.
+    """
+    if not POSIX:
+        try:
+            if proc is not None:
+                proc.terminate()
+            else:
+                os.kill(pid, signal.SIGTERM) # TerminateProcess
+        except OSError: # WindowsError as well
+            return False
+        return True
+    if not kill_tree(pid):
+        return False
+    def kill():
+        end = time.time() + KILL_GRACE
+        while time.time() < end:
+            if exited():
+                return
+            time.sleep(0.05)
+        kill_tree(pid, signal.SIGKILL)
+    killer = threading.Thread(target=kill)
+    killer.daemon = True
+    killer.start()
+    return True
+
+
+def localize_input(path, basedir=None):
+    """
+        Reads the FDMNES input file ``path'' and returns its lines prepared
+        for a run in a scratch directory together with the absolute output
+        base:
+            - the output base (Filout / Conv_out) is reduced to its
+              basename, so that all output is written to the scratch
+              directory
+            - all other paths (Calculation, Extract, ...) are made absolute
+              with respect to ``basedir'' (default: current directory)
+    """
+    if basedir is None:
+        basedir = os.getcwd()
+    with open(path, "r") as fh:
+        content = fh.read().splitlines()
+
+    output = []
+    path_out = None
+    keyw = None
+    for line in content:
+        value = line.split("!")[0].strip()
+        lvalue = value.lower()
+        if lvalue in PATH_KEYWORDS:
+            keyw = lvalue
+        elif not value or lvalue=="end" or keyword_exists(value):
+            keyw = None
+        elif keyw is not None:
+            fullpath = os.path.join(basedir, value)
+            if keyw in OUTPUT_KEYWORDS:
+                path_out = fullpath
+                line = os.path.basename(value)
+            else:
+                line = fullpath
+            if keyw in SINGLE_LINE_KEYWORDS:
+                keyw = None
+        output.append(line)
+
+    if path_out is None: # FDMNES default
+        path_out = os.path.join(basedir, "fdmnes_out")
+    return output, os.path.normpath(path_out)
+
+
+
+class Job(object):
+    """
+        A single FDMNES simulation that is executed in its own scratch
+        directory with its own ``fdmfile.txt''. After the run, all output
+        files are moved to the directory of the output base given in the
+        input file.
+    """
+    def __init__(self, path, fdmnes_exe, logpath=None, scratch_dir=None,
+                       keep_scratch=False, on_output=None, timeout=None,
+                       limits=None, launcher=None):
+        self.path = os.path.abspath(path)
+        self.basedir = os.getcwd()
+        self.fdmnes_exe = fdmnes_exe
+        self.logpath = logpath
+        self.scratch_dir = scratch_dir
+        self.keep_scratch = keep_scratch
+        self.on_output = on_output # called with each line of output
+        self.reader = None # called by ``result'' with the finished job
+        self.timeout = timeout # wall-clock seconds
+        self.limits = limits # resource limits, see ``LIMITS''
+        self.launcher = make_launcher(launcher)
+        self.ranks = 1 # MPI ranks, set by the scheduler on submission
+        self.command = None
+        self.scratch = None
+        self.path_out = None
+        self.proc = None
+        self.pid = None
+        self.started = None
+        self.registry = None # optional registry.JobRegistry
+        self.returncode = None
+        self.outputs = []
+        self.bavinfo = {}
+        self.status = "queued"
+        self.error = None
+        self._done = threading.Event()
+        self._callbacks = []
+        self._bavreader = None
+        self._cancelled = False
+        self._timed_out = False
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<FDMNES Job %s (%s)>"%(self.path, self.status)
+
+    @classmethod
+    def finished(cls, path, outputs, fdmnes_exe=None):
+        """
+            Returns a job that is already finished without running FDMNES,
+            e.g. because its results were taken from a cache.
+        """
+        job = cls(path, fdmnes_exe)
+        job.outputs = list(outputs)
+        job.status = "finished"
+        job._set_done()
+        return job
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """
+            Blocks until the job is finished. Returns True if it is.
+            The job is cancelled if the wait is interrupted (Ctrl-C).
+        """
+        end = None if timeout is None else time.time() + timeout
+        try:
+            while not self.done():
+                remaining = POLL_INTERVAL if end is None \
+                                          else end - time.time()
+                if remaining <= 0:
+                    break
+                self._done.wait(min(remaining, POLL_INTERVAL))
+        except KeyboardInterrupt:
+            self.cancel()
+            raise
+        return self.done()
+
+    def progress(self):
+        """
+            Returns the progress of the running job as read from its bav
+            file (see ``readers.BavReader''). Only the data written since
+            the last call are read. For finished jobs, ``bavinfo'' is
+            returned.
+        """
+        if self.status != "running" or self.scratch is None \
+                                     or self.path_out is None:
+            return self.bavinfo
+        if self._bavreader is None:
+            bavfile = os.path.basename(self.path_out) + "_bav.txt"
+            self._bavreader = BavReader(os.path.join(self.scratch, bavfile))
+        return self._bavreader.update()
+
+    def result(self, timeout=None):
+        """
+            Blocks until the job is finished and returns the list of output
+            files, or ``reader(job)'' if a reader is set. Raises a
+            ``JobError'' if the job failed, was cancelled or the timeout
+            expired.
+        """
+        if not self.wait(timeout):
+            raise JobError("Timeout waiting for %s"%self.path)
+        if self.status == "cancelled":
+            raise JobError("Job cancelled: %s"%self.path)
+        if self.status != "finished":
+            raise JobError("Job failed: %s (%s)"%(self.path, self.error))
+        if self.reader is not None:
+            return self.reader(self)
+        return self.outputs
+
+    def cancel(self):
+        """
+            Cancels the job: a queued job is not started, the FDMNES
+            process tree of a running job is terminated and its scratch
+            directory removed. Returns False if the job is already done.
+        """
+        with self._lock:
+            if self.done() or self._cancelled:
+                return False
+            self._cancelled = True
+            queued = self.status == "queued"
+            proc = self.proc
+        if queued:
+            self.status = "cancelled"
+            self._set_done()
+        elif proc is not None or self.pid is not None:
+            self._terminate()
+        return True
+
+    def _terminate(self):
+        """
+            Terminates the process tree of the running job, SIGKILL follows
+            after ``KILL_GRACE'' seconds.
+        """
+        terminate_tree(self.pid, self._exited, self.proc)
+
+    def _exited(self):
+        if self.proc is not None:
+            return self.returncode is not None
+        return not process_alive(self.pid, self.scratch)
+
+    def _expire(self):
+        self._timed_out = True
+        self._terminate()
+
+    def cancelled(self):
+        return self.status == "cancelled"
+
+    def add_done_callback(self, fn):
+        """
+            Calls ``fn(job)'' as soon as the job is finished, or immediately
+            if it already is. Callbacks are executed in the thread that ran
+            the job, before the job is reported as done.
+        """
+        with _finished:
+            if not self.done():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _record(self):
+        if self.registry is not None:
+            self.registry.record(self)
+
+    def _set_done(self):
+        self._record()
+        # callbacks are run before waiting threads are woken up
+        while True:
+            with _finished:
+                callbacks, self._callbacks = self._callbacks, []
+                if not callbacks:
+                    self._done.set()
+                    _finished.notify_all()
+                    return
+            for fn in callbacks:
+                try:
+                    fn(self)
+                except Exception:
+                    traceback.print_exc()
+
+    def prepare(self):
+        """
+            Creates the scratch directory and writes the local copy of the
+            input file as well as the ``fdmfile.txt''.
+        """
+        content, self.path_out = localize_input(self.path, self.basedir)
+        self.scratch = tempfile.mkdtemp(prefix="fdmnes_",
+                                        dir=self.scratch_dir)
+        self._inputname = os.path.basename(self.path)
+        with open(os.path.join(self.scratch, self._inputname), "w") as fh:
+            fh.write(os.linesep.join(content))
+        with open(os.path.join(self.scratch, FDMFILE), "w") as fh:
+            fh.write(os.linesep.join(["1", "", self._inputname]))
+
+    def collect(self):
+        """
+            Moves the output files from the scratch directory to the
+            output directory.
+        """
+        outdir = os.path.dirname(self.path_out)
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir)
+        for fname in sorted(os.listdir(self.scratch)):
+            if fname in [FDMFILE, self._inputname]:
+                continue
+            dest = os.path.join(outdir, fname)
+            if os.path.isfile(dest):
+                os.remove(dest)
+            shutil.move(os.path.join(self.scratch, fname), dest)
+            self.outputs.append(dest)
+
+    def execute(self):
+        """
+            Runs the job synchronously. Called by the worker threads of the
+            ``JobScheduler''.
+        """
+        with self._lock:
+            if self._cancelled: # cancelled while queued
+                return
+            self.status = "running"
+        try:
+            self.prepare()
+            if self.logpath is None:
+                self.logpath = next_logpath(self.path)
+            self.command = self.launcher.command(self.fdmnes_exe, self.ranks)
+            with open(self.logpath, "w") as logfile:
+                self.proc = subprocess.Popen(self.command,
+                                             cwd=self.scratch,
+                                             stdout=logfile if
+                                                self.on_output is None
+                                                else subprocess.PIPE,
+                                             stderr=subprocess.STDOUT,
+                                      preexec_fn=child_setup(self.limits))
+                self.pid = self.proc.pid
+                self.started = time.time()
+                self._record()
+                if self._cancelled: # cancelled while starting
+                    self._terminate()
+                timer = None
+                if self.timeout is not None:
+                    timer = threading.Timer(self.timeout, self._expire)
+                    timer.daemon = True
+                    timer.start()
+                if self.on_output is not None:
+                    self._stream_output(logfile)
+                self.returncode = self.proc.wait()
+                if timer is not None:
+                    timer.cancel()
+            if self._cancelled:
+                self.status = "cancelled"
+                return
+            if self._timed_out:
+                self.error = "Timeout after %g s"%self.timeout
+                self.status = "timeout"
+                return
+            if self.returncode < 0:
+                self.error = "Terminated by signal %i"%(-self.returncode)
+            self.collect()
+            self._evaluate()
+        except Exception as e:
+            self.error = e
+            self.status = "failed"
+        finally:
+            if self.scratch is not None and (not self.keep_scratch or
+                                             self.status == "cancelled"):
+                shutil.rmtree(self.scratch, ignore_errors=True)
+            self._set_done()
+
+    def _evaluate(self):
+        """
+            Sets the status from the collected output files.
+        """
+        bavfile = self.path_out + "_bav.txt"
+        if os.path.isfile(bavfile):
+            self.bavinfo = parse_bavfile(bavfile)
+            success = self.bavinfo["success"]
+        else: # e.g. convolution only
+            success = os.path.isfile(self.path_out) or \
+                      os.path.isfile(self.path_out + ".txt")
+        success &= self.returncode in [0, None] # None: unknown
+        self.status = "finished" if success else "failed"
+
+    def monitor(self, interval=1.):
+        """
+            Waits for the FDMNES process ``pid'' that was started by
+            another (e.g. crashed) interpreter, then collects and evaluates
+            its output like ``execute''. Used for reattached jobs.
+        """
+        try:
+            while process_alive(self.pid, self.scratch):
+                time.sleep(interval)
+            if self._cancelled:
+                self.status = "cancelled"
+                return
+            if self.scratch is not None and os.path.isdir(self.scratch):
+                self._inputname = os.path.basename(self.path)
+                self.collect()
+            self._evaluate()
+        except Exception as e:
+            self.error = e
+            self.status = "failed"
+        finally:
+            if self.scratch is not None and os.path.isdir(self.scratch) \
+               and (not self.keep_scratch or self.status == "cancelled"):
+                shutil.rmtree(self.scratch, ignore_errors=True)
+            self._set_done()
+
+    def _stream_output(self, logfile):
+        """
+            Copies the output of the running process line by line to the
+            log file and passes each line to ``on_output''.
+        """
+        for line in iter(self.proc.stdout.readline, ""):
+            logfile.write(line)
+            logfile.flush()
+            try:
+                self.on_output(line)
+            except Exception:
+                traceback.print_exc()
+        self.proc.stdout.close()
+
+
+
+def _wait(jobs, timeout, condition):
+    """
+        Waits until ``condition'' holds for the done states of ``jobs''.
+        If the wait is interrupted (Ctrl-C), the unfinished jobs are
+        cancelled.
+    """
+    jobs = list(jobs)
+    end = None if timeout is None else time.time() + timeout
+    try:
+        with _finished:
+            while jobs and not condition(job.done() for job in jobs):
+                remaining = POLL_INTERVAL if end is None \
+                                          else end - time.time()
+                if remaining <= 0:
+                    break
+                _finished.wait(min(remaining, POLL_INTERVAL))
+    except KeyboardInterrupt:
+        for job in jobs:
+            job.cancel()
+        raise
+    done = [job for job in jobs if job.done()]
+    pending = [job for job in jobs if not job.done()]
+    return done, pending
+
+
+def wait_any(jobs, timeout=None):
+    """
+        Blocks until at least one of ``jobs'' is finished or the timeout
+        (in seconds) expired.
+        On Ctrl-C, the unfinished jobs are cancelled.
+
+        Returns:
+            (done, pending): lists of finished and unfinished jobs
+    """
+    return _wait(jobs, timeout, any)
+
+
+def wait_all(jobs, timeout=None):
+    """
+        Blocks until all ``jobs'' are finished or the timeout (in seconds)
+        expired.
+        On Ctrl-C, the unfinished jobs are cancelled.
+
+        Returns:
+            (done, pending): lists of finished and unfinished jobs
+    """
+    return _wait(jobs, timeout, all)
+
+
+
+class JobScheduler(object):
+    """
+        Runs FDMNES jobs concurrently on up to ``NumCPU'' cores. Each job
+        occupies as many cores as its launcher starts MPI ranks (one for
+        the serial build); jobs wait until enough cores are free.
+
+        Every job is executed in an isolated scratch directory, such that
+        several simulations can be started from the same directory without
+        racing on ``fdmfile.txt''.
+    """
+    def __init__(self, fdmnes_exe, NumCPU=1, scratch_dir=None,
+                       keep_scratch=False, verbose=False, timeout=None,
+                       limits=None, registry=None, launcher=None):
+        """
+            Input:
+            ------
+                fdmnes_exe : string
+                    Path to the FDMNES executable.
+                NumCPU : int
+                    Number of cores shared by the running jobs.
+                scratch_dir : string
+                    Directory in which the scratch directories are created
+                    (default: system temp directory).
+                keep_scratch : bool
+                    Do not delete scratch directories after the run.
+                timeout : float
+                    Wall-clock time in seconds after which a job is
+                    terminated (status "timeout").
+                limits : dict
+                    Resource limits of the FDMNES processes, e.g.
+                    ``dict(memory=8*2**30, cpu=3600)'' (see ``LIMITS'').
+                registry : registry.JobRegistry
+                    Records the state of every job on disk.
+                launcher : Launcher or string
+                    Default launcher of the jobs (see ``make_launcher'').
+                    Launchers without a fixed number of ranks get
+                    ``NumCPU'' divided by the number of waiting jobs
+                    (including the batch submitted with them).
+        """
+        check_limits(limits)
+        self.fdmnes_exe = fdmnes_exe
+        self.NumCPU = NumCPU
+        self.scratch_dir = scratch_dir
+        self.keep_scratch = keep_scratch
+        self.verbose = verbose
+        self.timeout = timeout
+        self.limits = limits
+        self.registry = registry
+        self.launcher = launcher
+        self.jobs = []
+        self._busy = 0    # cores used by running jobs
+        self._pending = 0 # submitted jobs waiting for cores
+        self._cores = threading.Condition()
+        self._queue = Queue.Queue()
+        self._workers = []
+        self._executing = {} # worker -> job
+        self._closing = False
+        self._lock = threading.Lock()
+        _schedulers.add(self)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    break
+                cores = self._reserve(job)
+                if self._closing:
+                    self._release(cores)
+                    job.cancel()
+                    continue
+                worker = threading.current_thread()
+                self._executing[worker] = job
+                try:
+                    if self.verbose:
+                        print("Processing: %s"%job.path)
+                    job.execute()
+                    if self.verbose:
+                        print("Job %s: %s"%(job.status, job.path))
+                finally:
+                    del self._executing[worker]
+                    self._release(cores)
+            finally:
+                self._queue.task_done()
+
+    def _reserve(self, job):
+        """
+            Blocks until as many cores as ``job'' has MPI ranks are free.
+            Returns the number of reserved cores.
+        """
+        with self._cores:
+            self._pending -= 1
+            while not job._cancelled and not self._closing:
+                cores = max(int(self.NumCPU), 1)
+                # ``NumCPU'' may have been lowered after submission
+                ranks = min(max(job.ranks, 1), cores)
+                if self._busy + ranks <= cores:
+                    job.ranks = ranks
+                    self._busy += ranks
+                    return ranks
+                self._cores.wait(1.)
+        return 0
+
+    def _release(self, cores):
+        with self._cores:
+            self._busy -= cores
+            self._cores.notify_all()
+
+    def _start_workers(self):
+        with self._lock:
+            self._workers = [w for w in self._workers if w.is_alive()]
+            while len(self._workers) < max(int(self.NumCPU), 1):
+                worker = threading.Thread(target=self._worker)
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, path, logpath=None, on_output=None, launcher=None):
+        """
+            Adds the input file ``path'' to the queue and returns the
+            corresponding ``Job'' instance. ``on_output'' is called with
+            every line written by FDMNES. ``launcher'' overrides the
+            default launcher for this job.
+        """
+        return self.submit_many([path], on_output, launcher, logpath)[0]
+
+    def submit_many(self, paths, on_output=None, launcher=None,
+                          logpath=None):
+        """
+            Adds several input files to the queue at once and returns the
+            list of ``Job'' instances. All of them are counted as waiting
+            before the first one starts, so that launchers without a
+            fixed number of ranks share the cores evenly within the batch.
+        """
+        for path in paths:
+            if not os.path.isfile(path):
+                raise ValueError("File not found: %s"%path)
+        check_limits(self.limits)
+        if launcher is None:
+            launcher = self.launcher
+        launcher = make_launcher(launcher)
+        if launcher.ranks is not None and \
+           launcher.ranks > max(int(self.NumCPU), 1):
+            raise ValueError("Launcher starts %i ranks, but only %i cores "
+                             "are available (NumCPU)."
+                             %(launcher.ranks, max(int(self.NumCPU), 1)))
+        jobs = []
+        for path in paths:
+            job = Job(path, self.fdmnes_exe, logpath, self.scratch_dir,
+                      self.keep_scratch, on_output, self.timeout, self.limits,
+                      launcher)
+            job.registry = self.registry
+            job._record()
+            jobs.append(job)
+        self.jobs.extend(jobs)
+        with self._cores:
+            self._pending += len(jobs)
+            share = max(int(self.NumCPU), 1) // max(self._pending, 1)
+            for job in jobs:
+                job.ranks = job.launcher.ranks or max(share, 1)
+        self._start_workers()
+        for job in jobs:
+            self._queue.put(job)
+        return jobs
+
+    def wait(self):
+        """
+            Blocks until all submitted jobs are finished. They are
+            cancelled if the wait is interrupted (Ctrl-C).
+        """
+        wait_all(list(self.jobs))
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+            Stops the worker threads after the queued jobs are processed.
+            With ``wait'', blocks until they are stopped, at most
+            ``timeout'' seconds.
+        """
+        with self._lock:
+            for worker in self._workers:
+                self._queue.put(None)
+            workers = self._workers
+            self._workers = []
+        if not wait:
+            return
+        end = None if timeout is None else time.time() + timeout
+        for worker in workers:
+            while worker.is_alive():
+                remaining = POLL_INTERVAL if end is None \
+                                          else end - time.time()
+                if remaining <= 0:
+                    return
+                worker.join(min(remaining, POLL_INTERVAL))
+
+    def _close(self):
+        """
+            Stops the workers at interpreter exit, so that they do not run
+            during the teardown of the interpreter. Queued jobs are
+            cancelled, and so are running jobs unless they are recorded in
+            a registry, which keeps them for ``registry.reattach''. The
+            exit waits for the termination of the cancelled jobs at most
+            ``KILL_GRACE'' seconds and a bit.
+        """
+        self._closing = True
+        with self._cores: # wake workers waiting for cores
+            self._cores.notify_all()
+        detached = set()
+        for job in list(self.jobs):
+            if job.registry is None or job.status == "queued":
+                job.cancel()
+            elif not job.done():
+                detached.add(job)
+        with self._lock:
+            workers = [worker for worker in self._workers
+                       if self._executing.get(worker) not in detached]
+        self.shutdown(wait=False)
+        end = time.time() + KILL_GRACE + 1.
+        for worker in workers:
+            worker.join(max(end - time.time(), 0))
+
+
+@atexit.register
+def _close_schedulers():
+    for scheduler in list(_schedulers):
+        scheduler._close()
@@ -0,0 +1,78 @@
+"""
+    Space group table of FDMNES (``spacegroup.txt'').
+
+    The table is parsed only once per process and file. Every name of a
+    space group (number with setting, Schoenflies and Hermann-Mauguin
+    symbols, ...) is indexed for fast lookup and for suggestions of similar
+    names.
+"""
+import os
+import bisect
+import difflib
+import itertools
+
+
+_tables = {}
+
+
+class SpaceGroupTable(object):
+    """
+        Parsed space group table with an index of all names.
+
+        Attributes:
+            rows : list of lists of the names of each space group setting
+            flat : list of all names
+            index : dict name -> row number
+    """
+    def __init__(self, rows):
+        self.rows = rows
+        self.flat = list(itertools.chain.from_iterable(rows))
+        self.index = {}
+        for i, row in enumerate(rows):
+            for name in row:
+                self.index.setdefault(name, i)
+        self._names = sorted(self.index)
+
+    @classmethod
+    def from_file(cls, fpath):
+        with open(fpath, "r") as fh:
+            sgcont = filter(lambda s: s.startswith("*"), fh.readlines())
+        sgcont = map(str.strip, sgcont)
+        sgcont = map(lambda s: s.strip("*").replace("=",""), sgcont)
+        sgcont = map(lambda s: s.split(), sgcont)
+        return cls(sgcont)
+
+    def __contains__(self, sg):
+        return isinstance(sg, basestring) and sg in self.index
+
+    def suggestions(self, sg, num=10):
+        """
+            Returns the rows of space groups with a name starting with
+            ``sg'' or being similar to ``sg''.
+        """
+        sg = str(sg)
+        found = []
+        start = bisect.bisect_left(self._names, sg)
+        for name in self._names[start:]:
+            if not name.startswith(sg) or len(found) >= num:
+                break
+            found.append(self.index[name])
+        for name in difflib.get_close_matches(sg, self._names, num):
+            found.append(self.index[name])
+        rows = []
+        for i in found:
+            if self.rows[i] not in rows:
+                rows.append(self.rows[i])
+        return rows
+
+
+def load(fpath):
+    """
+        Returns the ``SpaceGroupTable'' of file ``fpath''. The file is
+        parsed again only if it has been modified.
+    """
+    fpath = os.path.realpath(fpath)
+    mtime = os.path.getmtime(fpath)
+    if fpath not in _tables or _tables[fpath][0] != mtime:
+        _tables[fpath] = (mtime, SpaceGroupTable.from_file(fpath))
+    return _tables[fpath][1]
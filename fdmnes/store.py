@@ -0,0 +1,290 @@
+"""
+    Consolidated storage of FDMNES results.
+
+    The output files of many simulations (spectrum, convolution, spectra
+    of the single absorbers, bav information) are collected in a single
+    container file:
+        - ``.h5''/``.hdf5'': HDF5 file with one group per simulation and
+          chunked, compressed datasets (requires h5py)
+        - any other extension: uncompressed NPZ (zip) file with members
+          ``<name>/<field>.npy'' and ``<name>/meta.json''. The members are
+          memory-mapped when read.
+
+    Fields:
+        spectrum : contents of ``<path_out>.txt'' (energy, xanes, DAFS, ...)
+        conv : contents of ``<path_out>_conv.txt''
+        absorbers : stacked contents of ``<path_out>_<N>.txt''
+"""
+import os
+import json
+import zipfile
+import StringIO
+import numpy as np
+from . import readers
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+
+FIELDS = [("spectrum", ".txt"), ("conv", "_conv.txt")]
+
+
+def collect_outputs(path_out):
+    """
+        Reads all output files of the output base ``path_out''.
+
+        Returns:
+            arrays : dict field -> array
+            meta : dict with column names, bav information and timings
+    """
+    arrays = {}
+    meta = {}
+    for field, suffix in FIELDS:
+        if os.path.isfile(path_out + suffix):
+            data, columns = readers.read_spectrum(path_out + suffix)
+            arrays[field] = data
+            meta[field + "_columns"] = columns
+    absorbers = []
+    while os.path.isfile(path_out + "_%i.txt"%(len(absorbers) + 1)):
+        fpath = path_out + "_%i.txt"%(len(absorbers) + 1)
+        data, columns = readers.read_spectrum(fpath)
+        absorbers.append(data)
+    if absorbers and len(set(a.shape for a in absorbers)) == 1:
+        arrays["absorbers"] = np.array(absorbers)
+        meta["absorbers_columns"] = columns
+    bavfile = path_out + "_bav.txt"
+    if os.path.isfile(bavfile):
+        reader = readers.BavReader(bavfile)
+        meta["bav"] = reader.update()
+        meta["timings"] = reader.timings
+    return arrays, meta
+
+
+def _npz_memmap(buf, info):
+    """
+        Returns a view into the memory-mapped zip file ``buf'' (uint8
+        memmap) of the uncompressed member described by the
+        ``zipfile.ZipInfo'' ``info''. The member has to be in ``.npy''
+        format.
+    """
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError("Compressed member cannot be memory-mapped: %s"
+                         %info.filename)
+    start = info.header_offset
+    header = buf[start:start+30].tostring() # local file header
+    namelen, extralen = np.frombuffer(header[26:30], "<u2")
+    start += 30 + namelen + extralen
+    fh = StringIO.StringIO(buf[start:start+4096].tostring())
+    version = np.lib.format.read_magic(fh)
+    if version == (1, 0):
+        shape, fortran, dtype = np.lib.format.read_array_header_1_0(fh)
+    else:
+        shape, fortran, dtype = np.lib.format.read_array_header_2_0(fh)
+    return np.ndarray(shape, dtype, buf, start + fh.tell(),
+                      order="F" if fortran else "C")
+
+
+
+class ResultStore(object):
+    """
+        Container file for the results of many simulations. See module
+        documentation for the formats.
+
+        Example:
+            with ResultStore("sweep.h5", "a") as store:
+                for job in jobs:
+                    store.ingest(job)
+            store = ResultStore("sweep.h5")
+            xanes = store.read("rutile_0_out", "spectrum", (slice(None), 1))
+    """
+    def __init__(self, path, mode="r"):
+        """
+            Input:
+            ------
+                path : string
+                    Container file. HDF5 is used for extensions ``.h5''
+                    and ``.hdf5''.
+                mode : string
+                    "r" (read only), "a" (append) or "w" (overwrite)
+        """
+        if mode not in ["r", "a", "w"]:
+            raise ValueError("Invalid mode: %s"%mode)
+        self.path = path
+        self.mode = mode
+        self.hdf5 = os.path.splitext(path)[1].lower() in [".h5", ".hdf5"]
+        if self.hdf5:
+            if h5py is None:
+                raise ImportError("h5py is required for HDF5 files.")
+            self._h5 = h5py.File(path, mode)
+        else:
+            if mode == "w" and os.path.isfile(path):
+                os.remove(path)
+            if mode == "r" and not os.path.isfile(path):
+                raise IOError("File not found: %s"%path)
+            self._zip = None     # opened for reading
+            self._writer = None  # opened for appending
+            self._mmap = None    # memory map of the whole file
+            self._entries = None # names of all entries
+
+    def _zipfile(self):
+        """
+            Returns the zip file opened for reading. Its table of contents
+            is read only once.
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._mmap = None
+        if self._zip is None and os.path.isfile(self.path):
+            self._zip = zipfile.ZipFile(self.path, "r", allowZip64=True)
+            self._infos = dict((info.filename, info)
+                               for info in self._zip.infolist())
+        return self._zip
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.hdf5:
+            self._h5.close()
+            return
+        for zf in [self._zip, self._writer]:
+            if zf is not None:
+                zf.close()
+        self._zip = self._writer = self._mmap = None
+
+    def _npz_names(self):
+        if self._zipfile() is None:
+            return {}
+        return self._infos
+
+    def names(self):
+        """
+            Returns the sorted names of the stored simulations.
+        """
+        if self.hdf5:
+            return sorted(self._h5.keys())
+        return sorted(self._entry_names())
+
+    def _entry_names(self):
+        if self._entries is None:
+            self._entries = set(m.split("/")[0] for m in self._npz_names()
+                                if m.endswith("/meta.json"))
+        return self._entries
+
+    def __contains__(self, name):
+        if self.hdf5:
+            return name in self._h5
+        return name in self._entry_names()
+
+    def fields(self, name):
+        """
+            Returns the stored fields of simulation ``name''.
+        """
+        if self.hdf5:
+            return sorted(self._h5[name].keys())
+        prefix = name + "/"
+        return sorted(m[len(prefix):-4] for m in self._npz_names()
+                      if m.startswith(prefix) and m.endswith(".npy"))
+
+    def add(self, name, arrays, meta):
+        """
+            Stores the dictionary of ``arrays'' and the JSON serializable
+            dictionary ``meta'' under ``name''.
+        """
+        if self.mode == "r":
+            raise IOError("Store %s is opened read only."%self.path)
+        if "/" in name:
+            raise ValueError("Invalid name: %s"%name)
+        if name in self:
+            raise ValueError("Entry %s exists already."%name)
+        if self.hdf5:
+            group = self._h5.create_group(name)
+            for field, data in arrays.iteritems():
+                group.create_dataset(field, data=data, chunks=True,
+                                     compression="gzip", shuffle=True)
+            group.attrs["meta"] = json.dumps(meta)
+            return
+        entries = self._entry_names()
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = self._mmap = None
+        if self._writer is None:
+            self._writer = zipfile.ZipFile(self.path,
+                               "a" if os.path.isfile(self.path) else "w",
+                               zipfile.ZIP_STORED, allowZip64=True)
+        for field, data in arrays.iteritems():
+            buf = StringIO.StringIO()
+            np.lib.format.write_array(buf, np.ascontiguousarray(data))
+            self._writer.writestr("%s/%s.npy"%(name, field), buf.getvalue())
+        self._writer.writestr(name + "/meta.json", json.dumps(meta))
+        entries.add(name)
+
+    def ingest(self, source, name=None, parameters=None):
+        """
+            Stores all output files of a finished simulation.
+
+            Input:
+            ------
+                source : scheduler.Job or string
+                    Job or output base (``Filout'') of the simulation.
+                name : string
+                    Name of the entry (default: basename of output base).
+                parameters : dict
+                    Additional information (e.g. varied parameters) to be
+                    stored in the meta data.
+
+            Returns:
+                name of the entry
+        """
+        meta = {}
+        if getattr(source, "path_out", None) is not None:
+            meta["input"] = source.path
+            meta["status"] = source.status
+            source = source.path_out
+        if name is None:
+            name = os.path.basename(source)
+        arrays, outputs = collect_outputs(source)
+        if not arrays:
+            raise IOError("No output files found for %s"%source)
+        meta.update(outputs)
+        meta["path_out"] = os.path.abspath(source)
+        if parameters is not None:
+            meta["parameters"] = parameters
+        self.add(name, arrays, meta)
+        return name
+
+    def meta(self, name):
+        """
+            Returns the meta data of simulation ``name''.
+        """
+        if self.hdf5:
+            return json.loads(self._h5[name].attrs["meta"])
+        return json.loads(self._zipfile().read(name + "/meta.json"))
+
+    def array(self, name, field="spectrum"):
+        """
+            Returns the lazily read array ``field'' of simulation ``name''
+            (h5py dataset or numpy memmap). Only slices taken from it are
+            read from disk.
+        """
+        if self.hdf5:
+            return self._h5[name][field]
+        member = "%s/%s.npy"%(name, field)
+        if member not in self._npz_names():
+            raise KeyError("No field %s for %s"%(field, name))
+        if self._mmap is None:
+            self._mmap = np.memmap(self.path, np.uint8, "r")
+        return _npz_memmap(self._mmap, self._infos[member])
+
+    def read(self, name, field="spectrum", index=Ellipsis):
+        """
+            Reads the slice ``index'' of array ``field'' of simulation
+            ``name'' into memory.
+        """
+        return np.array(self.array(name, field)[index])
@@ -0,0 +1,464 @@
+"""
+    Parameter sweeps: runs an ``fdmnes'' simulation for every point of a
+    grid of parameter values.
+
+    The grid is given as a list of axes. Each axis is a pair of a
+    parameter name and a list of values (Cartesian product with the other
+    axes) or of a tuple of names and a list of value tuples (parameters
+    varied together).
+
+    Example:
+        sw = Sweep(sim, [("Radius", [3., 4., 5.]),
+                         (("Hubbard", "Spinorbite"),
+                          [(0., False), (2., True)])],
+                   directory="sweep")
+        sw.run()
+        result = sw.result()
+        result.sel(Radius=4.)
+
+    Every finished point leaves a stamp file ``<output base>_done.json''
+    with the hash of its input file and the sizes of its output files.
+    ``run(resume=True)'' validates the outputs of an interrupted sweep
+    against these stamps and only runs the points that are missing,
+    failed, truncated or whose input changed.
+"""
+import os
+import json
+import hashlib
+import itertools
+import collections
+import numpy as np
+from .pyFDMNES import keyword_exists, STRUCTURE_ATTRIBUTES
+from .cache import simulation_key
+from . import readers
+
+
+STAMP_SUFFIX = "_done.json"
+
+
+def input_hash(path):
+    """
+        Returns a hash of the input file ``path'' ignoring its time stamp.
+    """
+    digest = hashlib.sha1()
+    with open(path, "r") as fh:
+        for line in fh:
+            if not line.startswith("! Wrote file at"):
+                digest.update(line)
+    return digest.hexdigest()
+
+
+
+class SweepResult(object):
+    """
+        Spectra of a sweep as labeled N-D array.
+
+        Attributes:
+            axes : OrderedDict axis name -> list of values. Names of zipped
+                   axes are tuples.
+            energy : energy grid, if identical for all points, else None
+            data : array of shape (len(axis0), len(axis1), ..., len(energy))
+                   or object array of 1-D spectra if the energy grids
+                   differ. Failed points are NaN (or None).
+            status : array of the job status of each point
+            paths : array of the input file of each point
+    """
+    def __init__(self, axes, energy, data, status, paths):
+        self.axes = axes
+        self.energy = energy
+        self.data = data
+        self.status = status
+        self.paths = paths
+
+    @property
+    def shape(self):
+        return tuple(len(values) for values in self.axes.itervalues())
+
+    def index(self, **labels):
+        """
+            Returns the index tuple for the given axis values. Omitted axes
+            are fully selected.
+        """
+        index = []
+        for name, values in self.axes.iteritems():
+            if isinstance(name, tuple):
+                key = "_".join(name)
+            else:
+                key = name
+            if key in labels:
+                value = labels.pop(key)
+                if value not in values:
+                    raise ValueError("Value %r not found on axis %s"
+                                     %(value, key))
+                index.append(list(values).index(value))
+            else:
+                index.append(slice(None))
+        if labels:
+            raise ValueError("Unknown axes: %s"%", ".join(labels))
+        return tuple(index)
+
+    def sel(self, **labels):
+        """
+            Returns the part of ``data'' for the given axis values, e.g.
+            ``sel(Radius=4.)''. Zipped axes are addressed by their names
+            joined by ``_'', e.g. ``sel(Hubbard_Spinorbite=(2., True))''.
+        """
+        return self.data[self.index(**labels)]
+
+
+
+class Sweep(object):
+    """
+        Runs a base ``fdmnes'' instance for all points of a parameter grid.
+
+        Input files are written to ``directory'' as
+        ``<name>_<number>_inp.txt''. Identical points (same structure and
+        parameters) are written and run only once. The jobs are executed
+        concurrently by ``fdmnes.RunParallel'' using ``sim.NumCPU''
+        processes.
+    """
+    def __init__(self, sim, axes, directory=None, name="sweep",
+                       job_dirs=False):
+        """
+            Input:
+            ------
+                sim : fdmnes instance
+                    Base simulation. Its parameters and structure are
+                    restored after each point.
+                axes : list of (name, values) pairs or OrderedDict
+                    Grid specification (see module documentation). Names
+                    are FDMNES parameters or structure attributes (a, b,
+                    c, alpha, beta, gamma, sg).
+                directory : string
+                    Directory for input and output files (default: current
+                    directory).
+                name : string
+                    Prefix of the file names.
+                job_dirs : bool
+                    Write each point to its own subdirectory
+                    ``<name>_<number>'' of ``directory''.
+        """
+        self.sim = sim
+        if isinstance(axes, dict):
+            axes = axes.items()
+        self.axes = collections.OrderedDict()
+        for names, values in axes:
+            values = list(values)
+            if isinstance(names, tuple):
+                for value in values:
+                    if len(value) != len(names):
+                        raise ValueError("Expected %i values for %s: %r"
+                                         %(len(names), names, value))
+            for keyw in (names if isinstance(names, tuple) else [names]):
+                self._check_name(keyw)
+            self.axes[names] = values
+        if directory is None:
+            directory = os.getcwd()
+        self.directory = os.path.abspath(directory)
+        self.name = name
+        self.job_dirs = job_dirs
+        self.paths = None  # input file of each point
+        self.jobs = {}     # input file -> scheduler.Job
+
+    def _check_name(self, keyw):
+        if keyw not in STRUCTURE_ATTRIBUTES and keyword_exists(keyw) is None:
+            raise ValueError("'%s' is neither a valid FDMNES parameter nor "
+                             "a structure attribute."%keyw)
+
+    @property
+    def shape(self):
+        return tuple(len(values) for values in self.axes.itervalues())
+
+    def points(self):
+        """
+            Generator of dictionaries parameter -> value for all grid
+            points in C order.
+        """
+        for values in itertools.product(*self.axes.values()):
+            point = collections.OrderedDict()
+            for names, value in zip(self.axes, values):
+                if isinstance(names, tuple):
+                    point.update(zip(names, value))
+                else:
+                    point[names] = value
+            yield point
+
+    def apply(self, point):
+        """
+            Sets the values of ``point'' in the base simulation and returns
+            a function that restores the previous state.
+        """
+        restore, changed = self.sim._apply(point)
+        return restore
+
+    def path(self, number):
+        width = len(str(max(int(np.prod(self.shape)) - 1, 0)))
+        jobname = "%s_%0*i"%(self.name, width, number)
+        if self.job_dirs:
+            return os.path.join(self.directory, jobname, jobname + "_inp.txt")
+        return os.path.join(self.directory, jobname + "_inp.txt")
+
+    def template(self):
+        """
+            Returns an ``template.InputTemplate'' for the swept names or
+            None if they cannot be swept by a template or if the results
+            are cached.
+        """
+        from .template import InputTemplate
+        if self.sim.cache is not None:
+            return None
+        names = []
+        for axis in self.axes:
+            names.extend(axis if isinstance(axis, tuple) else [axis])
+        try:
+            return InputTemplate(self.sim, names)
+        except ValueError:
+            return None
+
+    def write(self):
+        """
+            Writes the input files of all distinct grid points and returns
+            the list of input files of all points (in C order). The files
+            are written atomically from an ``InputTemplate'' if possible.
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        written = {}
+        self.paths = []
+        template = self.template()
+        if template is None:
+            self._write_points(written)
+            return self.paths
+        for point in self.points():
+            body = template.render(point)
+            key = hashlib.sha1(body).hexdigest()
+            if key not in written:
+                path = self.path(len(written))
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                template._write(path, body, overwrite=True, atomic=True)
+                written[key] = path
+            self.paths.append(written[key])
+        return self.paths
+
+    def _write_points(self, written):
+        """
+            Writes the input files point by point with
+            ``fdmnes.WriteInputFile''.
+        """
+        for point in self.points():
+            restore = self.apply(point)
+            try:
+                key = simulation_key(self.sim)
+                if key not in written:
+                    path = self.path(len(written))
+                    if not os.path.isdir(os.path.dirname(path)):
+                        os.makedirs(os.path.dirname(path))
+                    self.sim.WriteInputFile(path, overwrite=True,
+                                            update=False)
+                    written[key] = path
+                self.paths.append(written[key])
+            finally:
+                restore()
+
+    def unique_paths(self):
+        seen = set()
+        return [p for p in self.paths if not (p in seen or seen.add(p))]
+
+    def run(self, wait=True, resume=False, callback=None, **kwargs):
+        """
+            Writes the input files and runs all distinct points with
+            ``fdmnes.RunParallel''. Keyword arguments are passed on.
+
+            Input:
+            ------
+                wait : bool
+                    Block until all points are finished.
+                resume : bool
+                    Do not run points whose outputs are valid (see
+                    ``check''), e.g. after an interrupted sweep. They are
+                    returned as finished jobs.
+                callback : callable
+                    Function called with each ``scheduler.Job'' as soon
+                    as it is finished.
+
+            Returns:
+                list of ``scheduler.Job'' instances
+        """
+        from .scheduler import Job
+        self.write()
+        paths = self.unique_paths()
+        valid = {}
+        if resume:
+            for path in paths:
+                if self.check(path) is None:
+                    outputs = [fpath for (fpath, size)
+                               in self.stamp(path)["files"]]
+                    valid[path] = Job.finished(path, outputs)
+        def done(job):
+            self._write_stamp(job)
+            if callback is not None:
+                callback(job)
+        todo = [path for path in paths if path not in valid]
+        jobs = self.sim.RunParallel(todo, wait=wait, callback=done, **kwargs)
+        jobs = dict((job.path, job) for job in jobs)
+        jobs.update(valid)
+        self.jobs.update(jobs)
+        return [jobs[path] for path in paths]
+
+    def stamp_path(self, path):
+        return self.output_base(path) + STAMP_SUFFIX
+
+    def stamp(self, path):
+        """
+            Returns the stamp of the point with input file ``path'' or None.
+        """
+        try:
+            with open(self.stamp_path(path), "r") as fh:
+                return json.load(fh)
+        except (IOError, ValueError):
+            return None
+
+    def _write_stamp(self, job):
+        """
+            Writes the stamp of a successfully finished job: hash of the
+            input file and list of the output files (sorted like the
+            outputs of a job) with their sizes.
+        """
+        from .template import write_atomic
+        if job.status != "finished":
+            return
+        path_out = self.output_base(job.path)
+        outputs = job.outputs
+        if not outputs: # results taken from the cache
+            outputs = [path_out + suffix for suffix in [".txt", "_bav.txt"]]
+        files = [(fpath, os.path.getsize(fpath))
+                 for fpath in sorted(map(os.path.abspath, outputs))
+                 if os.path.isfile(fpath)]
+        stamp = dict(input=input_hash(job.path), files=files)
+        write_atomic(self.stamp_path(job.path), json.dumps(stamp))
+
+    def check(self, path):
+        """
+            Validates the outputs of the point with input file ``path''.
+
+            Returns:
+                None if the outputs are complete and belong to the current
+                input file, else the reason why the point must be run.
+        """
+        stamp = self.stamp(path)
+        if stamp is None:
+            return "not finished"
+        if stamp.get("input") != input_hash(path):
+            return "input changed"
+        for fpath, size in stamp.get("files", []):
+            if not os.path.isfile(fpath):
+                return "%s missing"%fpath
+            if os.path.getsize(fpath) != size:
+                return "%s changed"%fpath
+        path_out = self.output_base(path)
+        if not readers.bav_complete(path_out + "_bav.txt"):
+            return "bav file incomplete"
+        if not readers.spectrum_complete(path_out + ".txt"):
+            return "spectrum truncated"
+        return None
+
+    def pending(self):
+        """
+            Returns a dictionary input file -> reason for all distinct
+            points that would be run by ``run(resume=True)''.
+        """
+        if self.paths is None:
+            self.write()
+        pending = collections.OrderedDict()
+        for path in self.unique_paths():
+            reason = self.check(path)
+            if reason is not None:
+                pending[path] = reason
+        return pending
+
+    def output_base(self, path):
+        """
+            Returns the output base (``Filout'') of the point with input
+            file ``path'', as written by ``fdmnes.WriteInputFile''.
+        """
+        return self.sim._output_base(path)[0]
+
+    def read_point(self, path, conv=False, column="<xanes>"):
+        """
+            Returns energy and spectrum of the point with input file
+            ``path''.
+        """
+        path_out = self.output_base(path)
+        fpath = path_out + ("_conv.txt" if conv else ".txt")
+        data, columns = readers.read_spectrum(fpath)
+        if not isinstance(column, int):
+            column = columns.index(column)
+        return data[:,0], data[:,column]
+
+    def export(self, path):
+        """
+            Stores the outputs of all finished points together with their
+            parameters in the ``store.ResultStore'' ``path''. Points that
+            are stored already are skipped.
+
+            Returns:
+                list of the names of the new entries
+        """
+        from .store import ResultStore
+        if self.paths is None:
+            self.write()
+        names = []
+        with ResultStore(path, "a") as store:
+            for point, fpath in zip(self.points(), self.paths):
+                path_out = self.output_base(fpath)
+                job = self.jobs.get(fpath)
+                if os.path.basename(path_out) in store or \
+                   (job is not None and job.status != "finished") or \
+                   not os.path.isfile(path_out + ".txt"):
+                    continue
+                names.append(store.ingest(path_out, parameters=dict(point)))
+        return names
+
+    def result(self, conv=False, column="<xanes>"):
+        """
+            Collects the spectra of all points into a ``SweepResult''.
+
+            Input:
+            ------
+                conv : bool
+                    Read the convoluted spectra (``_conv.txt'').
+                column : string or int
+                    Column of the output files to collect.
+        """
+        if self.paths is None:
+            self.write()
+        shape = self.shape
+        spectra = {}
+        status = np.empty(len(self.paths), dtype=object)
+        for i, path in enumerate(self.paths):
+            job = self.jobs.get(path)
+            status[i] = job.status if job is not None else "unknown"
+            if path in spectra or status[i] not in ["finished", "unknown"]:
+                continue
+            try:
+                spectra[path] = self.read_point(path, conv, column)
+            except (IOError, ValueError):
+                status[i] = "missing"
+        grids = [e for (e, spec) in spectra.itervalues()]
+        common = bool(grids) and all(len(e) == len(grids[0]) and
+                                     np.allclose(e, grids[0]) for e in grids)
+        if common:
+            energy = grids[0]
+            data = np.empty((len(self.paths), len(energy)))
+            data.fill(np.nan)
+        else:
+            energy = None
+            data = np.empty(len(self.paths), dtype=object)
+        for i, path in enumerate(self.paths):
+            if path in spectra:
+                data[i] = spectra[path][1]
+        data = data.reshape(shape + data.shape[1:])
+        paths = np.array(self.paths, dtype=object).reshape(shape)
+        return SweepResult(collections.OrderedDict(self.axes), energy, data,
+                           status.reshape(shape), paths)
@@ -0,0 +1,242 @@
+"""
+    Bulk generation of input files from a template.
+
+    An ``InputTemplate'' renders the input file of an ``fdmnes'' instance
+    once and leaves placeholders for a fixed set of swept parameters and
+    structure attributes. Writing a variant only substitutes these values:
+    the structure and the other parameters are neither checked nor
+    rendered again.
+
+    Example:
+        tpl = InputTemplate(sim, ["Radius", "a"])
+        paths = tpl.write_jobs("scan", [dict(Radius=r, a=4.59)
+                                        for r in np.arange(3., 8., 0.01)])
+        sim.RunParallel(paths)
+"""
+import os
+import time
+from .pyFDMNES import Parameters, keyword_exists, param2str, \
+                      PARAMETERS, STRUCTURE_ATTRIBUTES, VARIANT_SWITCHES
+
+
+CELL_ATTRIBUTES = ["a", "b", "c", "alpha", "beta", "gamma"]
+
+
+def write_atomic(path, content):
+    """
+        Writes ``content'' to a temporary file next to ``path'' and
+        renames it, so that ``path'' is either missing or complete.
+    """
+    tmppath = "%s.%i.tmp"%(path, os.getpid())
+    try:
+        with open(tmppath, "w") as fh:
+            fh.write(content)
+        os.rename(tmppath, path)
+    except (IOError, OSError):
+        if os.path.isfile(tmppath):
+            os.remove(tmppath)
+        raise
+
+
+
+class InputTemplate(object):
+    """
+        Input file of an ``fdmnes'' instance with placeholders for the
+        parameters and structure attributes in ``names''. See module
+        documentation.
+
+        SCF, Convolution, Calculation, Extract and RXS change the layout of
+        the input file and Atom changes the atom list, so these parameters
+        cannot be swept. Input files written from a template are not
+        registered with the result cache of the instance.
+    """
+    def __init__(self, sim, names):
+        """
+            Input:
+            ------
+                sim : fdmnes instance
+                    Simulation providing structure and parameters. Later
+                    changes of ``sim'' do not affect the template.
+                names : list of strings
+                    FDMNES parameters and structure attributes (see
+                    ``STRUCTURE_ATTRIBUTES'') to be substituted.
+        """
+        self.sim = sim
+        self.names = []
+        for name in names:
+            if name not in STRUCTURE_ATTRIBUTES:
+                keyset = keyword_exists(name)
+                if keyset is None:
+                    raise ValueError("'%s' is neither a valid FDMNES "
+                                     "parameter nor a structure attribute."
+                                     %name)
+                if keyset in VARIANT_SWITCHES or keyset == "Atom":
+                    raise ValueError("Parameter %s cannot be swept in a "
+                                     "template."%keyset)
+                name = keyset
+            if name not in self.names:
+                self.names.append(name)
+
+        path_out, convonly = sim._output_base("template_inp.txt")
+        if convonly:
+            raise ValueError("Templates of input files that only perform "
+                             "the convolution are not supported.")
+        sim.P.Calculation = []
+
+        self.defaults = {} # current values of the substituted names
+        for name in self.names:
+            if name in STRUCTURE_ATTRIBUTES:
+                self.defaults[name] = getattr(sim, name, None)
+            else:
+                self.defaults[name] = sim.P[name]
+
+        # structure split into the parts around the cell parameters
+        lines = sim.write_structure()
+        if lines[0] == "Spgroup":
+            lines = lines[3:]
+        self._crystal = lines[0] + os.linesep
+        self._cell = dict((name, getattr(sim, name))
+                          for name in CELL_ATTRIBUTES)
+        self._sg = getattr(sim, "sg", None)
+        self._atoms = os.linesep.join(lines[2:])
+
+        placeholders = set(self.names)
+        if placeholders.intersection(STRUCTURE_ATTRIBUTES):
+            placeholders.add("structure")
+        self._P = Parameters()
+        # layout: fixed texts and names of placeholders, consecutive fixed
+        # sections are joined
+        self._layout = []
+        fixed = []
+        for name, text in sim._input_sections(path_out,
+                                              placeholders=placeholders):
+            if name == "Filout":
+                continue
+            if text is not None:
+                fixed.append(text)
+                continue
+            if fixed:
+                self._layout.append((None, (os.linesep*2).join(fixed)))
+                fixed = []
+            self._layout.append((name, None))
+        if fixed:
+            self._layout.append((None, (os.linesep*2).join(fixed)))
+
+    def _values(self, values):
+        """
+            Returns the validated values of all substituted names.
+        """
+        result = dict(self.defaults)
+        for name, value in values.iteritems():
+            if name in CELL_ATTRIBUTES:
+                value = float(value)
+            elif name == "sg":
+                value = str(value)
+                self.sim._check_sg(value)
+            else:
+                self._P[name] = value
+                name = keyword_exists(name)
+                value = dict.__getitem__(self._P, name)
+            if name not in result:
+                raise ValueError("%s is not substituted by this template."
+                                 %name)
+            result[name] = value
+        return result
+
+    def _structure(self, values):
+        text = ""
+        sg = values.get("sg", self._sg)
+        if sg is not None:
+            text = "Spgroup" + os.linesep + str(sg) + os.linesep*2
+        cell = tuple(values.get(name, self._cell[name])
+                     for name in CELL_ATTRIBUTES)
+        text += self._crystal + "  %g %g %g %g %g %g"%cell
+        return text + os.linesep + self._atoms
+
+    def render(self, values):
+        """
+            Returns the input file for the dictionary ``values'' without
+            the ``Filout'' section and the time stamp. Names that are not
+            given keep the values of the template.
+        """
+        values = self._values(values)
+        parts = []
+        for name, text in self._layout:
+            if text is not None:
+                parts.append(text)
+            elif name == "structure":
+                parts.append(self._structure(values))
+            else:
+                value, default = values[name], PARAMETERS[name][0]
+                if value == default or value != value and default != default:
+                    continue # default value, possibly NaN (e.g. ``Rmt'')
+                value = param2str(value)
+                parts.append(name + os.linesep + value if value else name)
+        return (os.linesep*2).join(parts)
+
+    def _write(self, path, body, overwrite=False, atomic=False):
+        """
+            Writes the input file ``path'' with the rendered ``body'' and
+            returns the output base.
+        """
+        if os.path.isfile(path) and not overwrite:
+            raise IOError("File %s already exists. "
+                          "Use overwrite=True to replace it."%path)
+        path_out, convonly = self.sim._output_base(path, False)
+        content = "".join(["Filout", os.linesep, path_out, os.linesep*2,
+                           body, os.linesep*2,
+                           "! Wrote file at %s"%time.ctime(),
+                           os.linesep, "End"])
+        if atomic:
+            write_atomic(path, content)
+        else:
+            with open(path, "w") as fh:
+                fh.write(content)
+        return path_out
+
+    def write(self, path, values=None, overwrite=False, atomic=False):
+        """
+            Writes the input file ``path'' for the dictionary ``values''.
+            With ``atomic'' the file is written to a temporary file first
+            and renamed.
+
+            Returns:
+                output base
+        """
+        if values is None:
+            values = {}
+        return self._write(path, self.render(values), overwrite, atomic)
+
+    def write_many(self, paths, variants, overwrite=False, atomic=False):
+        """
+            Writes one input file for each pair of path and variant
+            (dictionary of values).
+
+            Returns:
+                list of output bases
+        """
+        return [self.write(path, values, overwrite, atomic)
+                for (path, values) in zip(paths, variants)]
+
+    def write_jobs(self, directory, variants, name="job", overwrite=True,
+                         atomic=True):
+        """
+            Writes each variant to its own job directory
+            ``<directory>/<name>_<number>/<name>_<number>_inp.txt'', so
+            that the output files of the jobs are separated.
+
+            Returns:
+                list of input files
+        """
+        variants = list(variants)
+        width = len(str(max(len(variants) - 1, 0)))
+        paths = []
+        for i, values in enumerate(variants):
+            jobname = "%s_%0*i"%(name, width, i)
+            jobdir = os.path.join(directory, jobname)
+            if not os.path.isdir(jobdir):
+                os.makedirs(jobdir)
+            path = os.path.join(jobdir, jobname + "_inp.txt")
+            self.write(path, values, overwrite, atomic)
+            paths.append(path)
+        return paths
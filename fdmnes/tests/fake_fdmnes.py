@@ -0,0 +1,128 @@
+"""
+    Minimal stand-in for the FDMNES executable used by the tests. It reads
+    ``fdmfile.txt'' from the current directory and writes output, bav and
+    convolution files in the format of FDMNES for each listed input file.
+"""
+import os
+import stat
+import sys
+
+
+SCRIPT = r'''#!%(python)s
+import os
+import sys
+import time
+
+def read_input(path):
+    keyw = None
+    param = {}
+    with open(path) as fh:
+        for line in fh:
+            line = line.split("!")[0].strip()
+            if not line:
+                continue
+            if line.lower() == "end":
+                break
+            if keyw in ["filout", "conv_out"] and not param[keyw]:
+                param[keyw].append(line)
+            elif line[0].isalpha() and not line.endswith(".txt"):
+                keyw = line.lower()
+                param[keyw] = []
+            elif keyw is not None:
+                param[keyw].append(line)
+    return param
+
+with open("fdmfile.txt") as fh:
+    content = [s.strip() for s in fh if s.strip()]
+
+time.sleep(float(os.environ.get("FAKE_FDMNES_SLEEP", 0)))
+for path in content[1:1+int(content[0])]:
+    sys.stdout.write(" Calculation of %%s\n"%%path)
+    sys.stdout.flush()
+    param = read_input(path)
+    if "range" in param:
+        start, step, stop = map(float, param["range"][0].split()[:3])
+    else:
+        start, step, stop = -5., 1., 5.
+    energy = []
+    while start <= stop:
+        energy.append(start)
+        start += step
+    absorbers = len(param.get("absorber", ["1"])[0].split())
+    if "conv_out" in param:
+        out = param["conv_out"][0]
+        with open(out, "w") as fh:
+            fh.write("    Energy    <xanes>\n")
+            for e in energy:
+                fh.write("%%10.3f %%12.5e\n"%%(e, 1. + e/100.))
+        continue
+    out = param.get("filout", ["fdmnes_out"])[0]
+    if os.environ.get("FAKE_FDMNES_FAIL"):
+        with open(out + "_bav.txt", "w") as fh:
+            fh.write("Error in the input file\n")
+        sys.exit(1)
+    files = [out + ".txt"]
+    if absorbers > 1:
+        files += [out + "_%%i.txt"%%(i+1) for i in range(absorbers)]
+    rxs = param.get("rxs", [])
+    for fname, percol in [(fname, 2) for fname in files] \
+                       + [(out + "_conv.txt", 1)]*("convolution" in param):
+        with open(fname, "w") as fh:
+            fh.write("  FDMNES fake output\n")
+            fh.write("    Energy    <xanes>")
+            for i, line in enumerate(rxs):
+                h, k, l = line.split()[:3]
+                for j in range(percol):
+                    fh.write("  %%s(%%s%%s%%s)_%%i"%%("ri"[j], h, k, l, i))
+            fh.write("\n")
+            for e in energy:
+                fh.write("%%10.3f %%12.5e"%%(e, 1. + e/100.))
+                for i in range(len(rxs)*percol):
+                    fh.write(" %%12.5e"%%(i + e/100.))
+                fh.write("\n")
+    with open(out + "_bav.txt", "w") as fh:
+        for i in range(absorbers):
+            for cycle in range(2):
+                fh.write("  Cycle %%i   Delta = 0.1\n"%%(cycle+1))
+            for e in energy:
+                fh.write("  Energy = %%9.3f eV\n"%%e)
+            fh.write(" Subroutine times for absorbing atom %%i\n"%%(i+1))
+            fh.write("                  CPU    Wall\n")
+            fh.write("     Sphere =   0.10   0.20\n")
+            fh.write("        Mat =   0.15   0.15\n")
+            fh.write("      Total =   0.30   0.40\n")
+        fh.write("\n Have a beautiful day !\n")
+'''
+
+MPIRUN = r'''#!%(python)s
+import os
+import sys
+
+# mpirun -np <ranks> <exe>: report the ranks and run the program once
+sys.stdout.write(" mpirun ranks %%s\n"%%sys.argv[2])
+sys.stdout.flush()
+os.execv(sys.argv[3], sys.argv[3:])
+'''
+
+
+def install(directory):
+    """
+        Writes the fake FDMNES executable to ``directory'' and returns
+        its path.
+    """
+    path = os.path.join(directory, "fdmnes_fake")
+    with open(path, "w") as fh:
+        fh.write(SCRIPT%dict(python=sys.executable))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path
+
+
+def install_mpirun(directory):
+    """
+        Writes a fake ``mpirun'' to ``directory'' and returns its path.
+    """
+    path = os.path.join(directory, "mpirun_fake")
+    with open(path, "w") as fh:
+        fh.write(MPIRUN%dict(python=sys.executable))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path
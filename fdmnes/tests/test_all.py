@@ -1,10 +1,38 @@
 import unittest
 from . import test_fdmnes
+from . import test_scheduler
+from . import test_cache
+from . import test_convolution
+from . import test_readers
+from . import test_dafs
+from . import test_spacegroups
+from . import test_cifreader
+from . import test_bulk
+from . import test_profiling
+from . import test_sweep
+from . import test_store
+from . import test_inputfile
+from . import test_template
+from . import test_registry
 
 def test_suite():
     """Test suite including all test suites"""
     testSuite = unittest.TestSuite()
     testSuite.addTest(test_fdmnes.test_suite())
+    testSuite.addTest(test_scheduler.test_suite())
+    testSuite.addTest(test_cache.test_suite())
+    testSuite.addTest(test_convolution.test_suite())
+    testSuite.addTest(test_readers.test_suite())
+    testSuite.addTest(test_dafs.test_suite())
+    testSuite.addTest(test_spacegroups.test_suite())
+    testSuite.addTest(test_cifreader.test_suite())
+    testSuite.addTest(test_bulk.test_suite())
+    testSuite.addTest(test_profiling.test_suite())
+    testSuite.addTest(test_sweep.test_suite())
+    testSuite.addTest(test_store.test_suite())
+    testSuite.addTest(test_inputfile.test_suite())
+    testSuite.addTest(test_template.test_suite())
+    testSuite.addTest(test_registry.test_suite())
     return testSuite
     
 if __name__ == '__main__':
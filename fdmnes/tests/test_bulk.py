@@ -0,0 +1,62 @@
+import os
+import StringIO
+import unittest
+from testfixtures import TempDirectory
+from .. import bulk
+from ..pyFDMNES import fdmnes
+from . import fake_fdmnes
+from .test_cifreader import CIF
+
+class test_bulk(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TempDirectory()
+        self.exe = fake_fdmnes.install(self.dir.path)
+        self.cifdir = os.path.join(self.dir.path, "cifs")
+        os.makedirs(os.path.join(self.cifdir, "sub"))
+        for i in range(5):
+            with open(os.path.join(self.cifdir, "sub", "%i.cif"%i), "w") as fh:
+                fh.write(CIF)
+        with open(os.path.join(self.cifdir, "broken.cif"), "w") as fh:
+            fh.write("data_broken\n_cell_length_a 1\n")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_import(self):
+        report = StringIO.StringIO()
+        results = list(bulk.import_cifs(self.cifdir, "Ti", self.exe,
+                                        processes=2, report=report))
+        self.assertEqual(len(results), 6)
+        failed = [r for r in results if r.error is not None]
+        self.assertEqual(len(failed), 1)
+        self.assertTrue(report.getvalue().startswith(failed[0].path))
+        for result in results:
+            if result.error is None:
+                self.assertTrue(isinstance(result.sim, fdmnes))
+                self.assertEqual(result.sim.P.Z_absorber, 22)
+                self.assertEqual(result.sim.sg, "99")
+
+    def test_records(self):
+        results = bulk.import_cifs([os.path.join(self.cifdir, "sub")],
+                                   fdmnes_path=self.exe, processes=2,
+                                   records=True)
+        for result in results:
+            self.assertTrue(result.sim is None)
+            sim = fdmnes(result.record, fdmnes_path=self.exe)
+            self.assertEqual(len(sim.positions), 4)
+
+def test_suite():
+    """Test suite including all test suites"""
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(test_bulk("test_import"))
+    testSuite.addTest(test_bulk("test_records"))
+    return testSuite
+
+if __name__ == '__main__':
+    import sys
+
+    mysuite = test_suite()
+    runner = unittest.TextTestRunner()
+    if not runner.run(mysuite).wasSuccessful():
+        sys.exit(1)
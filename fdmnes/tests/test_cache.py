@@ -0,0 +1,88 @@
+import os
+import unittest
+from testfixtures import TempDirectory
+from ..pyFDMNES import fdmnes
+from ..cache import ResultCache
+from . import fake_fdmnes
+
+class test_cache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TempDirectory()
+        self.exe = fake_fdmnes.install(self.dir.path)
+        self.sim = fdmnes("136", fdmnes_path=self.exe)
+        self.sim.add_atom("Ti", (0,0,0), resonant=True)
+        self.sim.P.Range = (-5.,1.,5.)
+        self.sim.cache = ResultCache(os.path.join(self.dir.path, "cache"))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_hit(self):
+        first = os.path.join(self.dir.path, "first_inp.txt")
+        self.sim.WriteInputFile(first)
+        job, = self.sim.RunParallel(wait=True)
+        self.assertEqual(len(self.sim.cache.entries()), 1)
+
+        second = os.path.join(self.dir.path, "second_inp.txt")
+        self.sim.WriteInputFile(second)
+        job, = self.sim.RunParallel(wait=True)
+        self.assertEqual(job.status, "finished")
+        self.assertEqual(len(self.sim.scheduler.jobs), 1)
+        path_out = os.path.join(self.dir.path, "second_out")
+        self.assertTrue(os.path.isfile(path_out + ".txt"))
+        self.assertTrue(os.path.isfile(path_out + "_bav.txt"))
+
+    def test_run(self):
+        first = os.path.join(self.dir.path, "first_inp.txt")
+        self.sim.WriteInputFile(first)
+        cwd = os.getcwd()
+        os.chdir(self.dir.path)
+        try:
+            self.assertEqual(self.sim.Run(wait=True), 1)
+            second = os.path.join(self.dir.path, "second_inp.txt")
+            self.sim.WriteInputFile(second)
+            job = self.sim.Run(wait=True)
+        finally:
+            os.chdir(cwd)
+        # cached results: a finished job that Status and cancel accept
+        self.assertEqual(job.status, "finished")
+        self.assertTrue(os.path.join(self.dir.path, "second_out.txt")
+                        in job.result())
+        self.assertEqual(self.sim.Status(job, verbose=False), 2)
+        self.assertFalse(self.sim.cancel(job))
+        self.sim.RemoveJob(job)
+
+    def test_miss(self):
+        key = self.sim.cache.key(self.sim)
+        self.sim.P.Radius = 3.
+        self.assertNotEqual(key, self.sim.cache.key(self.sim))
+        self.sim.P.Radius = 5.67 # default
+        self.assertEqual(key, self.sim.cache.key(self.sim))
+
+    def test_evict(self):
+        self.sim.cache.max_entries = 2
+        for radius in [3., 4., 5.]:
+            self.sim.P.Radius = radius
+            self.sim.WriteInputFile(
+                os.path.join(self.dir.path, "r%g_inp.txt"%radius))
+            self.sim.RunParallel(wait=True)
+        self.assertEqual(len(self.sim.cache.entries()), 2)
+        self.assertTrue(self.sim.cache.key(self.sim) in self.sim.cache)
+
+def test_suite():
+    """Test suite including all test suites"""
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(test_cache("test_hit"))
+    testSuite.addTest(test_cache("test_run"))
+    testSuite.addTest(test_cache("test_miss"))
+    testSuite.addTest(test_cache("test_evict"))
+    return testSuite
+
+if __name__ == '__main__':
+    import sys
+
+    mysuite = test_suite()
+    runner = unittest.TextTestRunner()
+    if not runner.run(mysuite).wasSuccessful():
+        sys.exit(1)
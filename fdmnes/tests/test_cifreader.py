@@ -0,0 +1,78 @@
+import os
+import unittest
+from testfixtures import TempDirectory
+from .. import cifreader
+
+CIF = """# test structure
+data_test
+_publ_section_title
+;
+ A 'quoted' title
+;
+_symmetry_space_group_name_H-M   'P 4 m m'
+_symmetry_Int_Tables_number      99
+_cell_length_a                   3.9998(8)
+_cell_length_b                   3.9998(8)
+_cell_length_c                   4.018(3)
+_cell_angle_alpha                90.
+_cell_angle_beta                 90.
+_cell_angle_gamma                90.
+loop_
+_atom_site_label
+_atom_site_type_symbol
+_atom_site_fract_x
+_atom_site_fract_y
+_atom_site_fract_z
+_atom_site_occupancy
+_atom_site_B_iso_or_equiv
+Ba1 Ba2+ 0 0 0 1. .39(2)
+Ti1 Ti4+ 0.5 0.5 0.482(1) 1. .39(2)   # comment
+O1 O2- 0.5 0.5 0.016(5) 1. .39(2)
+O2 O2- 0.5 0 0.515(4) 1. .39(2)
+"""
+
+class test_cifreader(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TempDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, content):
+        path = os.path.join(self.dir.path, "test.cif")
+        with open(path, "w") as fh:
+            fh.write(content)
+        return path
+
+    def test_compare(self):
+        path = self.write(CIF)
+        cif = cifreader.read_cif_fast(path)
+        self.assertEqual(cif, cifreader.read_cif_full(path))
+        self.assertEqual(cif["tags"]["_symmetry_space_group_name_h-m"],
+                         "P 4 m m")
+        self.assertEqual(len(cif["atoms"]), 4)
+        self.assertEqual(cif["atoms"][1]["_atom_site_fract_z"], "0.482(1)")
+
+    def test_fallback(self):
+        path = self.write(CIF.replace("data_test", "data_test\nsave_frame\n"
+                                      "_dummy 1\nsave_"))
+        self.assertRaises(cifreader.CifFormatError,
+                          cifreader.read_cif_fast, path)
+        path = self.write(CIF.replace("O2 O2- 0.5 0 0.515(4) 1. .39(2)", ""))
+        self.assertEqual(len(cifreader.read_cif(path)["atoms"]), 3)
+
+def test_suite():
+    """Test suite including all test suites"""
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(test_cifreader("test_compare"))
+    testSuite.addTest(test_cifreader("test_fallback"))
+    return testSuite
+
+if __name__ == '__main__':
+    import sys
+
+    mysuite = test_suite()
+    runner = unittest.TextTestRunner()
+    if not runner.run(mysuite).wasSuccessful():
+        sys.exit(1)
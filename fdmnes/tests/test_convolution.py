@@ -0,0 +1,136 @@
+import os
+import unittest
+import numpy as np
+from testfixtures import TempDirectory
+from .. import convolution
+from ..pyFDMNES import fdmnes
+from . import fake_fdmnes
+
+class test_convolution(unittest.TestCase):
+
+    def setUp(self):
+        self.energy = np.hstack((np.arange(-20., 10., 0.2),
+                                 np.arange(10., 60., 1.)))
+        self.params = dict(Gamma_hole=1., Gamma_max=15., Ecent=30.,
+                           Elarg=30., Efermi=-5.)
+
+    def test_constant(self):
+        flat = np.ones(len(self.energy))
+        result = convolution.convolve(self.energy, flat, Nocut=True,
+                                      Gaussian=2., **self.params)
+        self.assertTrue(np.allclose(result, 1.))
+
+    def test_fermi_cut(self):
+        flat = np.ones(len(self.energy))
+        result = convolution.convolve(self.energy, flat, Gamma_hole=1.,
+                                      Gamma_max=0., Efermi=-5.)
+        ind = np.argmin(abs(self.energy + 5.))
+        self.assertTrue(0.35 < result[ind] < 0.65)
+        self.assertTrue(result[0] < 0.02)
+        self.assertTrue(abs(result[-1] - 1) < 0.02)
+
+    def test_width(self):
+        width = convolution.final_state_width(self.energy, 15., 30., 30.,
+                                              -5.)
+        self.assertTrue(np.all(width[self.energy<=-5] == 0))
+        self.assertTrue(np.all(np.diff(width) >= 0))
+        self.assertTrue(width[-1] < 15.)
+
+    def test_peak_area(self):
+        energy = np.linspace(-50., 50., 1001)
+        peak = np.zeros(len(energy))
+        peak[500] = 1.
+        result = convolution.convolve(energy, peak, Gamma_hole=2.,
+                                      Gamma_max=0., Gaussian=1.,
+                                      Efermi=-100.)
+        self.assertAlmostEqual(result.sum(), 1., 1)
+        self.assertEqual(result.argmax(), 500)
+
+    def test_xanes(self):
+        data = np.vstack((self.energy, np.ones(len(self.energy)),
+                          np.ones(len(self.energy)))).T
+        result = convolution.convolve_xanes(data, Nocut=True, **self.params)
+        self.assertEqual(result.shape, data.shape)
+        self.assertTrue(np.allclose(result[:,0], self.energy))
+        self.assertRaises(ValueError, convolution.convolve_xanes, data)
+
+    def test_batch(self):
+        spectrum = 1. + np.sin(self.energy/5.)
+        params = dict(Gamma_max=[5., 15., 15.], Gaussian=[0., 1., 1.],
+                      Efermi=[-5., -5., 0.])
+        result = convolution.convolve_batch(self.energy, spectrum,
+            dict(params, Gamma_hole=[1.]*3))
+        self.assertEqual(result.shape, (3, len(self.energy)))
+        for i in range(3):
+            single = convolution.convolve(self.energy, spectrum,
+                                          Gamma_hole=1., Gamma_max=
+                                          params["Gamma_max"][i],
+                                          Gaussian=params["Gaussian"][i],
+                                          Efermi=params["Efermi"][i])
+            self.assertTrue(np.allclose(result[i], single))
+            grid = convolution.ConvolutionGrid(self.energy)
+            K = grid.kernel(Gamma_hole=1., Gamma_max=params["Gamma_max"][i],
+                            Gaussian=params["Gaussian"][i],
+                            Efermi=params["Efermi"][i])
+            self.assertTrue(np.allclose(result[i], K.dot(spectrum)))
+
+    def test_batch_absorbers(self):
+        data = np.vstack((self.energy, np.ones(len(self.energy)),
+                          np.ones(len(self.energy)))).T
+        params = np.zeros(4, dtype=[("Gamma_hole", float),
+                                    ("Gaussian", float)])
+        params["Gamma_hole"] = [0.5, 1., 1.5, 2.]
+        result = convolution.convolve_xanes_batch(data, params)
+        self.assertEqual(result.shape, (4, len(self.energy), 2))
+
+    def test_unsupported(self):
+        self.assertEqual(convolution.unsupported({}), ["Gamma_hole"])
+        self.assertEqual(convolution.unsupported(self.params), [])
+        self.assertEqual(convolution.unsupported(dict(self.params,
+                                                      Photoemission=True,
+                                                      Convolution=True)),
+                         ["Photoemission"])
+
+    def test_get_xanes(self):
+        directory = TempDirectory()
+        sim = fdmnes("136", fdmnes_path=fake_fdmnes.install(directory.path))
+        cwd = os.getcwd()
+        os.chdir(directory.path)
+        try:
+            sim.add_atom("Ti", (0,0,0), resonant=True)
+            sim.P.Range = (-5.,1.,5.)
+            sim.WriteInputFile(os.path.join(directory.path, "r_inp.txt"))
+            sim.Run(wait=True)
+            sim.P.Gamma_hole = 1.
+            native = sim.get_XANES(conv=True)
+            self.assertFalse(os.path.isfile("r_out_conv.txt"))
+            del sim.P["Gamma_hole"] # tabulated widths: run FDMNES
+            data = sim.get_XANES(conv=True)
+            self.assertTrue(os.path.isfile("r_out_conv.txt"))
+            self.assertEqual(data.shape, native.shape)
+            self.assertTrue(np.allclose(data[:,1], 1. + data[:,0]/100.))
+        finally:
+            os.chdir(cwd)
+            directory.cleanup()
+
+def test_suite():
+    """Test suite including all test suites"""
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(test_convolution("test_constant"))
+    testSuite.addTest(test_convolution("test_fermi_cut"))
+    testSuite.addTest(test_convolution("test_width"))
+    testSuite.addTest(test_convolution("test_peak_area"))
+    testSuite.addTest(test_convolution("test_xanes"))
+    testSuite.addTest(test_convolution("test_batch"))
+    testSuite.addTest(test_convolution("test_batch_absorbers"))
+    testSuite.addTest(test_convolution("test_unsupported"))
+    testSuite.addTest(test_convolution("test_get_xanes"))
+    return testSuite
+
+if __name__ == '__main__':
+    import sys
+
+    mysuite = test_suite()
+    runner = unittest.TextTestRunner()
+    if not runner.run(mysuite).wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,76 @@
+import os
+import unittest
+import numpy as np
+from testfixtures import TempDirectory
+from ..pyFDMNES import fdmnes
+from . import fake_fdmnes
+
+class test_dafs(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TempDirectory()
+        self.cwd = os.getcwd()
+        self.exe = fake_fdmnes.install(self.dir.path)
+        self.sim = fdmnes("136", fdmnes_path=self.exe)
+        os.chdir(self.dir.path)
+        self.sim.add_atom("Ti", (0,0,0), resonant=True)
+        self.sim.P.Range = (-5.,1.,5.)
+        self.sim.WriteInputFile("rutile_inp.txt")
+        self.sim.Run(wait=True)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+
+    def test_batch(self):
+        azimuth = np.arange(0., 360., 30.)
+        result = self.sim.get_DAFS_batch([((1,1,0), "sigma", "sigma", 0.),
+                                          ((0,0,2), "sigma", "pi", azimuth)])
+        self.assertEqual(len(result.reflections), 1 + len(azimuth))
+        self.assertEqual(result.reflections[1], (0,0,2,1,2,0.))
+        self.assertEqual(result.data.shape, (13, 11, 1))
+        self.assertEqual(len(result.energy), 11)
+        self.assertTrue(np.allclose(result.data[5,:,0] - result.energy/100.,
+                                    5.))
+
+    def test_batch_unconvoluted(self):
+        result = self.sim.get_DAFS_batch([((1,1,0), "sigma", "sigma", 0.),
+                                          ((1,1,0), "sigma", "pi", 0.)],
+                                         conv=False)
+        self.assertEqual(result.data.shape, (2, 11, 2))
+        self.assertEqual(result.columns, ["r110_0", "i110_0"])
+        self.assertTrue(self.sim.path_rxs.endswith("_rxs.txt"))
+
+    def test_async(self):
+        job = self.sim.get_DAFS_async((1,1,0), "sigma", "sigma", 0.)
+        data = job.result(timeout=30)
+        expected = self.sim.get_DAFS((1,1,0), "sigma", "sigma", 0.)
+        self.assertEqual(len(data), len(expected))
+        for column, exp in zip(data, expected):
+            self.assertTrue(np.allclose(column, exp))
+
+    def test_restore(self):
+        self.sim.get_DAFS_batch([((1,1,0), "sigma", "sigma", 0.)])
+        self.sim.get_DAFS_async((1,1,0), "sigma", "sigma", 0.).result(30)
+        for keyw in ["Extract", "RXS", "Convolution"]:
+            self.assertFalse(keyw in self.sim.P)
+        self.sim.WriteInputFile("next_inp.txt")
+        content = open("next_inp.txt").read()
+        self.assertFalse("Extract" in content or "RXS" in content)
+
+def test_suite():
+    """Test suite including all test suites"""
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(test_dafs("test_batch"))
+    testSuite.addTest(test_dafs("test_batch_unconvoluted"))
+    testSuite.addTest(test_dafs("test_async"))
+    testSuite.addTest(test_dafs("test_restore"))
+    return testSuite
+
+if __name__ == '__main__':
+    import sys
+
+    mysuite = test_suite()
+    runner = unittest.TextTestRunner()
+    if not runner.run(mysuite).wasSuccessful():
+        sys.exit(1)
@@ -1,9 +1,9 @@
 import os
-import time
 import unittest
 from testfixtures import TempDirectory
 import urllib
 from ..pyFDMNES import fdmnes
+from ..scheduler import wait_all
 
 class test_fdmnes(unittest.TestCase):
 
@@ -39,12 +39,8 @@ class test_fdmnes(unittest.TestCase):
 
         sim.WriteInputFile(self.inputfile, overwrite=True)
 
-        sim.Run(wait=False)
-        while True:
-            NumRunning = sum(sim.Status(i)==False for i in range(len(sim.proc)))
-            if NumRunning == 0:
-                break
-            time.sleep(5)
+        jobs = sim.RunParallel(wait=False)
+        done, pending = wait_all(jobs)
 
         data = sim.get_XANES(conv = True)
 
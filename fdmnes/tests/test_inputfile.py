@@ -0,0 +1,108 @@
+import os
+import re
+import unittest
+from testfixtures import TempDirectory
+from ..pyFDMNES import fdmnes, keyword_exists
+from . import fake_fdmnes
+
+INPUT = """! comment line
+Filout
+  out/rutile_out   ! output base
+
+Folder_dat
+  /opt/fdmnes
+
+Range
+ -5. 1. 5.
+rayon
+ 4.5
+Spgroup
+ P4_2/mnm
+Crystal
+ 4.594 4.594 2.959 90 90 90
+ 22 0 0 0
+  8 0.3053 0.3053 0   ! oxygen
+Convolution
+End
+Radius
+ 7.
+"""
+
+class test_inputfile(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TempDirectory()
+        self.path = os.path.join(self.dir.path, "rutile_inp.txt")
+        with open(self.path, "w") as fh:
+            fh.write(INPUT)
+        self.exe = fake_fdmnes.install(self.dir.path)
+        self.sim = fdmnes("136", fdmnes_path=self.exe)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_parse(self):
+        ParamIn = self.sim._parse_input_file(self.path)
+        self.assertEqual(ParamIn["path_out"], "out/rutile_out")
+        self.assertEqual(ParamIn["sg"], "P4_2/mnm")
+        self.assertEqual(ParamIn["Param"], {"Range":["-5. 1. 5."],
+                                            "Radius":["4.5"],
+                                            "Convolution":[]})
+        crystal = ParamIn["structure"].values()[0]
+        self.assertEqual(crystal, ["4.594 4.594 2.959 90 90 90",
+                                   "22 0 0 0", "8 0.3053 0.3053 0"])
+
+    def test_parameters(self):
+        P = self.sim.P
+        self.assertEqual(keyword_exists("RADIUS"), "Radius")
+        self.assertEqual(keyword_exists("rayon"), "Radius")
+        self.assertEqual(keyword_exists("nonsense"), None)
+        P.rayon = 5
+        self.assertEqual(P["Radius"], 5.)
+        self.assertTrue(type(P["Radius"]) is float)
+        P.range = [-5, 1, 5]
+        self.assertEqual(P.Range, (-5, 1, 5))
+        self.assertRaises(ValueError, P.__setitem__, "nonsense", 1)
+        self.assertRaises(TypeError, P.__setitem__, "Range", 1.)
+
+    def test_variants(self):
+        sim = self.sim
+        sim.add_atom("Ti", (0,0,0), resonant=True)
+        sim.add_atom("O", (0.3,0.3,0))
+        sim.P.Range = (-5.,1.,5.)
+        variants = [dict(), dict(Radius=3.), dict(a=4.6, Hubbard=2.),
+                    dict(Convolution=True)]
+        paths = [os.path.join(self.dir.path, "v%i_inp.txt"%i)
+                 for i in range(len(variants))]
+        outputs = sim.WriteInputFiles(paths, variants)
+        self.assertEqual(outputs[1], os.path.join(self.dir.path, "v1_out"))
+        self.assertRaises(IOError, sim.WriteInputFiles, paths, variants)
+        self.assertFalse("Radius" in sim.P)
+        self.assertEqual(sim.a, 1.)
+        single = os.path.join(self.dir.path, "single")
+        os.mkdir(single)
+        wrote = re.compile("! Wrote file at .*")
+        for path, variant in zip(paths, variants):
+            spath = os.path.join(single, os.path.basename(path))
+            restore, changed = sim._apply(variant)
+            sim.WriteInputFile(spath, update=False)
+            restore()
+            expected = wrote.sub("", open(spath).read())
+            expected = expected.replace(single, self.dir.path)
+            self.assertEqual(wrote.sub("", open(path).read()), expected)
+
+def test_suite():
+    """Test suite including all test suites"""
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(test_inputfile("test_parse"))
+    testSuite.addTest(test_inputfile("test_parameters"))
+    testSuite.addTest(test_inputfile("test_variants"))
+    return testSuite
+
+if __name__ == '__main__':
+    import sys
+
+    mysuite = test_suite()
+    runner = unittest.TextTestRunner()
+    if not runner.run(mysuite).wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,60 @@
+import os
+import unittest
+from testfixtures import TempDirectory
+from .. import profiling
+from ..pyFDMNES import fdmnes
+from . import fake_fdmnes
+
+class test_profiling(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TempDirectory()
+        self.exe = fake_fdmnes.install(self.dir.path)
+        self.sim = fdmnes("136", fdmnes_path=self.exe)
+        self.sim.add_atom("Ti", (0,0,0), resonant=True)
+        self.sim.add_atom("Ti", (0.5,0.5,0.5), resonant=True)
+        self.sim.P.Range = (-5.,1.,5.)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_timings(self):
+        path = os.path.join(self.dir.path, "rutile_inp.txt")
+        self.sim.WriteInputFile(path, overwrite=True)
+        job, = self.sim.RunParallel(wait=True)
+        timings = self.sim.get_timings()
+        self.assertEqual(len(timings), 2)
+        self.assertEqual(timings[0].keys(), ["Sphere", "Mat", "Total"])
+        self.assertEqual(timings[1]["Sphere"], dict(cpu=0.1, wall=0.2))
+        self.assertEqual(profiling.timings(job), timings)
+
+    def test_report(self):
+        jobs = []
+        for radius in [3., 4.]:
+            self.sim.P.Radius = radius
+            path = os.path.join(self.dir.path, "rutile_%g_inp.txt"%radius)
+            self.sim.WriteInputFile(path, overwrite=True)
+            jobs.append(path)
+        result = self.sim.RunParallel(jobs, wait=True)
+        total = profiling.aggregate(result, "cpu")
+        self.assertEqual(total.keys(), ["Total", "Mat", "Sphere"])
+        self.assertEqual(total["Mat"]["count"], 4)
+        self.assertAlmostEqual(total["Mat"]["time"], 0.6)
+        self.assertAlmostEqual(total["Mat"]["fraction"], 0.5)
+        report = profiling.report(result)
+        self.assertEqual(len(report.splitlines()), 4)
+
+def test_suite():
+    """Test suite including all test suites"""
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(test_profiling("test_timings"))
+    testSuite.addTest(test_profiling("test_report"))
+    return testSuite
+
+if __name__ == '__main__':
+    import sys
+
+    mysuite = test_suite()
+    runner = unittest.TextTestRunner()
+    if not runner.run(mysuite).wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,209 @@
+import os
+import unittest
+import threading
+import numpy as np
+from testfixtures import TempDirectory
+from .. import readers
+
+HEADER = """  FDMNES
+  Date = 18 Oct 2026
+  Ti   K edge   Radius = 5.67
+"""
+
+class test_readers(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TempDirectory()
+        self.data = np.random.rand(200, 5) - 0.5
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, header):
+        path = os.path.join(self.dir.path, "rutile_out.txt")
+        with open(path, "w") as fh:
+            fh.write(header)
+            for row in self.data:
+                fh.write(" ".join("%13.6E"%x for x in row) + "\n")
+        return path
+
+    def test_dafs(self):
+        path = self.write(HEADER + "    Energy    <xanes>   I(1 0 0)ss_0 "
+                                   "  I(1 0 0)sp_0   I(0 0 2)ss_0\n")
+        data, columns = readers.read_spectrum(path)
+        self.assertEqual(data.shape, self.data.shape)
+        self.assertTrue(np.allclose(data, self.data, atol=1e-6))
+        self.assertEqual(columns, ["Energy", "<xanes>", "I100ss_0",
+                                   "I100sp_0", "I002ss_0"])
+        self.assertEqual(readers.column_names("Energy r(1 1 0) i(1 1 0) "
+                                              "r(110)_1", 5),
+                         ["Energy", "r110", "i110", "r110_1", "col4"])
+
+    def test_no_header(self):
+        path = self.write("")
+        data, columns = readers.read_spectrum(path)
+        self.assertTrue(np.allclose(data, self.data, atol=1e-6))
+        self.assertEqual(columns, ["col%i"%i for i in range(5)])
+
+    def test_invalid_token(self):
+        path = os.path.join(self.dir.path, "rutile_out.txt")
+        self.data = np.random.rand(4, 2)
+        for token in ["*****", "1.0-100"]:
+            lines = [" ".join("%13.6E"%x for x in row) for row in self.data]
+            lines[2] = "%s %13.6E"%(token, self.data[2,1])
+            with open(path, "w") as fh:
+                fh.write(HEADER + "    Energy    <xanes>\n")
+                fh.write("\n".join(lines) + "\n")
+            self.assertRaises(ValueError, readers.parse_spectrum, path)
+
+    def test_spectrum_files(self):
+        paths = []
+        for i in range(3):
+            self.data[:,0] = np.arange(200) - 50.
+            self.data[:,1] = i
+            path = self.write(HEADER + "    Energy    <xanes>\n")
+            os.rename(path, path.replace(".txt", "_%i.txt"%(i+1)))
+            paths.append(path.replace(".txt", "_%i.txt"%(i+1)))
+        spectra = readers.SpectrumFiles(paths)
+        self.assertEqual(len(spectra), 3)
+        data = spectra.select([2, 0], emin=-10, emax=10)
+        self.assertEqual(data.shape, (21, 3))
+        self.assertTrue(np.allclose(data[:,0], np.arange(-10, 11)))
+        self.assertTrue((data[:,1] == 2).all() and (data[:,2] == 0).all())
+        self.assertEqual(spectra._data, {})
+        self.assertEqual(spectra[1].data.shape, (200, 5))
+        self.assertEqual(spectra.select().shape, (200, 4))
+
+    def test_sidecar(self):
+        path = self.write(HEADER + "    Energy    <xanes>\n")
+        min_size = readers.sidecar_min_size
+        readers.sidecar_min_size = 0
+        try:
+            first = readers.read_spectrum(path)
+            self.assertTrue(os.path.isfile(path + readers.SIDECAR_SUFFIX))
+            cached = readers.read_sidecar(path)
+            self.assertTrue(np.array_equal(cached.data, first.data))
+            self.assertEqual(cached.columns, first.columns)
+            self.assertEqual(readers.read_spectrum(path).columns,
+                             first.columns)
+
+            self.data = self.data[:10]
+            self.write(HEADER + "    Energy    <xanes>\n")
+            self.assertTrue(readers.read_sidecar(path) is None)
+            self.assertEqual(readers.read_spectrum(path).data.shape, (10, 5))
+            self.assertEqual(readers.remove_sidecars(self.dir.path, True), [])
+            removed = readers.remove_sidecars(self.dir.path)
+            self.assertEqual(removed, [path + readers.SIDECAR_SUFFIX])
+        finally:
+            readers.sidecar_min_size = min_size
+
+    def test_bav_incremental(self):
+        path = os.path.join(self.dir.path, "rutile_out_bav.txt")
+        reader = readers.BavReader(path)
+        with open(path, "w") as fh:
+            fh.write("  Cycle 1   Delta = 0.1\n  Cycle 2   Del")
+        info = reader.update()
+        self.assertEqual(info["scf_iteration"], 1)
+        self.assertFalse(info["success"])
+        offset = reader.offset
+        with open(path, "a") as fh:
+            fh.write("ta = 0.1\n  Energy =    -5.000 eV\n"
+                     "  Energy =    -4.000 eV\n"
+                     " Subroutine times for absorbing atom 1\n"
+                     "  Energy =    -5.000 eV\n")
+        info = reader.update()
+        self.assertTrue(reader.offset > offset)
+        self.assertEqual(info["num_absorber"], 1)
+        self.assertEqual(info["num_energy"], 1)
+        self.assertEqual(info["energy"], -5.)
+        with open(path, "a") as fh:
+            fh.write(" Subroutine times for absorbing atom 2\n\n"
+                     " Have a beautiful day !\n")
+        info = reader.update()
+        self.assertEqual(info["num_absorber"], 2)
+        self.assertTrue(info["success"])
+        with open(path, "w") as fh: # rewritten by a new run
+            fh.write("  Cycle 1\n")
+        info = reader.update()
+        self.assertEqual((info["num_absorber"], info["success"]), (0, False))
+
+    def test_bav_rewritten(self):
+        path = os.path.join(self.dir.path, "rutile_out_bav.txt")
+        run = (" FDMNES run %i\n  Energy =    -5.000 eV\n"
+               " Subroutine times for absorbing atom 1\n\n"
+               " Have a beautiful day !\n")
+        with open(path, "w") as fh:
+            fh.write(run%1)
+        self.assertEqual(readers.read_bav(path)["num_absorber"], 1)
+        inode = os.stat(path).st_ino
+        with open(path, "w") as fh: # same inode, equal and larger size
+            fh.write(run%2)
+        self.assertEqual(os.stat(path).st_ino, inode)
+        self.assertEqual(readers.read_bav(path)["num_absorber"], 1)
+        with open(path, "w") as fh: # SCF cycles before the same run
+            fh.write("  Cycle 1   Delta = 0.1\n"*5 + run%3)
+        info = readers.read_bav(path)
+        self.assertEqual((info["num_absorber"], info["scf_iteration"]),
+                         (1, None))
+        self.assertTrue(info["success"])
+
+    def test_bav_shared(self):
+        path = os.path.join(self.dir.path, "rutile_out_bav.txt")
+        with open(path, "w") as fh:
+            for i in range(200):
+                fh.write("  Energy =    -5.000 eV\n"
+                         " Subroutine times for absorbing atom %i\n"
+                         "  Tenseur =   0.10   0.20\n\n"%(i+1))
+        chunksize = readers.BavReader.chunksize
+        readers.BavReader.chunksize = 64
+        results = []
+        try:
+            threads = [threading.Thread(target=lambda:
+                           results.append(readers.read_bav(path)))
+                       for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            readers.BavReader.chunksize = chunksize
+        self.assertEqual([info["num_absorber"] for info in results], [200]*8)
+        timings = readers.read_bav_timings(path)
+        self.assertEqual(len(timings), 200)
+        # the result is a copy of the tables of the shared reader
+        timings[0]["Tenseur"]["wall"] = 5.
+        del timings[1:]
+        timings = readers.read_bav_timings(path)
+        self.assertEqual((len(timings), timings[0]["Tenseur"]["wall"]),
+                         (200, 0.2))
+        # only the most recently used readers are kept
+        limit = readers.bav_readers_max
+        readers.bav_readers_max = 2
+        try:
+            for i in range(3):
+                readers.read_bav(path.replace("_bav", "_%i_bav"%i))
+            self.assertEqual(len(readers._bav_readers), 2)
+            self.assertFalse(os.path.abspath(path) in readers._bav_readers)
+        finally:
+            readers.bav_readers_max = limit
+
+def test_suite():
+    """Test suite including all test suites"""
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(test_readers("test_dafs"))
+    testSuite.addTest(test_readers("test_no_header"))
+    testSuite.addTest(test_readers("test_invalid_token"))
+    testSuite.addTest(test_readers("test_bav_incremental"))
+    testSuite.addTest(test_readers("test_bav_rewritten"))
+    testSuite.addTest(test_readers("test_bav_shared"))
+    testSuite.addTest(test_readers("test_spectrum_files"))
+    testSuite.addTest(test_readers("test_sidecar"))
+    return testSuite
+
+if __name__ == '__main__':
+    import sys
+
+    mysuite = test_suite()
+    runner = unittest.TextTestRunner()
+    if not runner.run(mysuite).wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,158 @@
+import os
+import sys
+import time
+import subprocess
+import unittest
+from testfixtures import TempDirectory
+from ..pyFDMNES import fdmnes
+from ..registry import JobRegistry
+from ..scheduler import Job
+from . import fake_fdmnes
+
+# starts a job and exits the interpreter (crash or normal exit) while
+# FDMNES is running
+CRASH = """
+import os, sys, time
+from fdmnes.scheduler import JobScheduler
+from fdmnes.registry import JobRegistry
+scheduler = JobScheduler(sys.argv[1], registry=JobRegistry(sys.argv[2]))
+job = scheduler.submit(sys.argv[3])
+while job.pid is None:
+    time.sleep(0.01)
+if sys.argv[4] == "crash":
+    os._exit(0)
+"""
+
+class test_registry(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TempDirectory()
+        self.exe = fake_fdmnes.install(self.dir.path)
+        self.sim = fdmnes("136", fdmnes_path=self.exe)
+        self.sim.add_atom("Ti", (0,0,0), resonant=True)
+        self.sim.P.Range = (-5.,1.,5.)
+        self.regpath = os.path.join(self.dir.path, "jobs.jsonl")
+        self.path = os.path.join(self.dir.path, "rutile_inp.txt")
+        self.sim.WriteInputFile(self.path, overwrite=True)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_record(self):
+        self.sim.registry = JobRegistry(self.regpath)
+        job, = self.sim.RunParallel(wait=True)
+        entry = self.sim.registry.entries()[self.path]
+        self.assertEqual(entry["status"], "finished")
+        self.assertEqual(entry["pid"], job.pid)
+        self.assertEqual(entry["outputs"], job.outputs)
+        self.assertEqual(len(open(self.regpath).readlines()), 3)
+        with open(self.regpath, "a") as fh:
+            fh.write('{"path": "trunc') # crashed while writing
+        self.sim.registry.compact()
+        self.assertEqual(len(open(self.regpath).readlines()), 1)
+        self.assertEqual(self.sim.registry.status(self.path), "finished")
+
+        jobs = self.sim.reattach()
+        self.assertEqual([j.status for j in jobs], ["finished"])
+        self.assertEqual(jobs[0].result(), job.outputs)
+
+    def test_reattach(self):
+        env = dict(os.environ, FAKE_FDMNES_SLEEP="1",
+                   PYTHONPATH=os.path.dirname(os.path.dirname(
+                              os.path.dirname(os.path.abspath(__file__)))))
+        for exit in ["crash", "exit"]:
+            subprocess.check_call([sys.executable, "-c", CRASH, self.exe,
+                                   self.regpath, self.path, exit], env=env)
+            self.sim.registry = JobRegistry(self.regpath)
+            job, = self.sim.reattach()
+            self.assertEqual(job.status, "running")
+            self.assertTrue(os.path.isdir(job.scratch))
+            outputs = job.result(timeout=10)
+            self.assertEqual(job.status, "finished")
+            self.assertTrue(os.path.join(self.dir.path, "rutile_out.txt")
+                            in outputs)
+            self.assertFalse(os.path.exists(job.scratch))
+            self.assertEqual(self.sim.registry.status(self.path),
+                             "finished")
+
+    def test_run(self):
+        self.sim.registry = JobRegistry(self.regpath)
+        cwd = os.getcwd()
+        os.chdir(self.dir.path)
+        os.environ["FAKE_FDMNES_SLEEP"] = "1"
+        try:
+            self.sim.Run(wait=False)
+        finally:
+            del os.environ["FAKE_FDMNES_SLEEP"]
+            os.chdir(cwd)
+        self.assertEqual(self.sim.registry.status(self.path), "running")
+        # new session: the process started by Run is followed
+        sim = fdmnes("136", fdmnes_path=self.exe)
+        sim.registry = JobRegistry(self.regpath)
+        job, = sim.reattach()
+        self.assertEqual((job.status, job.scratch), ("running", None))
+        job.result(timeout=10)
+        self.assertEqual(job.status, "finished")
+        self.assertEqual(job.path_out,
+                         os.path.join(self.dir.path, "rutile_out"))
+        self.assertTrue(os.path.isfile(job.path_out + ".txt"))
+        self.sim.proc[-1].wait()
+        self.assertEqual(self.sim.Status(verbose=False), 2)
+        self.assertEqual(self.sim.registry.status(self.path), "finished")
+
+    def test_run_default_output(self):
+        # input without Filout: FDMNES writes ``fdmnes_out'' to the cwd
+        with open(self.path) as fh:
+            lines = fh.read().splitlines()
+        i = lines.index("Filout")
+        del lines[i:i+2]
+        path = os.path.join(self.dir.path, "default_inp.txt")
+        with open(path, "w") as fh:
+            fh.write(os.linesep.join(lines) + os.linesep)
+        self.sim.registry = JobRegistry(self.regpath)
+        cwd = os.getcwd()
+        os.chdir(self.dir.path)
+        try:
+            self.sim.Run(path, wait=True)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(self.sim.registry.status(path), "finished")
+        entry = self.sim.registry.entries()[path]
+        self.assertEqual(entry["path_out"],
+                         os.path.join(self.dir.path, "fdmnes_out"))
+
+    def test_lost(self):
+        registry = JobRegistry(self.regpath)
+        registry.record(Job(self.path, self.exe))
+        self.sim.registry = registry
+        job, = self.sim.reattach()
+        self.assertEqual(job.status, "lost")
+        job, = self.sim.reattach(resubmit=True)
+        self.assertEqual(job.result(timeout=10)[0][:len(self.dir.path)],
+                         self.dir.path)
+        self.assertEqual(registry.status(self.path), "finished")
+
+    def test_remove_job(self):
+        self.sim.jobs = ["a", "b", "c"]
+        self.sim.proc = [1, 2, 3]
+        self.sim.RemoveJob(0)
+        self.assertEqual((self.sim.jobs, self.sim.proc), (["b", "c"], [2, 3]))
+
+def test_suite():
+    """Test suite including all test suites"""
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(test_registry("test_record"))
+    testSuite.addTest(test_registry("test_reattach"))
+    testSuite.addTest(test_registry("test_run"))
+    testSuite.addTest(test_registry("test_run_default_output"))
+    testSuite.addTest(test_registry("test_lost"))
+    testSuite.addTest(test_registry("test_remove_job"))
+    return testSuite
+
+if __name__ == '__main__':
+    import sys
+
+    mysuite = test_suite()
+    runner = unittest.TextTestRunner()
+    if not runner.run(mysuite).wasSuccessful():
+        sys.exit(1)
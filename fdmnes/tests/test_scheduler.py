@@ -0,0 +1,361 @@
+import os
+import sys
+import time
+import thread
+import threading
+import subprocess
+import unittest
+from testfixtures import TempDirectory
+from ..pyFDMNES import fdmnes
+from ..scheduler import wait_any, wait_all, JobError, JobScheduler, \
+                         Launcher, MPILauncher, WrapperLauncher, \
+                         make_launcher, process_alive
+from . import fake_fdmnes
+
+# exits the interpreter while two jobs are running and two are queued
+EXIT = """
+import sys, time
+from fdmnes.scheduler import JobScheduler
+scheduler = JobScheduler(sys.argv[1], NumCPU=2)
+jobs = [scheduler.submit(path) for path in sys.argv[2:]]
+while jobs[1].pid is None:
+    time.sleep(0.01)
+print(jobs[1].pid)
+"""
+
+# starts FDMNES in the background and exits because of Ctrl-C
+INTERRUPT = """
+import sys
+from fdmnes.pyFDMNES import fdmnes
+sim = fdmnes("136", fdmnes_path=sys.argv[1])
+sim.Run(sys.argv[2], wait=False)
+sys.stderr.write("%i\\n"%sim.proc[-1].pid)
+raise KeyboardInterrupt
+"""
+
+class test_scheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TempDirectory()
+        self.exe = fake_fdmnes.install(self.dir.path)
+        self.sim = fdmnes("136", fdmnes_path=self.exe)
+        self.sim.a = self.sim.b = 4.594
+        self.sim.c = 2.959
+        self.sim.add_atom("Ti", (0,0,0), resonant=True)
+        self.sim.add_atom("O", (0.3053,0.3053,0))
+        self.sim.P.Range = (-5.,1.,5.)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_run_parallel(self):
+        jobs = []
+        for radius in [3., 4., 5.]:
+            self.sim.P.Radius = radius
+            path = os.path.join(self.dir.path, "rutile_%g_inp.txt"%radius)
+            self.sim.WriteInputFile(path, overwrite=True)
+            jobs.append(path)
+
+        self.sim.NumCPU = 2
+        result = self.sim.RunParallel(jobs, wait=True)
+
+        self.assertEqual([job.status for job in result], ["finished"]*3)
+        for radius in [3., 4., 5.]:
+            path_out = os.path.join(self.dir.path, "rutile_%g_out"%radius)
+            self.assertTrue(os.path.isfile(path_out + ".txt"))
+            self.assertTrue(os.path.isfile(path_out + "_bav.txt"))
+        for job in result:
+            self.assertFalse(os.path.exists(job.scratch))
+            self.assertTrue(os.path.isfile(job.logpath))
+        self.assertFalse(os.path.isfile("fdmfile.txt"))
+
+    def test_failed_job(self):
+        path = os.path.join(self.dir.path, "rutile_inp.txt")
+        self.sim.WriteInputFile(path, overwrite=True)
+        os.environ["FAKE_FDMNES_FAIL"] = "1"
+        try:
+            job, = self.sim.RunParallel(wait=True)
+        finally:
+            del os.environ["FAKE_FDMNES_FAIL"]
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.returncode, 1)
+
+    def test_wait(self):
+        jobs = []
+        for radius in [3., 4.]:
+            self.sim.P.Radius = radius
+            path = os.path.join(self.dir.path, "rutile_%g_inp.txt"%radius)
+            self.sim.WriteInputFile(path, overwrite=True)
+            jobs.append(path)
+
+        finished = []
+        self.sim.NumCPU = 2
+        os.environ["FAKE_FDMNES_SLEEP"] = "0.5"
+        try:
+            result = self.sim.RunParallel(jobs, wait=False,
+                                          callback=finished.append)
+            done, pending = wait_any(result, timeout=0.05)
+            self.assertEqual((done, len(pending)), ([], 2))
+            done, pending = wait_any(result)
+            self.assertTrue(len(done) >= 1)
+            done, pending = wait_all(result, timeout=30)
+        finally:
+            del os.environ["FAKE_FDMNES_SLEEP"]
+        self.assertEqual(pending, [])
+        self.assertEqual(sorted(finished), sorted(result))
+        for job in result:
+            self.assertTrue(os.path.isfile(job.result()[0]))
+
+    def test_async(self):
+        path = os.path.join(self.dir.path, "rutile_inp.txt")
+        self.sim.WriteInputFile(path, overwrite=True)
+        lines = []
+        job = self.sim.run_async(on_output=lines.append)
+        outputs = job.result(timeout=30)
+        self.assertTrue(os.path.join(self.dir.path, "rutile_out.txt")
+                        in outputs)
+        self.assertEqual(lines, [" Calculation of rutile_inp.txt\n"])
+        self.assertEqual(open(job.logpath).read(), lines[0])
+
+        job = self.sim.convolve_async()
+        conv = job.result(timeout=30)
+        self.assertTrue(job.path.endswith("rutile_inp_conv.txt"))
+        self.assertEqual(conv.shape, (11, 2))
+
+    def test_cancel(self):
+        path = os.path.join(self.dir.path, "rutile_inp.txt")
+        self.sim.WriteInputFile(path, overwrite=True)
+        os.environ["FAKE_FDMNES_SLEEP"] = "10"
+        try:
+            running = self.sim.run_async()
+            queued = self.sim.run_async()
+            t0 = time.time()
+            while running.status != "running" or running.proc is None:
+                time.sleep(0.01)
+            self.assertTrue(queued.cancel())
+            self.assertTrue(queued.done())
+            self.assertTrue(running.cancel())
+            self.assertTrue(running.wait(5))
+        finally:
+            del os.environ["FAKE_FDMNES_SLEEP"]
+        self.assertTrue(time.time() - t0 < 5)
+        self.assertEqual([running.status, queued.status], ["cancelled"]*2)
+        self.assertFalse(os.path.exists(running.scratch))
+        self.assertEqual(queued.scratch, None)
+        self.assertRaises(JobError, running.result)
+        self.assertFalse(running.cancel())
+
+    def test_timeout(self):
+        paths = []
+        for radius in [3., 4.]:
+            self.sim.P.Radius = radius
+            path = os.path.join(self.dir.path, "rutile_%g_inp.txt"%radius)
+            self.sim.WriteInputFile(path, overwrite=True)
+            paths.append(path)
+        self.sim.NumCPU = 2
+        self.sim.timeout = 0.3
+        os.environ["FAKE_FDMNES_SLEEP"] = "10"
+        try:
+            t0 = time.time()
+            jobs = self.sim.RunParallel(paths, wait=True)
+        finally:
+            del os.environ["FAKE_FDMNES_SLEEP"]
+        self.assertTrue(time.time() - t0 < 5)
+        self.assertEqual([job.status for job in jobs], ["timeout"]*2)
+        self.assertEqual(jobs[0].error, "Timeout after 0.3 s")
+
+    def test_limits(self):
+        path = os.path.join(self.dir.path, "rutile_inp.txt")
+        self.sim.WriteInputFile(path, overwrite=True)
+        self.sim.limits = dict(memory=2**20)
+        job, = self.sim.RunParallel(wait=True)
+        self.assertEqual(job.status, "failed")
+        self.sim.limits = dict(memory=2**34, cpu=60)
+        job, = self.sim.RunParallel(wait=True)
+        self.assertEqual(job.status, "finished")
+        self.sim.limits = dict(disk=1)
+        self.assertRaises(ValueError, self.sim.RunParallel)
+
+    def test_non_posix(self):
+        from .. import scheduler
+        path = os.path.join(self.dir.path, "rutile_inp.txt")
+        self.sim.WriteInputFile(path, overwrite=True)
+        scheduler.POSIX = False
+        os.environ["FAKE_FDMNES_SLEEP"] = "10"
+        try:
+            self.assertEqual(scheduler.child_setup(), None)
+            job = self.sim.run_async()
+            while job.proc is None:
+                time.sleep(0.05)
+            self.assertTrue(job.cancel())
+            self.assertRaises(JobError, job.result, 5)
+        finally:
+            scheduler.POSIX = True
+            del os.environ["FAKE_FDMNES_SLEEP"]
+        self.assertEqual(job.status, "cancelled")
+
+    def test_interrupt(self):
+        path = os.path.join(self.dir.path, "rutile_inp.txt")
+        self.sim.WriteInputFile(path, overwrite=True)
+        os.environ["FAKE_FDMNES_SLEEP"] = "5"
+        try:
+            job, = self.sim.RunParallel(wait=False)
+            # Ctrl-C while waiting
+            threading.Timer(0.5, thread.interrupt_main).start()
+            t0 = time.time()
+            self.assertRaises(KeyboardInterrupt, wait_all, [job])
+            self.assertTrue(time.time() - t0 < 2.)
+        finally:
+            del os.environ["FAKE_FDMNES_SLEEP"]
+        self.assertTrue(job.wait(timeout=10))
+        self.assertEqual(job.status, "cancelled")
+
+    def test_exit(self):
+        paths = []
+        for radius in [3., 4., 5., 6.]:
+            self.sim.P.Radius = radius
+            path = os.path.join(self.dir.path, "rutile_%g_inp.txt"%radius)
+            self.sim.WriteInputFile(path, overwrite=True)
+            paths.append(path)
+        env = dict(os.environ, FAKE_FDMNES_SLEEP="30",
+                   PYTHONPATH=os.path.dirname(os.path.dirname(
+                              os.path.dirname(os.path.abspath(__file__)))))
+        t0 = time.time()
+        proc = subprocess.Popen([sys.executable, "-c", EXIT, self.exe]
+                                + paths, env=env, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        stdout, stderr = proc.communicate()
+        self.assertEqual((proc.returncode, stderr), (0, ""))
+        # the running jobs were cancelled instead of waited for
+        self.assertTrue(time.time() - t0 < 10)
+        self.assertFalse(process_alive(int(stdout)))
+        for path in paths:
+            self.assertFalse(os.path.isfile(path.replace("_inp.txt",
+                                                         "_out.txt")))
+
+    def test_cancel_run(self):
+        path = os.path.join(self.dir.path, "rutile_inp.txt")
+        self.sim.WriteInputFile(path, overwrite=True)
+        cwd = os.getcwd()
+        os.chdir(self.dir.path)
+        os.environ["FAKE_FDMNES_SLEEP"] = "10"
+        try:
+            self.sim.Run(wait=False)
+            self.assertFalse(self.sim.Status())
+            self.assertTrue(self.sim.cancel())
+            t0 = time.time()
+            self.sim.proc[-1].wait()
+            self.assertTrue(time.time() - t0 < 5)
+            result, message = self.sim.Status(full_output=True)
+        finally:
+            del os.environ["FAKE_FDMNES_SLEEP"]
+            os.chdir(cwd)
+        self.assertTrue(result)
+        self.assertTrue("stopped (cancelled)" in message[0])
+        self.assertEqual(self.sim.proc, [])
+        self.assertFalse(self.sim.cancel())
+
+    def test_interrupt_run(self):
+        path = os.path.join(self.dir.path, "rutile_inp.txt")
+        self.sim.WriteInputFile(path, overwrite=True)
+        env = dict(os.environ, FAKE_FDMNES_SLEEP="10",
+                   PYTHONPATH=os.path.dirname(os.path.dirname(
+                              os.path.dirname(os.path.abspath(__file__)))))
+        # FDMNES inherits stderr, a pipe would only close when it exits
+        errpath = os.path.join(self.dir.path, "stderr.txt")
+        with open(errpath, "w") as errfile, open(os.devnull, "w") as null:
+            subprocess.call([sys.executable, "-c", INTERRUPT, self.exe,
+                             path], env=env, cwd=self.dir.path,
+                            stdout=null, stderr=errfile)
+        with open(errpath) as errfile:
+            stderr = errfile.read()
+        self.assertTrue(stderr.rstrip().endswith("KeyboardInterrupt"))
+        pid = int(stderr.split()[0])
+        t0 = time.time()
+        while process_alive(pid) and time.time() - t0 < 5:
+            time.sleep(0.05)
+        self.assertFalse(process_alive(pid))
+
+    def test_launcher(self):
+        self.assertEqual(make_launcher().command("fdmnes"), ["fdmnes"])
+        self.assertEqual(make_launcher("mpi").command("fdmnes", 4),
+                         ["mpirun", "-np", "4", "fdmnes"])
+        wrapper = make_launcher("srun -n %(ranks)i '%(exe)s'")
+        self.assertEqual(wrapper.command("/opt/my fdmnes", 2),
+                         ["srun", "-n", "2", "/opt/my fdmnes"])
+        self.assertRaises(ValueError, WrapperLauncher, "srun")
+
+        mpirun = fake_fdmnes.install_mpirun(self.dir.path)
+        paths = []
+        for radius in [3., 4., 5.]:
+            self.sim.P.Radius = radius
+            path = os.path.join(self.dir.path, "rutile_%g_inp.txt"%radius)
+            self.sim.WriteInputFile(path, overwrite=True)
+            paths.append(path)
+        self.sim.NumCPU = 4
+        # fixed ranks per job, serial job selected per job
+        self.sim.launcher = MPILauncher(2, mpirun)
+        jobs = self.sim.RunParallel(paths[:2])
+        jobs += self.sim.RunParallel(paths[2:], launcher=Launcher())
+        self.assertEqual([job.status for job in jobs], ["finished"]*3)
+        self.assertEqual([job.ranks for job in jobs], [2, 2, 1])
+        self.assertTrue("mpirun ranks 2" in open(jobs[0].logpath).read())
+        self.assertFalse("mpirun" in open(jobs[2].logpath).read())
+
+        # ranks chosen from the free cores, shared within a batch
+        self.sim.launcher = MPILauncher(mpirun=mpirun)
+        jobs = self.sim.RunParallel(paths[:2])
+        self.assertEqual([job.ranks for job in jobs], [2, 2])
+        for i in range(5):
+            jobs = self.sim.RunParallel(paths + paths[:1])
+            self.assertEqual([job.ranks for job in jobs], [1]*4)
+        # ranks chosen from the free cores
+        scheduler = JobScheduler(self.exe, 4,
+                                 launcher=MPILauncher(mpirun=mpirun))
+        job = scheduler.submit(paths[0])
+        scheduler.wait()
+        self.assertEqual(job.status, "finished")
+        self.assertEqual(job.ranks, 4)
+        self.assertEqual(job.command, [mpirun, "-np", "4", self.exe])
+        # more fixed ranks than cores
+        self.assertRaises(ValueError, scheduler.submit, paths[0],
+                          launcher=MPILauncher(8, mpirun))
+        self.assertEqual(len(scheduler.jobs), 1)
+
+        # Run
+        self.sim.NumCPU = 3
+        logpath = os.path.join(self.dir.path, "run.log")
+        cwd = os.getcwd()
+        os.chdir(self.dir.path)
+        try:
+            self.sim.Run(paths[0], logpath=logpath,
+                         launcher=MPILauncher(mpirun=mpirun))
+        finally:
+            os.chdir(cwd)
+        self.assertTrue("mpirun ranks 3" in open(logpath).read())
+
+def test_suite():
+    """Test suite including all test suites"""
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(test_scheduler("test_run_parallel"))
+    testSuite.addTest(test_scheduler("test_failed_job"))
+    testSuite.addTest(test_scheduler("test_wait"))
+    testSuite.addTest(test_scheduler("test_async"))
+    testSuite.addTest(test_scheduler("test_cancel"))
+    testSuite.addTest(test_scheduler("test_timeout"))
+    testSuite.addTest(test_scheduler("test_limits"))
+    testSuite.addTest(test_scheduler("test_non_posix"))
+    testSuite.addTest(test_scheduler("test_interrupt"))
+    testSuite.addTest(test_scheduler("test_exit"))
+    testSuite.addTest(test_scheduler("test_cancel_run"))
+    testSuite.addTest(test_scheduler("test_interrupt_run"))
+    testSuite.addTest(test_scheduler("test_launcher"))
+    return testSuite
+
+if __name__ == '__main__':
+    import sys
+
+    mysuite = test_suite()
+    runner = unittest.TextTestRunner()
+    if not runner.run(mysuite).wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,41 @@
+import unittest
+from .. import spacegroups
+from ..resources import resource_filename
+
+class test_spacegroups(unittest.TestCase):
+
+    def setUp(self):
+        self.table = spacegroups.load(resource_filename("spacegroup.txt"))
+
+    def test_cached(self):
+        table = spacegroups.load(resource_filename("spacegroup.txt"))
+        self.assertTrue(table is self.table)
+
+    def test_lookup(self):
+        self.assertTrue("136" in self.table)
+        self.assertTrue("P4_2/mnm" in self.table or "P42/mnm" in self.table)
+        self.assertFalse("137:c" in self.table)
+        self.assertFalse(136 in self.table)
+        self.assertEqual(len(self.table.flat), sum(map(len, self.table.rows)))
+
+    def test_suggestions(self):
+        rows = self.table.suggestions("137:")
+        self.assertTrue(len(rows))
+        self.assertTrue(all(any(name.startswith("137") for name in row)
+                            for row in rows[:2]))
+
+def test_suite():
+    """Test suite including all test suites"""
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(test_spacegroups("test_cached"))
+    testSuite.addTest(test_spacegroups("test_lookup"))
+    testSuite.addTest(test_spacegroups("test_suggestions"))
+    return testSuite
+
+if __name__ == '__main__':
+    import sys
+
+    mysuite = test_suite()
+    runner = unittest.TextTestRunner()
+    if not runner.run(mysuite).wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,104 @@
+import os
+import unittest
+import numpy as np
+from testfixtures import TempDirectory
+from ..pyFDMNES import fdmnes
+from ..store import ResultStore, h5py
+from ..sweep import Sweep
+from .. import readers
+from . import fake_fdmnes
+
+class test_store(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TempDirectory()
+        self.exe = fake_fdmnes.install(self.dir.path)
+        self.sim = fdmnes("136", fdmnes_path=self.exe)
+        self.sim.add_atom("Ti", (0,0,0), resonant=True)
+        self.sim.add_atom("Ti", (0.5,0.5,0.5), resonant=True)
+        self.sim.P.Range = (-5.,1.,5.)
+        self.sim.P.Convolution = True
+        self.storepath = os.path.join(self.dir.path, "results.npz")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_ingest(self):
+        path = os.path.join(self.dir.path, "rutile_inp.txt")
+        self.sim.WriteInputFile(path, overwrite=True)
+        job, = self.sim.RunParallel(wait=True)
+        with ResultStore(self.storepath, "w") as store:
+            name = store.ingest(job, parameters=dict(Radius=3.))
+            self.assertRaises(ValueError, store.ingest, job)
+        self.assertEqual(name, "rutile_out")
+
+        store = ResultStore(self.storepath)
+        self.assertEqual(store.names(), ["rutile_out"])
+        self.assertEqual(store.fields(name), ["absorbers", "conv", "spectrum"])
+        data, columns = readers.read_spectrum(job.path_out + ".txt")
+        self.assertTrue(np.allclose(store.read(name), data))
+        xanes = store.array(name, "absorbers")[1,:,1]
+        self.assertEqual(xanes.shape, (11,))
+        lazy = self.sim.get_absorbers().select([1])
+        self.assertTrue(np.allclose(lazy[:,1], xanes))
+        meta = store.meta(name)
+        self.assertEqual(meta["parameters"], dict(Radius=3.))
+        self.assertEqual(meta["spectrum_columns"], columns)
+        self.assertEqual(len(meta["timings"]), 2)
+        self.assertTrue(meta["bav"]["success"])
+        store.close()
+
+    @unittest.skipIf(h5py is None, "h5py is not installed")
+    def test_hdf5(self):
+        path = os.path.join(self.dir.path, "rutile_inp.txt")
+        self.sim.WriteInputFile(path, overwrite=True)
+        job, = self.sim.RunParallel(wait=True)
+        storepath = os.path.join(self.dir.path, "results.h5")
+        with ResultStore(storepath, "w") as store:
+            self.assertTrue(store.hdf5)
+            name = store.ingest(job, parameters=dict(Radius=3.))
+            self.assertRaises(ValueError, store.ingest, job)
+
+        with ResultStore(storepath) as store:
+            self.assertEqual(store.names(), ["rutile_out"])
+            self.assertTrue(name in store)
+            self.assertEqual(store.fields(name),
+                             ["absorbers", "conv", "spectrum"])
+            data, columns = readers.read_spectrum(job.path_out + ".txt")
+            self.assertTrue(np.allclose(store.read(name), data))
+            dataset = store.array(name, "absorbers")
+            self.assertEqual(dataset.compression, "gzip")
+            self.assertEqual(dataset[1,:,1].shape, (11,))
+            meta = store.meta(name)
+            self.assertEqual(meta["parameters"], dict(Radius=3.))
+            self.assertEqual(meta["spectrum_columns"], columns)
+            self.assertTrue(meta["bav"]["success"])
+            self.assertRaises(IOError, store.add, "other", {}, {})
+
+    def test_sweep_export(self):
+        sweep = Sweep(self.sim, [("Radius", [3., 4., 5.])],
+                      directory=os.path.join(self.dir.path, "sweep"))
+        sweep.run()
+        names = sweep.export(self.storepath)
+        self.assertEqual(len(names), 3)
+        self.assertEqual(sweep.export(self.storepath), [])
+        with ResultStore(self.storepath) as store:
+            self.assertEqual(store.names(), sorted(names))
+            radii = [store.meta(n)["parameters"]["Radius"] for n in names]
+            self.assertEqual(radii, [3., 4., 5.])
+
+def test_suite():
+    """Test suite including all test suites"""
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(test_store("test_ingest"))
+    testSuite.addTest(test_store("test_hdf5"))
+    testSuite.addTest(test_store("test_sweep_export"))
+    return testSuite
+
+if __name__ == '__main__':
+    import sys
+
+    mysuite = test_suite()
+    runner = unittest.TextTestRunner()
+    if not runner.run(mysuite).wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,135 @@
+import os
+import unittest
+import numpy as np
+from testfixtures import TempDirectory
+from ..pyFDMNES import fdmnes
+from ..sweep import Sweep
+from ..readers import BAV_SUCCESS
+from . import fake_fdmnes
+
+class test_sweep(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TempDirectory()
+        self.exe = fake_fdmnes.install(self.dir.path)
+        self.sim = fdmnes("136", fdmnes_path=self.exe)
+        self.sim.add_atom("Ti", (0,0,0), resonant=True)
+        self.sim.P.Range = (-5.,1.,5.)
+        self.sim.NumCPU = 2
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_grid(self):
+        sweep = Sweep(self.sim, [("Radius", [3., 4., 3.]),
+                                 (("Hubbard", "a"), [(0., 4.5), (2., 4.6)])],
+                      directory=os.path.join(self.dir.path, "sweep"))
+        self.assertEqual(sweep.shape, (3, 2))
+        paths = sweep.write()
+        self.assertEqual(len(paths), 6)
+        self.assertEqual(len(set(paths)), 4)
+        self.assertEqual(paths[0], paths[4])
+        self.assertEqual(self.sim.a, 1)
+        self.assertFalse("Radius" in self.sim.P)
+
+        jobs = sweep.run()
+        self.assertEqual(len(jobs), 4)
+        result = sweep.result()
+        self.assertEqual(result.data.shape, (3, 2, 11))
+        self.assertTrue(np.allclose(result.energy, np.arange(-5, 6)))
+        self.assertEqual(result.sel(Radius=4.).shape, (2, 11))
+        self.assertEqual(result.sel(Radius=3., Hubbard_a=(2., 4.6)).shape,
+                         (11,))
+        self.assertTrue((result.status == "finished").all())
+
+    def test_output_base(self):
+        # ``_conv'' is removed from the output base by WriteInputFile
+        directory = os.path.join(self.dir.path, "sweep")
+        sweep = Sweep(self.sim, [("Radius", [3., 4.])], directory=directory,
+                      name="ti_conv")
+        sweep.run()
+        path_out = os.path.join(directory, "ti_0_out")
+        self.assertEqual(sweep.output_base(sweep.paths[0]), path_out)
+        self.assertTrue(os.path.isfile(path_out + ".txt"))
+        self.assertTrue((sweep.result().status == "finished").all())
+        self.assertEqual(sweep.pending(), {})
+
+    def test_job_dirs(self):
+        directory = os.path.join(self.dir.path, "sweep")
+        sweep = Sweep(self.sim, [("Radius", [3., 4.])], directory=directory,
+                      job_dirs=True)
+        paths = sweep.write()
+        self.assertEqual(paths[1], os.path.join(directory, "sweep_1",
+                                                "sweep_1_inp.txt"))
+        sweep.run()
+        result = sweep.result()
+        self.assertTrue((result.status == "finished").all())
+        self.assertTrue(os.path.isfile(os.path.join(directory, "sweep_1",
+                                                    "sweep_1_out.txt")))
+
+    def test_resume(self):
+        directory = os.path.join(self.dir.path, "sweep")
+        sweep = Sweep(self.sim, [("Radius", [3., 4., 5.])],
+                      directory=directory)
+        sweep.run()
+        self.assertEqual(sweep.pending(), {})
+        paths = sweep.paths
+        # truncated spectrum, failed point and changed input
+        spectrum = sweep.output_base(paths[0]) + ".txt"
+        content = open(spectrum).read()
+        with open(spectrum, "w") as fh:
+            fh.write(content[:-20])
+        bavfile = sweep.output_base(paths[1]) + "_bav.txt"
+        content = open(bavfile).read().replace(BAV_SUCCESS,
+                                               "x"*len(BAV_SUCCESS))
+        with open(bavfile, "w") as fh:
+            fh.write(content)
+        self.sim.P.Range = (-5.,1.,6.)
+        sweep = Sweep(self.sim, [("Radius", [3., 4.])], directory=directory)
+        sweep.write()
+        pending = sweep.pending()
+        self.assertEqual(pending.keys(), paths[:2])
+        self.assertEqual(pending[paths[0]], "input changed")
+
+        self.sim.P.Range = (-5.,1.,5.)
+        sweep = Sweep(self.sim, [("Radius", [3., 4., 5.])],
+                      directory=directory)
+        sweep.write()
+        pending = sweep.pending()
+        self.assertEqual(pending.keys(), paths[:2])
+        self.assertTrue(pending[paths[0]].endswith("changed"))
+        self.assertEqual(pending[paths[1]], "bav file incomplete")
+        mtime = os.path.getmtime(sweep.output_base(paths[2]) + ".txt")
+        jobs = sweep.run(resume=True)
+        self.assertEqual([job.status for job in jobs], ["finished"]*3)
+        # the resumed point lists its outputs like a job that was run
+        self.assertEqual([os.path.basename(f) for f in jobs[2].result()],
+                         [os.path.basename(f).replace("_1_", "_2_")
+                          for f in jobs[1].result()])
+        self.assertEqual(sweep.pending(), {})
+        self.assertEqual(os.path.getmtime(sweep.output_base(paths[2])
+                                          + ".txt"), mtime)
+        self.assertTrue((sweep.result().status == "finished").all())
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, Sweep, self.sim, [("Radiu", [3.])])
+        self.assertRaises(ValueError, Sweep, self.sim,
+                          [(("Radius", "Hubbard"), [(3.,)])])
+
+def test_suite():
+    """Test suite including all test suites"""
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(test_sweep("test_grid"))
+    testSuite.addTest(test_sweep("test_output_base"))
+    testSuite.addTest(test_sweep("test_job_dirs"))
+    testSuite.addTest(test_sweep("test_resume"))
+    testSuite.addTest(test_sweep("test_invalid"))
+    return testSuite
+
+if __name__ == '__main__':
+    import sys
+
+    mysuite = test_suite()
+    runner = unittest.TextTestRunner()
+    if not runner.run(mysuite).wasSuccessful():
+        sys.exit(1)
@@ -0,0 +1,78 @@
+import os
+import re
+import unittest
+from testfixtures import TempDirectory
+from ..pyFDMNES import fdmnes, ConsistencyError
+from ..template import InputTemplate
+from . import fake_fdmnes
+
+WROTE = re.compile("! Wrote file at .*")
+
+class test_template(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TempDirectory()
+        self.exe = fake_fdmnes.install(self.dir.path)
+        self.sim = fdmnes("136", fdmnes_path=self.exe)
+        self.sim.add_atom("Ti", (0,0,0), resonant=True)
+        self.sim.add_atom("O", (0.3,0.3,0))
+        self.sim.P.Range = (-5.,1.,5.)
+        self.sim.P.Screening = [1, 2]
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_render(self):
+        tpl = InputTemplate(self.sim, ["rayon", "Hubbard", "a", "sg", "Rmt"])
+        self.assertEqual(tpl.names, ["Radius", "Hubbard", "a", "sg", "Rmt"])
+        variants = [dict(), dict(Radius=3), dict(a=4.6, Hubbard=2.),
+                    dict(sg="P42/mnm", Hubbard=0.), dict(Rmt=0.65)]
+        for i, variant in enumerate(variants):
+            path = os.path.join(self.dir.path, "t%i_inp.txt"%i)
+            single = os.path.join(self.dir.path, "s%i_inp.txt"%i)
+            path_out = tpl.write(path, variant, atomic=True)
+            self.assertEqual(path_out, single.replace("s%i_inp.txt"%i,
+                                                      "t%i_out"%i))
+            restore, changed = self.sim._apply(variant)
+            self.sim.WriteInputFile(single, update=False)
+            restore()
+            expected = WROTE.sub("", open(single).read())
+            expected = expected.replace("s%i_out"%i, "t%i_out"%i)
+            self.assertEqual(WROTE.sub("", open(path).read()), expected)
+        self.assertRaises(IOError, tpl.write, path)
+        self.assertRaises(ValueError, tpl.render, dict(Edge="L3"))
+        self.assertRaises(ConsistencyError, tpl.render, dict(sg="P5"))
+        self.assertRaises(ValueError, InputTemplate, self.sim, ["RXS"])
+        self.assertRaises(ValueError, InputTemplate, self.sim, ["Radiu"])
+
+    def test_write_jobs(self):
+        tpl = InputTemplate(self.sim, ["Radius"])
+        directory = os.path.join(self.dir.path, "jobs")
+        paths = tpl.write_jobs(directory, [dict(Radius=r) for r in
+                                           range(3, 13)])
+        self.assertEqual(paths[3], os.path.join(directory, "job_3",
+                                                "job_3_inp.txt"))
+        self.assertEqual(sorted(os.listdir(directory))[:3],
+                         ["job_0", "job_1", "job_2"])
+        self.assertEqual(os.listdir(os.path.dirname(paths[0])),
+                         ["job_0_inp.txt"])
+        self.assertTrue("Radius\n3\n" in open(paths[0]).read())
+        jobs = self.sim.RunParallel(paths[:2])
+        self.assertEqual([job.status for job in jobs], ["finished"]*2)
+        self.assertTrue(os.path.isfile(os.path.join(directory, "job_1",
+                                                    "job_1_out.txt")))
+
+def test_suite():
+    """Test suite including all test suites"""
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(test_template("test_render"))
+    testSuite.addTest(test_template("test_write_jobs"))
+    return testSuite
+
+if __name__ == '__main__':
+    import sys
+
+    mysuite = test_suite()
+    runner = unittest.TextTestRunner()
+    if not runner.run(mysuite).wasSuccessful():
+        sys.exit(1)